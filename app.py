@@ -1,25 +1,47 @@
-from flask import Flask, render_template, request, redirect, session, url_for, send_file, flash, Response, jsonify, make_response
+from flask import Flask, render_template, request, redirect, session, url_for, send_file, flash, Response, jsonify
 import pickle
 import numpy as np
-import pandas as pd
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date, timedelta
 import json
-import mysql.connector
-from mysql.connector import Error
+from db_pool import create_mysql_pool
+from history_writer import HistoryWriter
+from metrics_cache import CachedMetrics, count_query
+import daily_stats
+import migrations
+import prediction_store
 from remedies_v2 import remedy_dict_v2
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import Paragraph
+from symptom_index import DiseaseSymptomIndex
+from symptom_vocab import SymptomVocabulary
+from inference import (V2_FEATURES, MAX_BATCH_ROWS, encode_symptom_vectors,
+                       encode_profiles, predict_proba_batch, top_k_labels)
+from inference_pool import InferencePool, PoolBusy
+from forest_engine import load_forest_if_present
+from model_artifact import current_version, load_artifact
+from model_registry import ModelBundle, ModelRegistry, check_probabilities
+from v2_lookup import LOOKUP_PATH, AXIS_MIN as V2_AXIS_MIN, AXIS_MAX as V2_AXIS_MAX, load_lookup_table
+from prediction_cache import PredictionCache, file_version
+from csv_stream import iter_csv
+from pagination import empty_page, fetch_keyset_page, page_size
+from lazy_imports import LazyModule, preload
+from warmup import Warmup
+from report_jobs import ReportJobs, ReportSource
+from result_store import ResultStore
 import io
 import os
-import csv
+import atexit
+import sys
+import time
 from functools import wraps
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
 
+# Heavy dependencies are imported on first use (or by the start-up warm-up),
+# keeping them out of the time it takes to import this module
+pd = LazyModule('pandas')
+mysql_connector = LazyModule('mysql.connector')
+pdf_reports = LazyModule('pdf_reports')
+
 
 app = Flask(__name__)
 
@@ -38,46 +60,146 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_db_connection():
+db_pool = create_mysql_pool()
+
+
+@contextmanager
+def db_connection():
+    """
+    Borrow a pooled connection for the duration of the with-block.
+    Yields None if the database is unreachable so callers can degrade gracefully.
+    """
     try:
-        conn = mysql.connector.connect(
-            host='localhost',
-            user='lord',
-            password='2005',
-            database='disease_prediction'
-        )
-        return conn
-    except Error as e:
+        conn = db_pool.acquire()
+    except Exception as e:
         print(f"[DB] Connection error: {e}")
-        return None
+        conn = None
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            conn.close()
+
+# The unified predictions table only exists once migration 4 has run
+# (migrations.py). Reads switch to it once the migration is recorded; writes
+# don't wait for this check, the history writer adds the predictions rows as
+# soon as the table exists (deferred_tables below)
+UNIFIED_PREDICTIONS_MIGRATION = 4
+SCHEMA_CHECK_INTERVAL = float(os.environ.get('SCHEMA_CHECK_INTERVAL', 60))
+_schema = {'applied': None, 'checked_at': None}
+
+
+def applied_migrations():
+    """Applied migration versions, re-read at most every SCHEMA_CHECK_INTERVAL seconds; None while unknown."""
+    now = time.monotonic()
+    if _schema['checked_at'] is None or now - _schema['checked_at'] > SCHEMA_CHECK_INTERVAL:
+        _schema['checked_at'] = now
+        with db_connection() as conn:
+            if conn:
+                cursor = conn.cursor()
+                try:
+                    _schema['applied'] = migrations.applied_versions(cursor, create=False)
+                except Exception as e:
+                    print(f"[DB] Could not read schema_migrations: {e}")
+                finally:
+                    cursor.close()
+    return _schema['applied']
+
+
+def unified_predictions():
+    """True once migration 4 has created (and backfilled) the predictions table."""
+    applied = applied_migrations()
+    return applied is not None and UNIFIED_PREDICTIONS_MIGRATION in applied
+
+
+def check_schema():
+    applied = applied_migrations()
+    if applied is None:
+        print("[DB] Schema version unknown (database unreachable); predictions go to the legacy tables.")
+    elif UNIFIED_PREDICTIONS_MIGRATION not in applied:
+        print(f"[DB] Migration {UNIFIED_PREDICTIONS_MIGRATION} not applied; predictions go to the "
+              "legacy tables only. Run `python migrations.py`.")
+
+
+def _user_activity(cursor, username):
+    """Prediction count and newest prediction time of one user (both models)."""
+    if unified_predictions():
+        cursor.execute("""
+            SELECT COUNT(*) AS total_predictions, MAX(predicted_at) AS last_pred
+            FROM predictions WHERE username = %s
+        """, (username,))
+        row = cursor.fetchone() or {}
+        return {'total': int(row.get('total_predictions') or 0), 'last': row.get('last_pred')}
+    cursor.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM history WHERE username=%s)
+            +
+            (SELECT COUNT(*) FROM prediction_history WHERE username=%s)
+            AS total_predictions,
+            GREATEST(
+                COALESCE((SELECT MAX(timestamp) FROM history WHERE username=%s), '1000-01-01'),
+                COALESCE((SELECT MAX(predicted_at) FROM prediction_history WHERE username=%s), '1000-01-01')
+            ) AS last_pred
+    """, (username, username, username, username))
+    row = cursor.fetchone() or {}
+    last = row.get('last_pred')
+    if isinstance(last, str):
+        last = datetime.strptime(last[:19], '%Y-%m-%d %H:%M:%S')
+    if last is not None and last.year <= 1000:
+        last = None
+    return {'total': int(row.get('total_predictions') or 0), 'last': last}
+
+# Admin/profile counters cached for METRICS_CACHE_TTL seconds; routes that write
+# a table call admin_metrics.invalidate_tables() so the next view recounts it
+admin_metrics = CachedMetrics(db_connection, ttl=float(os.environ.get('METRICS_CACHE_TTL', 30)))
+admin_metrics.register('users', count_query("SELECT COUNT(*) FROM users"), ['users'])
+admin_metrics.register('active_users', count_query("SELECT COUNT(*) FROM users WHERE active = 1"), ['users'])
+admin_metrics.register('contacts', count_query("SELECT COUNT(*) FROM contact_messages"), ['contact_messages'])
+admin_metrics.register('audit', count_query("SELECT COUNT(*) FROM audit_log"), ['audit_log'])
+# prediction totals come from the daily rollups (daily_stats.py); a batch may
+# carry only legacy rows (before migration 4), so those tables invalidate too
+PREDICTION_TABLES = ['predictions', 'history', 'prediction_history']
+admin_metrics.register('predictions', count_query(
+    "SELECT COALESCE(SUM(predictions), 0) FROM daily_prediction_counts WHERE source = 'v2'"),
+    PREDICTION_TABLES)
+admin_metrics.register('predictions_total', daily_stats.total_predictions, PREDICTION_TABLES)
+admin_metrics.register('user_activity', _user_activity, PREDICTION_TABLES)
+
+# History, prediction_history and audit_log rows are written behind the request
+# by a background thread in batched multi-row INSERTs (spilled to disk if MySQL is down).
+# Each batch also updates the daily dashboard rollups in the same transaction.
+history_writer = HistoryWriter(
+    db_connection,
+    batch_size=int(os.environ.get('HISTORY_BATCH_SIZE', 200)),
+    flush_interval=float(os.environ.get('HISTORY_FLUSH_INTERVAL', 1.0)),
+    max_queue=int(os.environ.get('HISTORY_MAX_QUEUE', 10000)),
+    spill_path=os.environ.get('HISTORY_SPILL_PATH', os.path.join('spill', 'history_spill.jsonl')),
+    dead_letter_path=os.environ.get('HISTORY_DEAD_LETTER_PATH'),
+    # predictions rows are dropped until migration 4 has created the table
+    deferred_tables=('predictions',),
+    on_batch=daily_stats.apply_rollups,
+    on_commit=lambda items: admin_metrics.invalidate_tables(*{table for table, _ in items})
+)
+atexit.register(history_writer.close)
 
 def log_audit(username, action, ip=None, status="OK"):
     """
-    Insert an entry into audit_log table.
+    Queue an entry for the audit_log table.
     audit_log schema: id, username, action, ip_address, status, created_at
     """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return
-        cursor = conn.cursor()
         if ip is None:
             ip = request.remote_addr if request else None
-        insert_sql = """
-            INSERT INTO audit_log (username, action, ip_address, status, created_at)
-            VALUES (%s, %s, %s, %s, NOW())
-        """
-        cursor.execute(insert_sql, (username, action, ip or '', status))
-        conn.commit()
+        history_writer.enqueue('audit_log', {
+            'username': username,
+            'action': action,
+            'ip_address': ip or '',
+            'status': status,
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
     except Exception as e:
         # don't break admin flows on logging failure; just print
         print("[AUDIT] logging failed:", e)
-    finally:
-        try:
-            cursor.close()
-            conn.close()
-        except:
-            pass
 
 
 def admin_required(f):
@@ -93,43 +215,272 @@ def admin_required(f):
     return decorated
 
 
-# load model 1
-try:
-    with open('model/disease_model.pkl', 'rb') as f:
-        temp = pickle.load(f)
+# Models are served through a registry (model_registry.py): each request takes the
+# bundle that is live when it starts, and a retrained model is loaded, smoke-checked
+# and swapped in without restarting (MODEL_WATCH_INTERVAL polling or /admin/models/reload).
+# Versioned artifacts (model_artifact.py) are memory-mapped for near-instant start-up
+# and a shared page cache; the pickles are only read for a model with no artifact yet.
+MODEL_VERIFY_CHECKSUM = os.environ.get('MODEL_VERIFY_CHECKSUM', '0') == '1'
+MODEL_SERVING = os.environ.get('MODEL_SERVING', 'thread')
+MODEL_SMOKE_MIN_TOP3 = float(os.environ.get('MODEL_SMOKE_MIN_TOP3', 0.9))
+V1_FILES = ('model/disease_model.pkl', 'model/disease_model_forest.npz')
+V2_FILES = ('model/disease_model_v2.pkl', 'model/outcome_model.pkl',
+            'model/disease_model_v2_forest.npz', 'model/outcome_model_forest.npz')
+
+# STARTUP_MODE=background: the symptom index, the models and the heavy imports are
+# loaded by a warm-up thread after this module is imported; /ready reports progress
+# and prediction views wait up to MODEL_READY_TIMEOUT seconds for their model.
+# STARTUP_MODE=lazy starts that warm-up on the first request instead (tests, tooling).
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')
+MODEL_READY_TIMEOUT = float(os.environ.get('MODEL_READY_TIMEOUT', 10))
+warmup = Warmup()
+
+# disease -> related symptoms, shown on the /predict result page (and the v1 smoke set)
+disease_symptom_index = DiseaseSymptomIndex(load=False)
+
+# Micro-batching: single-row predictions from concurrent requests arriving
+# within the window are scored together in one predict_proba call
+INFERENCE_BATCH_WINDOW = float(os.environ.get('INFERENCE_BATCH_WINDOW_MS', 2)) / 1000
+INFERENCE_MAX_BATCH = int(os.environ.get('INFERENCE_MAX_BATCH', 64))
+BATCH_OPTIONS = {'max_batch': INFERENCE_MAX_BATCH, 'max_wait': INFERENCE_BATCH_WINDOW}
+
+# Bounded pool for whole-batch scoring (/api/predict/batch, also awaited by asgi.py)
+inference_pool = InferencePool(
+    max_workers=int(os.environ.get('INFERENCE_POOL_WORKERS', 0)) or None,
+    max_pending=int(os.environ.get('INFERENCE_POOL_PENDING', 32))
+)
+atexit.register(inference_pool.shutdown)
+
+# Cache of model outputs for repeated inputs, keyed on the encoded input vector
+# and the version of the bundle that computed them
+prediction_cache = PredictionCache(
+    maxsize=int(os.environ.get('PREDICTION_CACHE_SIZE', 4096)),
+    ttl=float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+)
+
+# Bulk PDF reports for admins: rendered in worker processes, zipped under REPORT_JOB_DIR
+report_jobs = ReportJobs(
+    db_connection,
+    root=os.environ.get('REPORT_JOB_DIR', 'report_jobs'),
+    workers=int(os.environ.get('REPORT_JOB_WORKERS', 0)) or None,
+    max_rows=int(os.environ.get('REPORT_JOB_MAX_ROWS', 2000)),
+    keep_seconds=float(os.environ.get('REPORT_JOB_KEEP_HOURS', 24)) * 3600
+)
+atexit.register(report_jobs.close)
+
+# Prediction results behind /download_report/<id>; RESULT_STORE_DB=1 also keeps
+# them in prediction_results so every worker process (and a restart) sees them
+RESULT_STORE_DB = os.environ.get('RESULT_STORE_DB', '0') in ('1', 'true', 'yes')
+result_store = ResultStore(
+    maxsize=int(os.environ.get('RESULT_STORE_SIZE', 10000)),
+    ttl=float(os.environ.get('RESULT_STORE_TTL', 24 * 3600)),
+    connection=db_connection if RESULT_STORE_DB else None,
+    enqueue=history_writer.enqueue if RESULT_STORE_DB else None
+)
+
+
+def _serve_in_processes(model, version, forests):
+    """
+    MODEL_SERVING=process: the flat forests live in one read-only shared-memory
+    segment per model version (shared by every worker process of this host) and
+    are scored in a process pool attached to it, outside this GIL.
+    Returns (forests as shared views, pool, close callables); on failure the
+    private forests are scored in-process.
+    """
+    from shared_forest import ForestProcessPool, open_shared  # multiprocessing only in this mode
+    shared = None
+    try:
+        shared = open_shared(forests, f'{model}:{version}')
+        pool = ForestProcessPool(
+            shared.name,
+            forests=shared.forests,
+            max_workers=int(os.environ.get('INFERENCE_POOL_WORKERS', 0)) or None,
+            max_pending=int(os.environ.get('INFERENCE_POOL_PENDING', 32))
+        )
+    except Exception as e:
+        print(f"[MODEL] Shared-memory serving unavailable for {model}, scoring in-process: {e}")
+        if shared is not None:
+            shared.close()
+        return forests, None, []
+    return shared.forests, pool, [pool.shutdown, shared.close]
+
+
+def v1_disk_version():
+    return current_version('v1') or file_version(*V1_FILES)
+
+
+def load_v1():
+    if current_version('v1') is not None:
+        # a broken artifact fails the reload instead of silently falling back to the pickles
+        artifact = load_artifact('v1', verify=MODEL_VERIFY_CHECKSUM)
+        print(f"[MODEL] Mapped artifact v1 version {artifact.version}.")
+        version = artifact.version
+        model = forest = artifact.forests['disease']
+        encoder = artifact.decoder('disease')
+        symptoms = artifact.metadata['symptom_vocabulary']
+    else:
+        version = file_version(*V1_FILES)
+        with open('model/disease_model.pkl', 'rb') as f:
+            temp = pickle.load(f)
         if isinstance(temp, tuple) and len(temp) >= 3:
-            model_old, disease_encoder_old, symptom_list = temp[0], temp[1], temp[2]
+            model, encoder, symptoms = temp[0], temp[1], temp[2]
         elif isinstance(temp, tuple) and len(temp) == 2:
-            model_old, disease_encoder_old = temp
-            symptom_list = None
+            model, encoder = temp
+            symptoms = None
         else:
-            model_old = temp
-            disease_encoder_old = None
-            symptom_list = None
-    print("[MODEL] Loaded disease_model.pkl (old symptom-based).")
-except Exception as e:
-    print(f"[MODEL] Failed to load model/disease_model.pkl: {e}")
-    model_old = None
-    disease_encoder_old = None
-    symptom_list = None
-
-# load model 2
-try:
-    with open("model/disease_model_v2.pkl", "rb") as f:
-        disease_model_v2, disease_encoder_v2 = pickle.load(f)
-    print("[MODEL] Loaded disease_model_v2.pkl (v2).")
-except Exception as e:
-    print(f"[MODEL] Failed to load model/disease_model_v2.pkl: {e}")
-    disease_model_v2 = None
-    disease_encoder_v2 = None
-
-try:
-    with open("model/outcome_model.pkl", "rb") as f:
-        outcome_model = pickle.load(f)
-    print("[MODEL] Loaded outcome_model.pkl.")
-except Exception as e:
-    print(f"[MODEL] Failed to load model/outcome_model.pkl: {e}")
-    outcome_model = None
+            model, encoder, symptoms = temp, None, None
+        print("[MODEL] Loaded disease_model.pkl (old symptom-based).")
+        # Flattened forest exported at training time; when present it is used for
+        # scoring instead of sklearn (same probabilities, no DataFrame/validation overhead)
+        forest = load_forest_if_present('model/disease_model_forest.npz')
+
+    pool, on_close = None, []
+    if forest is not None and MODEL_SERVING == 'process':
+        forests, pool, on_close = _serve_in_processes('v1', version, {'disease': forest})
+        forest = forests['disease']
+
+    def score(X):
+        if pool is not None:
+            return pool.predict_proba('disease', X)
+        if forest is not None:
+            return forest.predict_proba(X)
+        return predict_proba_batch(model, X, symptoms)
+
+    return ModelBundle('v1', version, score, parts={
+        'model': model,
+        'encoder': encoder,
+        'symptom_list': symptoms,
+        # name -> column index for encoding selected symptoms in O(k)
+        'symptom_vocab': SymptomVocabulary(symptoms) if symptoms is not None else None,
+    }, batch_options=BATCH_OPTIONS, on_close=on_close)
+
+
+def smoke_v1(bundle):
+    """Each disease's own symptoms must rank it in the top 3 for most diseases."""
+    if bundle.symptom_vocab is None:
+        raise ValueError("model has no symptom vocabulary")
+    diseases = disease_symptom_index.diseases()
+    rows = [disease_symptom_index.get(d) for d in diseases] or [[]]
+    X = bundle.symptom_vocab.encode_batch(rows)
+    probs = bundle.score(X)
+    check_probabilities(probs, len(rows), len(bundle.model.classes_))
+    if diseases:
+        tops = top_k_labels(probs, bundle.model, bundle.encoder, 3)
+        hits = sum(d.strip() in {t['disease'].strip() for t in top} for d, top in zip(diseases, tops))
+        if hits / len(diseases) < MODEL_SMOKE_MIN_TOP3:
+            raise ValueError(f"only {hits}/{len(diseases)} diseases rank in the top 3 for their own symptoms")
+
+
+def v2_disk_version():
+    return (current_version('v2') or file_version(*V2_FILES)) + '|' + file_version(LOOKUP_PATH)
+
+
+def load_v2():
+    if current_version('v2') is not None:
+        # a broken artifact fails the reload instead of silently falling back to the pickles
+        artifact = load_artifact('v2', verify=MODEL_VERIFY_CHECKSUM)
+        print(f"[MODEL] Mapped artifact v2 version {artifact.version}.")
+        version = artifact.version
+        model = forest = artifact.forests['disease']
+        encoder = artifact.decoder('disease')
+        outcome = forest_outcome = artifact.forests['outcome']
+    else:
+        version = file_version(*V2_FILES)
+        with open("model/disease_model_v2.pkl", "rb") as f:
+            model, encoder = pickle.load(f)
+        print("[MODEL] Loaded disease_model_v2.pkl (v2).")
+        with open("model/outcome_model.pkl", "rb") as f:
+            outcome = pickle.load(f)
+        print("[MODEL] Loaded outcome_model.pkl.")
+        forest = load_forest_if_present('model/disease_model_v2_forest.npz')
+        forest_outcome = load_forest_if_present('model/outcome_model_forest.npz')
+    # Precomputed v2 answers for the whole form input space (train_model_v2.py --lookup);
+    # inputs outside the table are scored live
+    lookup = load_lookup_table()
+
+    pool, on_close = None, []
+    flat = forest is not None and forest_outcome is not None
+    if flat and MODEL_SERVING == 'process':
+        forests, pool, on_close = _serve_in_processes(
+            'v2', version, {'disease': forest, 'outcome': forest_outcome})
+        forest, forest_outcome = forests['disease'], forests['outcome']
+
+    def score(X):
+        """Disease probabilities and outcome labels for a matrix of v2 inputs."""
+        if pool is not None:
+            return pool.proba_and_predict('disease', 'outcome', X)
+        if flat:
+            return forest.predict_proba(X), forest_outcome.predict(X)
+        input_df = pd.DataFrame(X, columns=V2_FEATURES)
+        return model.predict_proba(input_df), outcome.predict(input_df)
+
+    def score_rows(X):
+        probs, outcomes = score(X)
+        return list(zip(probs, outcomes))
+
+    return ModelBundle('v2', version + '|' + file_version(LOOKUP_PATH), score, parts={
+        'model': model,
+        'encoder': encoder,
+        'outcome_model': outcome,
+        'lookup': lookup,
+    }, batch_fn=score_rows, batch_options=BATCH_OPTIONS, on_close=on_close)
+
+
+def smoke_v2(bundle):
+    """Valid distributions and outcomes on a fixed sample of form inputs; drops a stale lookup table."""
+    X = np.random.RandomState(0).randint(V2_AXIS_MIN, V2_AXIS_MAX + 1, size=(64, len(V2_FEATURES)))
+    probs, outcomes = bundle.score(X)
+    check_probabilities(probs, len(X), len(bundle.model.classes_))
+    if not set(np.asarray(outcomes).tolist()) <= {0, 1}:
+        raise ValueError("outcome model returned labels other than 0/1")
+    if bundle.lookup is not None:
+        # compare top probabilities, not names: tied classes may be listed in either order
+        table = [bundle.lookup.lookup(x) for x in X]
+        if any(t is not None and (t[0][0][1] != round(float(p.max()) * 100, 2) or t[1] != int(o))
+               for t, p, o in zip(table, probs, outcomes)):
+            print("[MODEL] v2 lookup table was built from another model; scoring v2 live.")
+            bundle.lookup = None
+
+
+models = ModelRegistry(
+    on_swap=lambda name, bundle: prediction_cache.set_version(name, bundle.version),
+    retire_after=float(os.environ.get('MODEL_RETIRE_AFTER', 30))
+)
+models.register('v1', load_v1, v1_disk_version, smoke_v1, load_now=False)
+models.register('v2', load_v2, v2_disk_version, smoke_v2, load_now=False)
+atexit.register(models.close)
+
+warmup.add('symptom_index', disease_symptom_index.reload)
+warmup.add('schema', check_schema, required=False)
+# readiness follows the registry: a model that failed here but was loaded by
+# the watcher (or a manual reload) later makes the worker ready
+warmup.add('model:v1', lambda: models.reload('v1', force=True), ready=lambda: models.get('v1') is not None)
+warmup.add('model:v2', lambda: models.reload('v2', force=True), ready=lambda: models.get('v2') is not None)
+def _warm_imports():
+    preload(pd, mysql_connector, pdf_reports)
+    pdf_reports.get_engine()  # decodes the logo and builds the report styles
+
+
+warmup.add('imports', _warm_imports, required=False)
+warmup.add('model_watch', lambda: models.watch(float(os.environ.get('MODEL_WATCH_INTERVAL', 10))),
+           required=False)
+if STARTUP_MODE == 'background':
+    warmup.start()
+elif STARTUP_MODE == 'lazy':
+    @app.before_request
+    def start_warmup():
+        warmup.start()
+else:
+    warmup.run()
+
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once the start-up warm-up is done, else 503 with its progress."""
+    status = warmup.status()
+    status['models'] = {name: models.get(name).version if models.get(name) else None
+                        for name in models.names()}
+    return jsonify(status), 200 if status['ready'] else 503
 
 
 @app.route('/')
@@ -138,96 +489,101 @@ def index():
     return render_template('index.html', username=username)
 
 
+def disease_report_details(disease):
+    """(description, remedies, red flags) shown for a v1 prediction and in its PDF report."""
+    info = disease_info_map.get(disease, {})
+    description = info.get(
+        "description",
+        f"No curated description available for {disease} yet."
+    )
+
+    remedies_list = info.get("remedies")
+    if not remedies_list:
+        rem_text = remedy_dict_v2.get(disease)
+        remedies_list = [rem_text] if rem_text else [
+            "General care: rest, stay hydrated, and consider OTC symptom relief.",
+            "Consult a clinician if symptoms persist or worsen."
+        ]
+
+    red_flags = info.get("red_flags", [
+        "Severe or worsening shortness of breath.",
+        "Persistent high fever (>39°C / 102.2°F) for more than 48 hours.",
+        "Chest pain, confusion, fainting, or severe dehydration.",
+        "Symptoms persist beyond 10–14 days or suddenly get worse."
+    ])
+    return description, remedies_list, red_flags
+
+
 @app.route('/predict', methods=['GET', 'POST'])
 def predict():
     if request.method == 'POST':
         selected_symptoms = request.form.getlist('symptoms')
 
-        # Create input vector and predict
-        if symptom_list is None:
+        # Create input vector and predict (with the model version live right now)
+        m = models.get('v1', wait=MODEL_READY_TIMEOUT)
+        if m is None or m.symptom_list is None:
             return "Symptom list not loaded on server.", 500
 
-        input_vector = [
-            1 if symptom in selected_symptoms else 0 for symptom in symptom_list]
-        input_df = pd.DataFrame([input_vector], columns=symptom_list)
+        input_vector = m.symptom_vocab.encode(selected_symptoms)
 
         # ---- Prediction + Confidence ----
         try:
-            probs = model_old.predict_proba(input_df)[0]
+            probs = prediction_cache.get_or_compute(
+                'v1', np.packbits(input_vector).tobytes(),
+                lambda: m.batcher.predict(input_vector), version=m.version)
             top_idx = int(np.argmax(probs))
-            encoded_label = model_old.classes_[top_idx]
+            encoded_label = m.model.classes_[top_idx]
             predicted_disease = (
-                disease_encoder_old.inverse_transform([encoded_label])[0]
-                if disease_encoder_old is not None else str(encoded_label)
+                m.encoder.inverse_transform([encoded_label])[0]
+                if m.encoder is not None else str(encoded_label)
             )
             confidence = round(float(probs[top_idx]) * 100, 2)
         except Exception:
-            pred_enc = model_old.predict(input_df)[0]
+            input_df = pd.DataFrame([input_vector], columns=m.symptom_list)
+            pred_enc = m.model.predict(input_df)[0]
             predicted_disease = (
-                disease_encoder_old.inverse_transform([pred_enc])[0]
-                if disease_encoder_old is not None else str(pred_enc)
+                m.encoder.inverse_transform([pred_enc])[0]
+                if m.encoder is not None else str(pred_enc)
             )
             confidence = None
 
-        # ---- Load dataset to extract related symptoms ----
-        df = pd.read_csv('dataset/dataset.csv')
-        symptom_cols = [
-            col for col in df.columns if col.startswith('Symptom_')]
-
-        related_rows = df[df['Disease'] == predicted_disease]
-        disease_symptoms = set()
-        for _, row in related_rows.iterrows():
-            for col in symptom_cols:
-                symptom = row[col]
-                if pd.notna(symptom) and str(symptom).strip().lower() != 'none' and str(symptom).strip() != '':
-                    disease_symptoms.add(str(symptom).strip())
-        disease_symptoms = sorted(disease_symptoms)
-
-        info = disease_info_map.get(predicted_disease, {})
+        # ---- Related symptoms from the precomputed index ----
+        disease_symptoms = list(disease_symptom_index.get(predicted_disease))
 
         # ---- Build medical report fields ----
-        description = info.get(
-            "description",
-            f"No curated description available for {predicted_disease} yet."
-        )
-
-        remedies_list = info.get("remedies")
-        if not remedies_list:
-            rem_text = remedy_dict_v2.get(predicted_disease)
-            remedies_list = [rem_text] if rem_text else [
-                "General care: rest, stay hydrated, and consider OTC symptom relief.",
-                "Consult a clinician if symptoms persist or worsen."
-            ]
-
-        red_flags = info.get("red_flags", [
-            "Severe or worsening shortness of breath.",
-            "Persistent high fever (>39°C / 102.2°F) for more than 48 hours.",
-            "Chest pain, confusion, fainting, or severe dehydration.",
-            "Symptoms persist beyond 10–14 days or suddenly get worse."
-        ])
+        description, remedies_list, red_flags = disease_report_details(predicted_disease)
 
         # ---- Save history ----
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         if 'username' in session:
             username = session['username']
             symptoms_str = ", ".join(selected_symptoms)
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-            conn = get_db_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    insert_query = """
-                        INSERT INTO history (username, symptoms, prediction, timestamp)
-                        VALUES (%s, %s, %s, %s)
-                    """
-                    cursor.execute(
-                        insert_query, (username, symptoms_str, predicted_disease, timestamp))
-                    conn.commit()
-                except Error as e:
-                    print(f"[DB] Failed to insert history: {e}")
-                finally:
-                    cursor.close()
-                    conn.close()
+            history_writer.enqueue('history', {
+                'username': username,
+                'symptoms': symptoms_str,
+                'prediction': predicted_disease,
+                'timestamp': timestamp,
+            })
+            history_writer.enqueue('predictions', {
+                'username': username,
+                'model_version': 'v1',
+                'input_encoded': prediction_store.encode_v1(input_vector),
+                'top_disease_1': predicted_disease,
+                'predicted_at': timestamp,
+            })
+
+        # The PDF report is rendered from the stored result, see download_prediction_report
+        prediction_id = result_store.put('v1', {
+            'username': session.get('username', 'Guest'),
+            'date': timestamp,
+            'disease': predicted_disease,
+            'confidence': confidence if confidence is not None else 'N/A',
+            'description': description,
+            'symptoms': disease_symptoms,
+            'remedies': remedies_list,
+            'red_flags': red_flags,
+        }, username=session.get('username'))
 
         return render_template(
             'result.html',
@@ -236,10 +592,12 @@ def predict():
             confidence=confidence,
             description=description,
             remedies=remedies_list,
-            red_flags=red_flags
+            red_flags=red_flags,
+            prediction_id=prediction_id
         )
 
-    return render_template('predict.html', symptoms=symptom_list)
+    m = models.get('v1', wait=MODEL_READY_TIMEOUT)
+    return render_template('predict.html', symptoms=m.symptom_list if m is not None else None)
 
 
 @app.route('/predict_v2', methods=['GET', 'POST'])
@@ -254,21 +612,27 @@ def predict_v2():
         bp = int(request.form.get('bp', 0))
         cholesterol = int(request.form.get('cholesterol', 0))
 
-        input_df = pd.DataFrame(
-            [[fever, cough, fatigue, breathing, age, gender, bp, cholesterol]],
-            columns=[
-                "Fever", "Cough", "Fatigue", "Difficulty Breathing",
-                "Age", "Gender", "Blood Pressure", "Cholesterol Level"
-            ]
-        )
+        m = models.get('v2', wait=MODEL_READY_TIMEOUT)
+        if m is None:
+            return "Prediction V2 models not loaded on server.", 500
 
-        probs = disease_model_v2.predict_proba(input_df)[0]
-        top_indices = np.argsort(probs)[::-1][:3]
+        input_vector = np.array(
+            [fever, cough, fatigue, breathing, age, gender, bp, cholesterol], dtype=np.int64)
+        looked_up = m.lookup.lookup(input_vector) if m.lookup is not None else None
+        if looked_up is not None:
+            top, outcome_pred = looked_up
+        else:
+            probs, outcome_pred = prediction_cache.get_or_compute(
+                'v2', input_vector.tobytes(), lambda: m.batcher.predict(input_vector),
+                version=m.version)
+            top = [
+                (m.encoder.inverse_transform([m.model.classes_[idx]])[0],
+                 round(float(probs[idx]) * 100, 2))
+                for idx in np.argsort(probs)[::-1][:3]
+            ]
 
         top_diseases = []
-        for idx in top_indices:
-            disease_name = disease_encoder_v2.inverse_transform([idx])[0]
-            probability = round(float(probs[idx]) * 100, 2)
+        for disease_name, probability in top:
             remedy_text = remedy_dict_v2.get(
                 disease_name, "No remedy available.")
             top_diseases.append({
@@ -278,84 +642,176 @@ def predict_v2():
             })
 
         # Outcome prediction
-        outcome_pred = int(outcome_model.predict(input_df)[0])
-        outcome_text = "Positive" if outcome_pred == 1 else "Negative"
+        outcome_text = "Positive" if int(outcome_pred) == 1 else "Negative"
 
         username = session.get('username')
         if not username:
             username = "Guest"  # Allow predictions as Guest
 
-        # Store in MySQL
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        sql = """
-            INSERT INTO prediction_history
-            (username, fever, cough, fatigue, breathing, age, gender, bp, cholesterol,
-            top_disease_1, top_disease_2, top_disease_3, outcome)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,
-                    %s,%s,%s,%s)
-        """
-
-
-        cursor.execute(sql, (
-            username,
-            fever, cough, fatigue, breathing, age, gender, bp, cholesterol,
-            top_diseases[0]['name'],
-            top_diseases[1]['name'],
-            top_diseases[2]['name'],
-            outcome_text
-        ))
-        conn.commit()
-        conn.close()
+        # Store in MySQL (written behind the request)
+        predicted_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        history_writer.enqueue('prediction_history', {
+            'username': username,
+            'fever': fever, 'cough': cough, 'fatigue': fatigue, 'breathing': breathing,
+            'age': age, 'gender': gender, 'bp': bp, 'cholesterol': cholesterol,
+            'top_disease_1': top_diseases[0]['name'],
+            'top_disease_2': top_diseases[1]['name'],
+            'top_disease_3': top_diseases[2]['name'],
+            'outcome': outcome_text,
+            'predicted_at': predicted_at,
+        })
+        history_writer.enqueue('predictions', {
+            'username': username,
+            'model_version': 'v2',
+            'input_encoded': prediction_store.encode_v2(input_vector),
+            'top_disease_1': top_diseases[0]['name'],
+            'top_disease_2': top_diseases[1]['name'],
+            'top_disease_3': top_diseases[2]['name'],
+            'outcome': outcome_text,
+            'predicted_at': predicted_at,
+        })
+
+        prediction_id = result_store.put('v2', {
+            'username': username,
+            'date': predicted_at,
+            'diseases': [(d['name'], float(d['probability'])) for d in top_diseases],
+            'outcome': outcome_text,
+            'remedies': v2_report_remedies(d['name'] for d in top_diseases),
+        }, username=session.get('username'))
 
         return render_template('result_v2.html',
                                top_diseases=top_diseases,
-                               outcome=outcome_text)
+                               outcome=outcome_text,
+                               prediction_id=prediction_id)
 
     return render_template('predict_v2.html')
 
 
+@app.route('/api/predict/batch', methods=['POST'])
+def api_predict_batch():
+    """
+    Score many inputs in one vectorized predict_proba call.
+
+    JSON body:
+      - model: "v1" (symptom model) or "v2" (patient profile model)
+      - rows: v1 -> list of symptom-name lists, v2 -> list of profile dicts
+              using the /predict_v2 form fields (fever, cough, ..., cholesterol)
+      - vectors: v1 only, alternative to rows: list of 0/1 symptom vectors
+      - top_k: diseases returned per row (default 3)
+
+    Malformed bodies (not an object, rows of the wrong type, vectors for v2)
+    get a 400 with a message.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        body, status = inference_pool.call(batch_predict, payload)
+    except PoolBusy as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify(body), status
+
+
+def batch_predict(payload):
+    """Validate, encode and score a batch request. Returns (response dict, HTTP status)."""
+    if not isinstance(payload, dict):
+        return {'error': 'JSON body must be an object'}, 400
+    model_name = payload.get('model', 'v1')
+    rows = payload.get('rows')
+    vectors = payload.get('vectors')
+    try:
+        top_k = int(payload.get('top_k', 3))
+    except (TypeError, ValueError):
+        return {'error': 'top_k must be an integer'}, 400
+
+    data = rows if rows is not None else vectors
+    if not isinstance(data, list) or not data:
+        return {'error': 'rows (or vectors) must be a non-empty list'}, 400
+    if len(data) > MAX_BATCH_ROWS:
+        return {'error': f'At most {MAX_BATCH_ROWS} rows per batch'}, 400
+    if model_name == 'v2':
+        if rows is None:
+            return {'error': 'v2 takes rows (profile objects), not vectors'}, 400
+        row_type, row_error = dict, 'must be a profile object'
+    elif rows is not None:
+        row_type, row_error = list, 'must be a list of symptom names'
+    else:
+        row_type, row_error = list, 'must be a list of 0/1 values'
+    for r, row in enumerate(data):
+        if not isinstance(row, row_type) or \
+                (model_name != 'v2' and rows is not None and not all(isinstance(n, str) for n in row)):
+            return {'error': f'Row {r} {row_error}'}, 400
+
+    try:
+        if model_name == 'v1':
+            m = models.get('v1', wait=MODEL_READY_TIMEOUT)
+            if m is None or m.symptom_list is None:
+                return {'error': 'Symptom model not loaded on server.'}, 503
+            if rows is not None:
+                X = m.symptom_vocab.encode_batch(rows, strict=True)
+            else:
+                X = encode_symptom_vectors(vectors, m.symptom_list)
+            probs = m.score(X)
+            results = [{'top': top} for top in top_k_labels(probs, m.model, m.encoder, top_k)]
+
+        elif model_name == 'v2':
+            m = models.get('v2', wait=MODEL_READY_TIMEOUT)
+            if m is None:
+                return {'error': 'Prediction V2 models not loaded on server.'}, 503
+            X = encode_profiles(rows)
+            probs, outcomes = m.score(X)
+            results = [
+                {'top': top, 'outcome': "Positive" if int(outcome) == 1 else "Negative"}
+                for top, outcome in zip(top_k_labels(probs, m.model, m.encoder, top_k), outcomes)
+            ]
+
+        else:
+            return {'error': 'model must be "v1" or "v2"'}, 400
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    return {'model': model_name, 'version': m.version, 'count': len(results), 'predictions': results}, 200
+
+
 @app.route('/history')
 def view_history():
     if 'username' not in session:
         return redirect('/login')
 
     username = session['username']
-    conn = get_db_connection()
-    history = []
-    if conn:
-        try:
+    page = empty_page(page_size(request.args.get('limit')))
+    with db_connection() as conn:
+        if conn:
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT symptoms, prediction, timestamp FROM history WHERE username = %s ORDER BY timestamp DESC", (username,))
-            history = cursor.fetchall()
-        except Error as e:
-            print(f"[DB] Failed to fetch history: {e}")
-        finally:
-            cursor.close()
-            conn.close()
+            try:
+                page = fetch_keyset_page(
+                    cursor, "SELECT id, symptoms, prediction, timestamp FROM history", ('timestamp', 'id'),
+                    where=["username = %s"], params=[username],
+                    after=request.args.get('after'), before=request.args.get('before'), limit=page.limit)
+            except mysql_connector.Error as e:
+                print(f"[DB] Failed to fetch history: {e}")
+            finally:
+                cursor.close()
 
-    return render_template('history.html', history=history)
+    return render_template('history.html', history=page.rows, page=page)
 
 @app.route('/admin_history')
 def admin_history():
     if 'username' not in session or session.get('role') != 'admin':
         return "Access denied", 403
 
-    conn = get_db_connection()
-    records = []
-    if conn:
-        try:
+    page = empty_page(page_size(request.args.get('limit')))
+    with db_connection() as conn:
+        if conn:
             cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM history ORDER BY timestamp DESC")
-            records = cursor.fetchall()
-        except Error as e:
-            print(f"[DB] Failed to fetch admin history: {e}")
-        finally:
-            cursor.close()
-            conn.close()
+            try:
+                page = fetch_keyset_page(
+                    cursor, "SELECT * FROM history", ('timestamp', 'id'),
+                    after=request.args.get('after'), before=request.args.get('before'), limit=page.limit)
+            except mysql_connector.Error as e:
+                print(f"[DB] Failed to fetch admin history: {e}")
+            finally:
+                cursor.close()
 
-    return render_template('admin_history.html', history=records)
+    return render_template('admin_history.html', history=page.rows, page=page)
 
 
 @app.route('/history_v2')
@@ -364,20 +820,21 @@ def history_v2():
         return redirect(url_for('login'))
 
     username = session['username']
+    page = empty_page(page_size(request.args.get('limit')))
+    with db_connection() as conn:
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                page = fetch_keyset_page(
+                    cursor, "SELECT * FROM prediction_history", ('predicted_at', 'id'),
+                    where=["username = %s"], params=[username],
+                    after=request.args.get('after'), before=request.args.get('before'), limit=page.limit)
+            except mysql_connector.Error as e:
+                print(f"[DB] Failed to fetch v2 history: {e}")
+            finally:
+                cursor.close()
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("""
-        SELECT * FROM prediction_history
-        WHERE username = %s
-        ORDER BY predicted_at DESC
-    """, (username,))
-    
-    history = cursor.fetchall()
-    conn.close()
-
-    return render_template('history_v2.html', history=history)
+    return render_template('history_v2.html', history=page.rows, page=page)
 
 
 @app.route('/admin_history_v2')
@@ -385,270 +842,78 @@ def admin_history_v2():
     if 'username' not in session or session.get('role') != 'admin':
         return redirect(url_for('login'))
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("""
-        SELECT *
-        FROM prediction_history
-        ORDER BY predicted_at DESC
-    """)
-    
-    history = cursor.fetchall()
-    conn.close()
-
-    return render_template('admin_history_v2.html', history=history)
+    page = empty_page(page_size(request.args.get('limit')))
+    with db_connection() as conn:
+        if conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                page = fetch_keyset_page(
+                    cursor, "SELECT * FROM prediction_history", ('predicted_at', 'id'),
+                    after=request.args.get('after'), before=request.args.get('before'), limit=page.limit)
+            except mysql_connector.Error as e:
+                print(f"[DB] Failed to fetch admin v2 history: {e}")
+            finally:
+                cursor.close()
 
-@app.route('/download_report')
-def download_report():
+    return render_template('admin_history_v2.html', history=page.rows, page=page)
 
-    disease = request.args.get('disease', 'Unknown')
-    confidence = request.args.get('confidence', 'N/A')
-    description = request.args.get('description', 'No description available')
-    symptoms = request.args.get('symptoms', '').split(",") if request.args.get('symptoms') else []
-    remedies = request.args.get('remedies', '').split(",") if request.args.get('remedies') else []
-    red_flags = request.args.get('red_flags', '').split(",") if request.args.get('red_flags') else []
-    username = session.get('username', 'Guest')
+def _list_arg(name):
+    value = request.args.get(name)
+    return value.split(",") if value else []
 
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # === HEADER BAR WITH LOGO + TITLE ===
-    p.setFillColor(colors.HexColor("#1a5276"))
-    p.rect(0, height - 90, width, 90, fill=1, stroke=0)
-
-    logo_path = os.path.join("static", "images", "logo.png")
-    if os.path.exists(logo_path):
-        p.drawImage(logo_path, 40, height - 80, width=60, height=60, mask='auto')
-
-    p.setFillColor(colors.white)
-    p.setFont("Helvetica-Bold", 22)
-    p.drawString(120, height - 50, "AI Disease Prediction System")
-
-    # === PATIENT INFO BOX ===
-    y = height - 120
-    p.setFillColor(colors.HexColor("#f8f9f9"))
-    p.roundRect(40, y - 50, width - 80, 60, 10, fill=1, stroke=0)
-
-    p.setFillColor(colors.HexColor("#2c3e50"))
-    p.setFont("Helvetica", 12)
-    p.drawString(60, y - 20, f"👤 Patient: {username}")
-    p.drawString(320, y - 20, f"📅 Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-
-    # === DISEASE PREDICTION ===
-    y -= 90
-    p.setFillColor(colors.HexColor("#f4f6f7"))
-    p.roundRect(40, y - 70, width - 80, 80, 10, fill=1, stroke=0)
-
-    p.setFillColor(colors.HexColor("#1a5276"))
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(60, y - 20, "Predicted Disease:")
-    p.setFillColor(colors.black)
-    p.setFont("Helvetica", 12)
-    p.drawString(220, y - 20, disease)
-
-    p.setFillColor(colors.HexColor("#1a5276"))
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(60, y - 45, "Confidence:")
-    p.setFillColor(colors.black)
-    p.setFont("Helvetica", 12)
-    p.drawString(220, y - 45, f"{confidence}%")
-
-    # === SECTION HELPER ===
-    def section(title, color, y):
-        p.setFillColor(color)
-        p.rect(40, y - 28, width - 80, 28, fill=1, stroke=0)
-        p.setFillColor(colors.white)
-        p.setFont("Helvetica-Bold", 13)
-        p.drawString(50, y - 17, title)
-        return y - 45
-
-    # === SUMMARY ===
-    y = section("📖 Summary", colors.HexColor("#2980b9"), y - 100)
-    p.setFillColor(colors.black)
-    p.setFont("Helvetica", 11)
-    text = p.beginText(50, y)
-    text.setLeading(15)
-    for line in description.split(". "):
-        text.textLine(f"● {line.strip()}")
-    p.drawText(text)
-    y = text.getY() - 20
-
-    # === SYMPTOMS ===
-    if symptoms:
-        y = section("📝 Related Symptoms", colors.HexColor("#8e44ad"), y)
-        p.setFont("Helvetica", 11)
-        p.setFillColor(colors.HexColor("#2c3e50"))
-        for s in symptoms:
-            p.drawString(60, y, f"● {s.strip()}")
-            y -= 15
-        y -= 10
-
-    # === REMEDIES ===
-    if remedies:
-        y = section("✅ Suggested Remedies", colors.HexColor("#27ae60"), y)
-        p.setFont("Helvetica", 11)
-        p.setFillColor(colors.HexColor("#2c3e50"))
-        for r in remedies:
-            p.drawString(60, y, f"● {r.strip()}")
-            y -= 15
-        y -= 10
-
-    # === RED FLAGS ===
-    if red_flags:
-        y = section("⚠️ When to Seek Medical Care", colors.HexColor("#c0392b"), y)
-        p.setFont("Helvetica", 11)
-        p.setFillColor(colors.HexColor("#2c3e50"))
-        for f in red_flags:
-            p.drawString(60, y, f"● {f.strip()}")
-            y -= 15
-
-    # === FOOTER ===
-    p.setFont("Helvetica-Oblique", 9)
-    p.setFillColor(colors.HexColor("#7f8c8d"))
-    p.drawCentredString(width / 2, 30, "© 2025 AI Disease Prediction System")
-
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-
-    return send_file(buffer, as_attachment=True,
-                     download_name=f"prediction_report_{disease}.pdf",
-                     mimetype='application/pdf')
 
-@app.route('/download_report_v2')
-def download_report_v2():
+def v2_report_remedies(diseases):
+    return [f"<b>{disease}:</b> {remedy_dict_v2[disease]}"
+            for disease in diseases if disease in remedy_dict_v2]
 
-    username = session.get('username', 'Guest')
 
-    # Collect params
-    top1 = request.args.get('top1', 'Unknown')
-    prob1 = request.args.get('prob1', '0')
-    top2 = request.args.get('top2', 'Unknown')
-    prob2 = request.args.get('prob2', '0')
-    top3 = request.args.get('top3', 'Unknown')
-    prob3 = request.args.get('prob3', '0')
-    outcome = request.args.get('outcome', 'N/A')
-
-    # Remedies
-    from remedies_v2 import remedy_dict_v2
-    remedies = []
-    for disease in [top1, top2, top3]:
-        if disease in remedy_dict_v2:
-            remedies.append(f"<b>{disease}:</b> {remedy_dict_v2[disease]}")
-
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # === HEADER BAR ===
-    p.setFillColor(colors.HexColor("#154360"))
-    p.rect(0, height - 100, width, 100, fill=1, stroke=0)
-
-    logo_path = os.path.join("static", "images", "logo.png")
-    if os.path.exists(logo_path):
-        p.drawImage(logo_path, 40, height - 90, width=70, height=70, mask='auto')
-
-    p.setFillColor(colors.white)
-    p.setFont("Helvetica-Bold", 24)
-    p.drawString(130, height - 55, "AI Disease Prediction System")
-
-    # === PATIENT INFO ===
-    y = height - 140
-    p.setFillColor(colors.HexColor("#f4f6f7"))
-    p.roundRect(40, y - 70, width - 80, 60, 12, fill=1, stroke=0)
-
-    p.setFillColor(colors.HexColor("#2c3e50"))
-    p.setFont("Helvetica", 11)
-    p.drawString(60, y - 30, f"👤 Patient: {username}")
-    p.drawString(60, y - 50, f"📅 Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    p.drawString(320, y - 30, "🧬 Model: Prediction V2")
-
-    # === PREDICTIONS ===
-    y -= 110
-    p.setFillColor(colors.HexColor("#2874A6"))
-    p.roundRect(40, y - 30, width - 80, 30, 8, fill=1, stroke=0)
-    p.setFillColor(colors.white)
-    p.setFont("Helvetica-Bold", 13)
-    p.drawString(50, y - 18, "Predicted Diseases & Confidence")
-
-    y -= 50
-    diseases = [(top1, prob1), (top2, prob2), (top3, prob3)]
-    p.setFont("Helvetica", 11)
-
-    for disease, prob in diseases:
-        # disease label
-        p.setFillColor(colors.HexColor("#2c3e50"))
-        p.drawString(60, y, f"● {disease} ({prob}%)")
-
-        # bar aligned
-        try:
-            prob_val = float(prob)
-        except:
-            prob_val = 0
-        bar_len = (prob_val / 100) * 200
-        p.setFillColor(colors.HexColor("#5DADE2"))
-        p.roundRect(300, y - 6, bar_len, 8, 3, fill=1, stroke=0)
-
-        y -= 25
-
-    # add confidence scale
-    p.setFont("Helvetica-Oblique", 9)
-    p.setFillColor(colors.HexColor("#7f8c8d"))
-    p.drawString(300, y, "0%")
-    p.drawRightString(500, y, "100%")
-
-    # === OUTCOME ===
-    y -= 60
-    outcome_color = colors.HexColor("#27ae60") if outcome == "Negative" else colors.HexColor("#c0392b")
-    icon = "✅" if outcome == "Negative" else "❌"
-
-    p.setFillColor(outcome_color)
-    p.roundRect(70, y - 90, width - 140, 90, 18, fill=1, stroke=0)
-
-    p.setFillColor(colors.white)
-    p.setFont("Helvetica-Bold", 22)
-    p.drawCentredString(width / 2, y - 50, f"{icon} Final Outcome: {outcome}")
-
-    # === REMEDIES ===
-    if remedies:
-        y -= 140
-        p.setFillColor(colors.HexColor("#138D75"))
-        p.roundRect(40, y - 30, width - 80, 30, 8, fill=1, stroke=0)
-        p.setFillColor(colors.white)
-        p.setFont("Helvetica-Bold", 13)
-        p.drawString(50, y - 18, "Suggested Remedies")
-
-        y -= 40
-        styles = getSampleStyleSheet()
-        remedy_style = ParagraphStyle(
-            "remedyStyle",
-            parent=styles["Normal"],
-            fontName="Helvetica",
-            fontSize=11,
-            textColor=colors.HexColor("#2c3e50"),
-            leading=14,
-        )
+def _pdf_response(pdf, filename):
+    return send_file(io.BytesIO(pdf), as_attachment=True, download_name=filename,
+                     mimetype='application/pdf')
 
-        for r in remedies:
-            para = Paragraph(f"✓ {r}", remedy_style)
-            w, h = para.wrap(width - 120, 100)
-            para.drawOn(p, 60, y - h)
-            y -= h + 12
 
-    # === FOOTER ===
-    p.setFont("Helvetica-Oblique", 9)
-    p.setFillColor(colors.HexColor("#7f8c8d"))
-    p.drawCentredString(width / 2, 30, "© 2025 AI Disease Prediction System | Report generated by AI")
+@app.route('/download_report/<prediction_id>')
+def download_prediction_report(prediction_id):
+    result = result_store.get(prediction_id)
+    if result is None:
+        return "This report has expired. Please run the prediction again.", 404
+    owner = result['username']
+    if owner and owner != session.get('username') and str(session.get('role') or '').lower() != 'admin':
+        return "Access denied", 403
+    fields = result['fields']
+    filename = (f"prediction_report_{fields['disease']}.pdf" if result['kind'] == 'v1'
+                else f"prediction_report_v2_{fields['username']}.pdf")
+    return _pdf_response(pdf_reports.render_report(result['kind'], fields), filename)
 
-    p.showPage()
-    p.save()
-    buffer.seek(0)
+# Query-string reports, for result pages rendered before prediction IDs existed
+@app.route('/download_report')
+def download_report():
+    disease = request.args.get('disease', 'Unknown')
+    fields = {
+        'username': session.get('username', 'Guest'),
+        'date': pdf_reports.report_date(request.args.get('predicted_at')),
+        'disease': disease,
+        'confidence': request.args.get('confidence', 'N/A'),
+        'description': request.args.get('description', 'No description available'),
+        'symptoms': _list_arg('symptoms'),
+        'remedies': _list_arg('remedies'),
+        'red_flags': _list_arg('red_flags'),
+    }
+    return _pdf_response(pdf_reports.render_report('v1', fields), f"prediction_report_{disease}.pdf")
 
-    return send_file(buffer, as_attachment=True,
-                     download_name=f"prediction_report_v2_{username}.pdf",
-                     mimetype='application/pdf')
+@app.route('/download_report_v2')
+def download_report_v2():
+    username = session.get('username', 'Guest')
+    diseases = [(request.args.get(f'top{i}', 'Unknown'), request.args.get(f'prob{i}', '0'))
+                for i in (1, 2, 3)]
+    fields = {
+        'username': username,
+        'date': pdf_reports.report_date(request.args.get('predicted_at')),
+        'diseases': diseases,
+        'outcome': request.args.get('outcome', 'N/A'),
+        'remedies': v2_report_remedies(disease for disease, _ in diseases),
+    }
+    return _pdf_response(pdf_reports.render_report('v2', fields), f"prediction_report_v2_{username}.pdf")
 
 
 
@@ -658,18 +923,18 @@ def register():
         username = request.form['username']
         password = generate_password_hash(request.form['password'])
 
-        conn = get_db_connection()
-        if not conn:
-            return "DB connection error", 500
-        cursor = conn.cursor()
-        try:
-            cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, password))
-            conn.commit()
-        except mysql.connector.IntegrityError:
-            return "Username already exists."
-        finally:
-            cursor.close()
-            conn.close()
+        with db_connection() as conn:
+            if not conn:
+                return "DB connection error", 500
+            cursor = conn.cursor()
+            try:
+                cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, password))
+                conn.commit()
+                admin_metrics.invalidate_tables('users')
+            except mysql_connector.IntegrityError:
+                return "Username already exists."
+            finally:
+                cursor.close()
 
         return redirect('/login')
     return render_template('register.html')
@@ -680,14 +945,13 @@ def login():
         username = request.form['username']
         password = request.form['password']
 
-        conn = get_db_connection()
-        if not conn:
-            return "DB connection error", 500
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_connection() as conn:
+            if not conn:
+                return "DB connection error", 500
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+            user = cursor.fetchone()
+            cursor.close()
 
         if user and check_password_hash(user['password'], password):
             session['username'] = user['username']
@@ -702,12 +966,12 @@ def reset_password(user_id):
     if 'username' not in session or session.get('role') != 'admin':
         return redirect(url_for('login'))
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    new_password = generate_password_hash("12345")  # default reset
-    cursor.execute("UPDATE users SET password=%s WHERE id=%s", (new_password, user_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        new_password = generate_password_hash("12345")  # default reset
+        cursor.execute("UPDATE users SET password=%s WHERE id=%s", (new_password, user_id))
+        conn.commit()
+        cursor.close()
 
     return redirect(url_for('admin_users'))
 
@@ -717,14 +981,14 @@ def change_role(user_id):
     if 'username' not in session or session.get('role') != 'admin':
         return redirect(url_for('login'))
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT role FROM users WHERE id=%s", (user_id,))
-    user = cursor.fetchone()
-    new_role = "admin" if user['role'] == "user" else "user"
-    cursor.execute("UPDATE users SET role=%s WHERE id=%s", (new_role, user_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT role FROM users WHERE id=%s", (user_id,))
+        user = cursor.fetchone()
+        new_role = "admin" if user['role'] == "user" else "user"
+        cursor.execute("UPDATE users SET role=%s WHERE id=%s", (new_role, user_id))
+        conn.commit()
+        cursor.close()
 
     return redirect(url_for('admin_users'))
 
@@ -734,11 +998,12 @@ def delete_user(user_id):
     if 'username' not in session or session.get('role') != 'admin':
         return redirect(url_for('login'))
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM users WHERE id=%s", (user_id,))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM users WHERE id=%s", (user_id,))
+        conn.commit()
+        cursor.close()
+    admin_metrics.invalidate_tables('users')
 
     return redirect(url_for('admin_users'))
 
@@ -754,61 +1019,42 @@ def profile():
         return redirect(url_for('login'))
 
     username = session['username']
-    conn = get_db_connection()
     user = {}
-    total_predictions = 0
-    last_prediction = None
     join_date = '—'
     account_type = session.get('role', 'User')
 
-    if conn:
-        try:
-            cursor = conn.cursor(dictionary=True)
+    # 2️⃣ / 3️⃣ Total predictions and newest prediction (both tables, cached)
+    activity = admin_metrics.get('user_activity', username, default={'total': 0, 'last': None})
+    total_predictions = activity['total']
+    last_dt = activity['last']
+    last_prediction = last_dt.strftime("%b %d, %Y %I:%M %p") if last_dt else "—"
 
-            # 1️⃣ Fetch user info
-            cursor.execute("""
-                SELECT username, role, created_at, email, phone, location, profile_photo
-                FROM users WHERE username = %s
-            """, (username,))
-            user = cursor.fetchone() or {}
-
-            # 2️⃣ Total predictions (combined)
-            cursor.execute("""
-                SELECT 
-                    (SELECT COUNT(*) FROM history WHERE username=%s)
-                    + 
-                    (SELECT COUNT(*) FROM prediction_history WHERE username=%s)
-                    AS total_predictions
-            """, (username, username))
-            total_predictions = cursor.fetchone()['total_predictions']
-
-            # 3️⃣ Last prediction date (newest of both tables)
-            cursor.execute("""
-                SELECT MAX(ts) AS last_pred FROM (
-                    SELECT timestamp AS ts FROM history WHERE username=%s
-                    UNION ALL
-                    SELECT predicted_at AS ts FROM prediction_history WHERE username=%s
-                ) AS combined
-            """, (username, username))
-            result = cursor.fetchone()
-            last_dt = result['last_pred'] if result else None
-            last_prediction = last_dt.strftime("%b %d, %Y %I:%M %p") if last_dt else "—"
-
-            # 4️⃣ Join date
-            join_date = user.get('created_at')
-            if join_date:
-                try:
-                    join_date = join_date.strftime("%b %d, %Y")
-                except:
-                    join_date = str(join_date)
-            else:
-                join_date = "—"
+    with db_connection() as conn:
+        if conn:
+            try:
+                cursor = conn.cursor(dictionary=True)
 
-        except Exception as e:
-            print("PROFILE ERROR:", e)
-        finally:
-            cursor.close()
-            conn.close()
+                # 1️⃣ Fetch user info
+                cursor.execute("""
+                    SELECT username, role, created_at, email, phone, location, profile_photo
+                    FROM users WHERE username = %s
+                """, (username,))
+                user = cursor.fetchone() or {}
+
+                # 4️⃣ Join date
+                join_date = user.get('created_at')
+                if join_date:
+                    try:
+                        join_date = join_date.strftime("%b %d, %Y")
+                    except:
+                        join_date = str(join_date)
+                else:
+                    join_date = "—"
+
+            except Exception as e:
+                print("PROFILE ERROR:", e)
+            finally:
+                cursor.close()
 
     return render_template(
         "profile.html",
@@ -841,24 +1087,24 @@ def contact():
             flash("⚠️ Please fill all fields.", "danger")
             return redirect(url_for("contact"))
 
-        conn = get_db_connection()
-        if conn:
-            try:
+        with db_connection() as conn:
+            if conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO contact_messages (username, name, email, message, created_at)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (username, name, email, message, datetime.now()))
-                conn.commit()
-                flash("✅ Message sent successfully!", "success")
-            except Exception as e:
-                print("CONTACT ERROR:", e)
-                flash("❌ Error saving message. Try again later.", "danger")
-            finally:
-                cursor.close()
-                conn.close()
-        else:
-            flash("❌ Database connection error.", "danger")
+                try:
+                    cursor.execute("""
+                        INSERT INTO contact_messages (username, name, email, message, created_at)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, (username, name, email, message, datetime.now()))
+                    conn.commit()
+                    admin_metrics.invalidate_tables('contact_messages')
+                    flash("✅ Message sent successfully!", "success")
+                except Exception as e:
+                    print("CONTACT ERROR:", e)
+                    flash("❌ Error saving message. Try again later.", "danger")
+                finally:
+                    cursor.close()
+            else:
+                flash("❌ Database connection error.", "danger")
 
         return redirect(url_for("contact"))
 
@@ -884,35 +1130,34 @@ def update_profile():
         file.save(file_path)
         profile_photo_path = f"uploads/{filename}"
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    try:
-        if profile_photo_path:
-            query = """UPDATE users 
-                       SET email=%s, phone=%s, location=%s, profile_photo=%s 
-                       WHERE username=%s"""
-            cursor.execute(query, (email, phone, location, profile_photo_path, username))
+        try:
+            if profile_photo_path:
+                query = """UPDATE users 
+                           SET email=%s, phone=%s, location=%s, profile_photo=%s 
+                           WHERE username=%s"""
+                cursor.execute(query, (email, phone, location, profile_photo_path, username))
 
-            # 🧩 Save in session so sidebar updates instantly
-            session['profile_photo'] = profile_photo_path
+                # 🧩 Save in session so sidebar updates instantly
+                session['profile_photo'] = profile_photo_path
 
-        else:
-            query = """UPDATE users 
-                       SET email=%s, phone=%s, location=%s 
-                       WHERE username=%s"""
-            cursor.execute(query, (email, phone, location, username))
+            else:
+                query = """UPDATE users 
+                           SET email=%s, phone=%s, location=%s 
+                           WHERE username=%s"""
+                cursor.execute(query, (email, phone, location, username))
 
-        conn.commit()
-        flash("Profile updated successfully!", "success")
+            conn.commit()
+            flash("Profile updated successfully!", "success")
 
-    except Error as e:
-        print(f"[DB ERROR] {e}")
-        flash("Error updating profile.", "error")
+        except mysql_connector.Error as e:
+            print(f"[DB ERROR] {e}")
+            flash("Error updating profile.", "error")
 
-    finally:
-        cursor.close()
-        conn.close()
+        finally:
+            cursor.close()
 
     return redirect(url_for("profile"))
 
@@ -925,52 +1170,48 @@ def admin_users_enhanced():
       - q: search query (username/email)
       - role: user/admin
       - active: 1/0
-      - page: int
+      - after / before: keyset cursor of the next / previous page
+      - limit: page size (default 20)
     """
     q = request.args.get('q', '').strip()
     role_filter = request.args.get('role', '').strip()
     active_filter = request.args.get('active', '').strip()
-    page = int(request.args.get('page', 1))
-    per_page = 20
-    offset = (page - 1) * per_page
 
-    conn = get_db_connection()
-    users = []
+    page = empty_page(page_size(request.args.get('limit'), default=20))
     total = 0
-    if conn:
-        try:
-            cursor = conn.cursor(dictionary=True)
-            base = "SELECT SQL_CALC_FOUND_ROWS id, username, role, created_at, email, phone, location, active, last_login FROM users WHERE 1=1"
-            params = []
-            if q:
-                base += " AND (username LIKE %s OR email LIKE %s)"
-                params.extend([f"%{q}%", f"%{q}%"])
-            if role_filter:
-                base += " AND role = %s"
-                params.append(role_filter)
-            if active_filter in ('0', '1'):
-                base += " AND active = %s"
-                params.append(active_filter)
-
-            base += " ORDER BY id ASC LIMIT %s OFFSET %s"
-            params.extend([per_page, offset])
-
-            cursor.execute(base, tuple(params))
-            users = cursor.fetchall()
-
-            cursor.execute("SELECT FOUND_ROWS() AS total")
-            total = cursor.fetchone().get('total', 0)
-        except Exception as e:
-            print("[ADMIN USERS] DB error:", e)
-        finally:
-            cursor.close()
-            conn.close()
+    with db_connection() as conn:
+        if conn:
+            try:
+                cursor = conn.cursor(dictionary=True)
+                where, params = [], []
+                if q:
+                    where.append("(username LIKE %s OR email LIKE %s)")
+                    params.extend([f"%{q}%", f"%{q}%"])
+                if role_filter:
+                    where.append("role = %s")
+                    params.append(role_filter)
+                if active_filter in ('0', '1'):
+                    where.append("active = %s")
+                    params.append(active_filter)
+
+                page = fetch_keyset_page(
+                    cursor, "SELECT id, username, role, created_at, email, phone, location, active, last_login FROM users",
+                    ('id',), descending=False, where=where, params=params,
+                    after=request.args.get('after'), before=request.args.get('before'), limit=page.limit)
+
+                count_sql = "SELECT COUNT(*) AS total FROM users"
+                if where:
+                    count_sql += " WHERE " + " AND ".join(where)
+                cursor.execute(count_sql, tuple(params))
+                total = cursor.fetchone().get('total', 0)
+            except Exception as e:
+                print("[ADMIN USERS] DB error:", e)
+            finally:
+                cursor.close()
 
-    total_pages = (total + per_page - 1) // per_page if total else 1
     return render_template('admin_users_enhanced.html',
-                           users=users,
+                           users=page.rows,
                            page=page,
-                           total_pages=total_pages,
                            q=q,
                            role_filter=role_filter,
                            active_filter=active_filter,
@@ -986,47 +1227,47 @@ def admin_edit_user(user_id):
     role = request.form.get('role') or 'user'
     active = 1 if request.form.get('active') == '1' else 0
 
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE users
-                SET email=%s, phone=%s, location=%s, role=%s, active=%s
-                WHERE id=%s
-            """, (email, phone, location, role, active, user_id))
-            conn.commit()
-            flash("✅ User updated.", "success")
-        except Exception as e:
-            print("[ADMIN EDIT USER] Error:", e)
-            flash("❌ Failed to update user.", "danger")
-        finally:
-            cursor.close()
-            conn.close()
+    with db_connection() as conn:
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE users
+                    SET email=%s, phone=%s, location=%s, role=%s, active=%s
+                    WHERE id=%s
+                """, (email, phone, location, role, active, user_id))
+                conn.commit()
+                admin_metrics.invalidate_tables('users')
+                flash("✅ User updated.", "success")
+            except Exception as e:
+                print("[ADMIN EDIT USER] Error:", e)
+                flash("❌ Failed to update user.", "danger")
+            finally:
+                cursor.close()
     return redirect(url_for('admin_users_enhanced'))
 
 @app.route('/admin/user/<int:user_id>/toggle_active')
 @admin_required
 def admin_toggle_active(user_id):
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT active FROM users WHERE id=%s", (user_id,))
-            row = cursor.fetchone()
-            if row is None:
-                flash("User not found.", "danger")
-                return redirect(url_for('admin_users_enhanced'))
-            new_active = 0 if row['active'] == 1 else 1
-            cursor.execute("UPDATE users SET active=%s WHERE id=%s", (new_active, user_id))
-            conn.commit()
-            flash("✅ User status updated.", "success")
-        except Exception as e:
-            print("[ADMIN TOGGLE ACTIVE] Error:", e)
-            flash("❌ Failed to update status.", "danger")
-        finally:
-            cursor.close()
-            conn.close()
+    with db_connection() as conn:
+        if conn:
+            try:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("SELECT active FROM users WHERE id=%s", (user_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    flash("User not found.", "danger")
+                    return redirect(url_for('admin_users_enhanced'))
+                new_active = 0 if row['active'] == 1 else 1
+                cursor.execute("UPDATE users SET active=%s WHERE id=%s", (new_active, user_id))
+                conn.commit()
+                admin_metrics.invalidate_tables('users')
+                flash("✅ User status updated.", "success")
+            except Exception as e:
+                print("[ADMIN TOGGLE ACTIVE] Error:", e)
+                flash("❌ Failed to update status.", "danger")
+            finally:
+                cursor.close()
     return redirect(url_for('admin_users_enhanced'))
 
 @app.route('/admin/user/<int:user_id>/reset_password')
@@ -1035,19 +1276,68 @@ def admin_reset_password(user_id):
     # set default password to '12345' (hashed)
     try:
         new_hash = generate_password_hash("12345")
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE users SET password=%s WHERE id=%s", (new_hash, user_id))
-            conn.commit()
-            cursor.close()
-            conn.close()
-            flash("✅ Password reset to default (12345).", "success")
+        with db_connection() as conn:
+            if conn:
+                cursor = conn.cursor()
+                cursor.execute("UPDATE users SET password=%s WHERE id=%s", (new_hash, user_id))
+                conn.commit()
+                cursor.close()
+                flash("✅ Password reset to default (12345).", "success")
     except Exception as e:
         print("[ADMIN RESET PW] Error:", e)
         flash("❌ Failed to reset password.", "danger")
     return redirect(url_for('admin_users_enhanced'))
 
+# ---- Streaming CSV exports ----
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 1000))
+
+def export_filters(date_column, username_column='username'):
+    """
+    SQL conditions and params for the optional export filters:
+    ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive) and ?username=...
+    Raises ValueError on a malformed date.
+    """
+    clauses, params = [], []
+    start = request.values.get('start', '').strip()
+    end = request.values.get('end', '').strip()
+    username = request.values.get('username', '').strip()
+    if start:
+        clauses.append(f"{date_column} >= %s")
+        params.append(datetime.strptime(start, '%Y-%m-%d'))
+    if end:
+        clauses.append(f"{date_column} < %s")
+        params.append(datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1))
+    if username:
+        clauses.append(f"{username_column} = %s")
+        params.append(username)
+    return clauses, params
+
+def csv_export_response(sql, params, header, filename):
+    """Stream `sql` as a CSV attachment; ?gzip=1 sends it as a .csv.gz file."""
+    gzip_output = request.args.get('gzip') in ('1', 'true', 'yes')
+    body = iter_csv(db_connection, sql, params, header,
+                    chunk_rows=EXPORT_CHUNK_ROWS, gzip_output=gzip_output)
+    if gzip_output:
+        resp = Response(body, mimetype='application/gzip')
+        filename += '.gz'
+    else:
+        resp = Response(body, mimetype='text/csv')
+    resp.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+def build_export_query(select, date_column, clauses=None, params=None, order_by='id ASC'):
+    clauses = list(clauses or [])
+    params = list(params or [])
+    extra_clauses, extra_params = export_filters(date_column)
+    clauses += extra_clauses
+    params += extra_params
+    sql = select
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {order_by}"
+    return sql, params
+
 @app.route('/admin/users/export')
 @admin_required
 def admin_export_users():
@@ -1055,42 +1345,25 @@ def admin_export_users():
     role_filter = request.args.get('role', '').strip()
     active_filter = request.args.get('active', '').strip()
 
-    conn = get_db_connection()
-    rows = []
-    if conn:
-        try:
-            cursor = conn.cursor()
-            base = "SELECT id, username, role, email, phone, location, active, created_at, last_login FROM users WHERE 1=1"
-            params = []
-            if q:
-                base += " AND (username LIKE %s OR email LIKE %s)"
-                params.extend([f"%{q}%", f"%{q}%"])
-            if role_filter:
-                base += " AND role = %s"
-                params.append(role_filter)
-            if active_filter in ('0', '1'):
-                base += " AND active = %s"
-                params.append(active_filter)
-            base += " ORDER BY id ASC"
-            cursor.execute(base, tuple(params))
-            rows = cursor.fetchall()
-        except Exception as e:
-            print("[ADMIN EXPORT] Error:", e)
-        finally:
-            cursor.close()
-            conn.close()
+    clauses, params = [], []
+    if q:
+        clauses.append("(username LIKE %s OR email LIKE %s)")
+        params.extend([f"%{q}%", f"%{q}%"])
+    if role_filter:
+        clauses.append("role = %s")
+        params.append(role_filter)
+    if active_filter in ('0', '1'):
+        clauses.append("active = %s")
+        params.append(active_filter)
+    try:
+        sql, params = build_export_query(
+            "SELECT id, username, role, email, phone, location, active, created_at, last_login FROM users",
+            'created_at', clauses, params)
+    except ValueError:
+        return Response("Invalid date filter, expected YYYY-MM-DD.", status=400, mimetype='text/plain')
 
-    # Generate CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
     header = ['id', 'username', 'role', 'email', 'phone', 'location', 'active', 'created_at', 'last_login']
-    writer.writerow(header)
-    for row in rows:
-        writer.writerow(row)
-
-    response = Response(output.getvalue(), mimetype='text/csv')
-    response.headers['Content-Disposition'] = 'attachment; filename=users_export.csv'
-    return response
+    return csv_export_response(sql, params, header, 'users_export.csv')
 
 @app.route('/admin/dashboard')
 @admin_required
@@ -1099,91 +1372,32 @@ def admin_dashboard():
     Admin analytics dashboard: summary cards, daily predictions (last 14 days),
     top predicted diseases, user stats.
     """
-    conn = get_db_connection()
+    # 1) users counts and 2) prediction total (cached counters;
+    # predictions come from the daily rollup tables, see daily_stats.py)
+    total_users = admin_metrics.get('users')
+    active_users = admin_metrics.get('active_users')
+    total_predictions = admin_metrics.get('predictions_total')
+
     # default safe values
-    total_users = 0
-    active_users = 0
-    total_predictions = 0
     predictions_last_14 = []  # list of (date_str, count)
     top_diseases = []  # list of (disease, count)
 
-    if conn:
-        try:
-            cursor = conn.cursor(dictionary=True)
+    with db_connection() as conn:
+        if conn:
+            try:
+                cursor = conn.cursor(dictionary=True)
 
-            # 1) users counts
-            cursor.execute("SELECT COUNT(*) AS cnt FROM users")
-            row = cursor.fetchone()
-            total_users = row['cnt'] if row else 0
-
-            cursor.execute("SELECT COUNT(*) AS cnt FROM users WHERE active = 1")
-            row = cursor.fetchone()
-            active_users = row['cnt'] if row else 0
-
-            # 2) total predictions (both tables)
-            # history uses `timestamp`, prediction_history uses `predicted_at`
-            cursor.execute("""
-                SELECT
-                  (SELECT COUNT(*) FROM history) + (SELECT COUNT(*) FROM prediction_history) AS total
-            """)
-            row = cursor.fetchone()
-            total_predictions = row['total'] if row else 0
-
-            # 3) daily predictions for last 14 days (merged from both tables)
-            # build date range
-            today = date.today()
-            start_dt = today - timedelta(days=13)  # 14 days inclusive
-            # Query: group by date over union
-            cursor.execute("""
-                SELECT d AS day, SUM(cnt) AS total
-                FROM (
-                  SELECT DATE(predicted_at) AS d, COUNT(*) AS cnt
-                  FROM prediction_history
-                  WHERE predicted_at >= %s
-                  GROUP BY DATE(predicted_at)
-                  UNION ALL
-                  SELECT DATE(timestamp) AS d, COUNT(*) AS cnt
-                  FROM history
-                  WHERE timestamp >= %s
-                  GROUP BY DATE(timestamp)
-                ) t
-                GROUP BY d
-                ORDER BY d ASC
-            """, (start_dt, start_dt))
-            rows = cursor.fetchall()
-            # Map row day->count
-            counts_map = { (r['day'].strftime('%Y-%m-%d') if isinstance(r['day'], (date,)) else str(r['day'])): r['total'] for r in rows }
-
-
-            # build full 14-day list (fill zeros)
-            predictions_last_14 = []
-            for i in range(14):
-                d = start_dt + timedelta(days=i)
-                ds = d.strftime('%Y-%m-%d')
-                predictions_last_14.append({'date': ds, 'count': int(counts_map.get(ds, 0))})
-
-            # 4) top predicted diseases (aggregate top_disease_1/2/3)
-            cursor.execute("""
-                SELECT disease, SUM(cnt) AS total
-                FROM (
-                  SELECT top_disease_1 AS disease, COUNT(*) AS cnt FROM prediction_history WHERE top_disease_1 IS NOT NULL GROUP BY top_disease_1
-                  UNION ALL
-                  SELECT top_disease_2 AS disease, COUNT(*) AS cnt FROM prediction_history WHERE top_disease_2 IS NOT NULL GROUP BY top_disease_2
-                  UNION ALL
-                  SELECT top_disease_3 AS disease, COUNT(*) AS cnt FROM prediction_history WHERE top_disease_3 IS NOT NULL GROUP BY top_disease_3
-                ) AS u
-                GROUP BY disease
-                ORDER BY total DESC
-                LIMIT 10
-            """)
-            rows = cursor.fetchall()
-            top_diseases = [{'disease': r['disease'], 'count': int(r['total'])} for r in rows if r['disease']]
-
-        except Exception as e:
-            print("[ADMIN DASHBOARD] DB error:", e)
-        finally:
-            cursor.close()
-            conn.close()
+                # 3) daily predictions for last 14 days (v1 + v2)
+                start_dt = date.today() - timedelta(days=13)  # 14 days inclusive
+                predictions_last_14 = daily_stats.daily_series(cursor, start_dt, 14)
+
+                # 4) top predicted diseases (top_disease_1/2/3 combined)
+                top_diseases = daily_stats.top_diseases(cursor, limit=10)
+
+            except Exception as e:
+                print("[ADMIN DASHBOARD] DB error:", e)
+            finally:
+                cursor.close()
 
     # Prepare data for charts (JSON serializable)
     chart_dates = [p['date'] for p in predictions_last_14]
@@ -1207,84 +1421,87 @@ def admin_dashboard():
 @app.route('/admin/system')
 @admin_required
 def admin_system():
-    conn = get_db_connection()
     contact_messages = []
     audit_logs = []
-    counts = {
-        "users": 0,
-        "predictions": 0,
-        "contacts": 0,
-        "audit": 0
-    }
+    # quick counts (cached, see admin_metrics)
+    counts = admin_metrics.get_many('users', 'predictions', 'contacts', 'audit')
 
-    if conn:
-        try:
-            cursor = conn.cursor(dictionary=True)
+    with db_connection() as conn:
+        if conn:
+            try:
+                cursor = conn.cursor(dictionary=True)
 
-            # contact messages (most recent first)
-            cursor.execute("SELECT id, username, name, email, message, created_at FROM contact_messages ORDER BY created_at DESC LIMIT 200")
-            contact_messages = cursor.fetchall()
+                # contact messages (most recent first)
+                cursor.execute("SELECT id, username, name, email, message, created_at FROM contact_messages ORDER BY created_at DESC LIMIT 200")
+                contact_messages = cursor.fetchall()
 
-            # audit log (recent)
-            cursor.execute("SELECT id, username, action, ip_address, status, created_at FROM audit_log ORDER BY created_at DESC LIMIT 200")
-            audit_logs = cursor.fetchall()
+                # audit log (recent)
+                cursor.execute("SELECT id, username, action, ip_address, status, created_at FROM audit_log ORDER BY created_at DESC LIMIT 200")
+                audit_logs = cursor.fetchall()
 
-            # quick counts
-            cursor.execute("SELECT COUNT(*) AS cnt FROM users")
-            counts['users'] = cursor.fetchone()['cnt'] if cursor.fetchone() is None else counts['users']
-            # Since fetchone() consumed the row, safer to run separate queries:
-            cursor.execute("SELECT COUNT(*) AS cnt FROM users")
-            r = cursor.fetchone()
-            counts['users'] = r['cnt'] if r else 0
+            except Exception as e:
+                print("[ADMIN SYSTEM] DB error:", e)
+            finally:
+                try:
+                    cursor.close()
+                except:
+                    pass
 
-            cursor.execute("SELECT COUNT(*) AS cnt FROM prediction_history")
-            r = cursor.fetchone()
-            counts['predictions'] = r['cnt'] if r else 0
+    return render_template('admin_system.html',
+                           contact_messages=contact_messages,
+                           audit_logs=audit_logs,
+                           counts=counts,
+                           pool_stats=db_pool.stats(),
+                           inference_stats=[models[name].batcher.metrics() for name in models.names() if models.get(name)],
+                           model_status=models.status(),
+                           cache_stats=prediction_cache.stats(),
+                           history_stats=history_writer.stats(),
+                           pdf_stats=_pdf_cache_stats(),
+                           result_stats=result_store.stats(),
+                           report_jobs=[dict(job, created=datetime.fromtimestamp(job['created_at']))
+                                        for job in report_jobs.list_jobs(10)])
 
-            cursor.execute("SELECT COUNT(*) AS cnt FROM contact_messages")
-            r = cursor.fetchone()
-            counts['contacts'] = r['cnt'] if r else 0
 
-            cursor.execute("SELECT COUNT(*) AS cnt FROM audit_log")
-            r = cursor.fetchone()
-            counts['audit'] = r['cnt'] if r else 0
+def _pdf_cache_stats():
+    """Report cache stats, without importing reportlab if no report was rendered yet."""
+    engine = sys.modules.get('pdf_reports') and sys.modules['pdf_reports']._engine
+    return engine.cache.stats() if engine else None
 
-        except Exception as e:
-            print("[ADMIN SYSTEM] DB error:", e)
-        finally:
-            try:
-                cursor.close()
-                conn.close()
-            except:
-                pass
 
-    return render_template('admin_system.html',
-                           contact_messages=contact_messages,
-                           audit_logs=audit_logs,
-                           counts=counts)
+@app.route('/admin/models/reload', methods=['POST'])
+@admin_required
+def admin_reload_models():
+    """Load, smoke-check and swap in the model versions on disk, in the background."""
+    username = session.get('username', 'admin')
+    name = request.form.get('model')
+    names = [name] if name in models.names() else None
+    models.reload_async(names, force=request.form.get('force') == '1')
+    log_audit(username, f"Requested model reload ({name or 'all'})", request.remote_addr)
+    flash("Model reload started; the new version serves once it passes its smoke check.", "success")
+    return redirect(url_for('admin_system'))
 
 
 @app.route('/admin/delete_message/<int:msg_id>', methods=['POST'])
 @admin_required
 def admin_delete_message(msg_id):
     username = session.get('username', 'admin')
-    conn = get_db_connection()
     deleted = False
-    if conn:
-        try:
-            cursor = conn.cursor()
-            # get message for logging (optional)
-            cursor.execute("SELECT id, name, email, message FROM contact_messages WHERE id = %s", (msg_id,))
-            row = cursor.fetchone()
-            if row:
-                cursor.execute("DELETE FROM contact_messages WHERE id = %s", (msg_id,))
-                conn.commit()
-                deleted = True
-        except Exception as e:
-            print("[ADMIN DELETE MSG] error:", e)
-        finally:
-            cursor.close()
-            conn.close()
+    with db_connection() as conn:
+        if conn:
+            try:
+                cursor = conn.cursor()
+                # get message for logging (optional)
+                cursor.execute("SELECT id, name, email, message FROM contact_messages WHERE id = %s", (msg_id,))
+                row = cursor.fetchone()
+                if row:
+                    cursor.execute("DELETE FROM contact_messages WHERE id = %s", (msg_id,))
+                    conn.commit()
+                    deleted = True
+                    admin_metrics.invalidate_tables('contact_messages')
+            except Exception as e:
+                print("[ADMIN DELETE MSG] error:", e)
+            finally:
+                cursor.close()
 
     if deleted:
         log_audit(username, f"Deleted contact message id={msg_id}", request.remote_addr, status="OK")
@@ -1300,24 +1517,14 @@ def admin_delete_message(msg_id):
 @app.route('/admin/export_users_csv')
 @admin_required
 def admin_export_users_csv():
-    conn = get_db_connection()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["id", "username", "role", "email", "phone", "location", "created_at"])
-
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, username, role, email, phone, location, created_at FROM users")
-            for row in cursor.fetchall():
-                writer.writerow(row)
-        finally:
-            cursor.close()
-            conn.close()
+    try:
+        sql, params = build_export_query(
+            "SELECT id, username, role, email, phone, location, created_at FROM users", 'created_at')
+    except ValueError:
+        return Response("Invalid date filter, expected YYYY-MM-DD.", status=400, mimetype='text/plain')
 
-    resp = make_response(output.getvalue())
-    resp.headers["Content-Disposition"] = "attachment; filename=users_export.csv"
-    resp.headers["Content-Type"] = "text/csv"
+    resp = csv_export_response(sql, params, ["id", "username", "role", "email", "phone", "location", "created_at"],
+                               'users_export.csv')
     log_audit(session.get('username'), "Exported users CSV", request.remote_addr)
     return resp
 
@@ -1326,26 +1533,16 @@ def admin_export_users_csv():
 @app.route('/admin/export_predictions_csv')
 @admin_required
 def admin_export_predictions_csv():
-    conn = get_db_connection()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    # select useful fields
-    writer.writerow(["id","username","fever","cough","fatigue","breathing","age","gender","bp","cholesterol","top1","top2","top3","outcome","predicted_at"])
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""SELECT id, username, fever, cough, fatigue, breathing, age, gender, bp, cholesterol,
-                              top_disease_1, top_disease_2, top_disease_3, outcome, predicted_at
-                              FROM prediction_history""")
-            for row in cursor.fetchall():
-                writer.writerow(row)
-        finally:
-            cursor.close()
-            conn.close()
-
-    resp = make_response(output.getvalue())
-    resp.headers["Content-Disposition"] = "attachment; filename=predictions_export.csv"
-    resp.headers["Content-Type"] = "text/csv"
+    try:
+        sql, params = build_export_query(
+            """SELECT id, username, fever, cough, fatigue, breathing, age, gender, bp, cholesterol,
+                      top_disease_1, top_disease_2, top_disease_3, outcome, predicted_at
+               FROM prediction_history""", 'predicted_at')
+    except ValueError:
+        return Response("Invalid date filter, expected YYYY-MM-DD.", status=400, mimetype='text/plain')
+
+    header = ["id","username","fever","cough","fatigue","breathing","age","gender","bp","cholesterol","top1","top2","top3","outcome","predicted_at"]
+    resp = csv_export_response(sql, params, header, 'predictions_export.csv')
     log_audit(session.get('username'), "Exported predictions CSV", request.remote_addr)
     return resp
 
@@ -1354,26 +1551,127 @@ def admin_export_predictions_csv():
 @app.route('/admin/export_contacts_csv')
 @admin_required
 def admin_export_contacts_csv():
-    conn = get_db_connection()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["id","username","name","email","message","created_at"])
-    if conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, username, name, email, message, created_at FROM contact_messages")
-            for row in cursor.fetchall():
-                writer.writerow(row)
-        finally:
-            cursor.close()
-            conn.close()
+    try:
+        sql, params = build_export_query(
+            "SELECT id, username, name, email, message, created_at FROM contact_messages", 'created_at')
+    except ValueError:
+        return Response("Invalid date filter, expected YYYY-MM-DD.", status=400, mimetype='text/plain')
 
-    resp = make_response(output.getvalue())
-    resp.headers["Content-Disposition"] = "attachment; filename=contact_messages_export.csv"
-    resp.headers["Content-Type"] = "text/csv"
+    resp = csv_export_response(sql, params, ["id","username","name","email","message","created_at"],
+                               'contact_messages_export.csv')
     log_audit(session.get('username'), "Exported contact messages CSV", request.remote_addr)
     return resp
 
 
+
+# ---- Bulk PDF reports (background jobs, see report_jobs.py) ----
+
+def _report_filename(prefix, row, timestamp):
+    user = secure_filename(row['username'] or '') or 'guest'
+    return f"{prefix}/{user}/{row['id']}_{timestamp:%Y%m%d-%H%M%S}.pdf"
+
+
+def _v1_report_fields(row):
+    description, remedies_list, red_flags = disease_report_details(row['prediction'])
+    return {
+        'username': row['username'] or 'Guest',
+        'date': str(row['timestamp']),
+        'disease': row['prediction'],
+        'confidence': 'N/A',  # not stored with the history row
+        'description': description,
+        'symptoms': [s for s in (row['symptoms'] or '').split(', ') if s],
+        'remedies': remedies_list,
+        'red_flags': red_flags,
+    }
+
+
+def _v2_report_fields(row):
+    diseases = [row['top_disease_1'], row['top_disease_2'], row['top_disease_3']]
+    return {
+        'username': row['username'] or 'Guest',
+        'date': str(row['predicted_at']),
+        'diseases': [(disease, 'N/A') for disease in diseases],  # probabilities are not stored
+        'outcome': row['outcome'],
+        'remedies': v2_report_remedies(diseases),
+    }
+
+
+REPORT_SOURCES = {
+    'v1': ("SELECT id, username, symptoms, prediction, timestamp FROM history", 'timestamp',
+           _v1_report_fields,
+           lambda row: _report_filename('v1', row, row['timestamp'])),
+    'v2': ("""SELECT id, username, top_disease_1, top_disease_2, top_disease_3, outcome, predicted_at
+              FROM prediction_history""", 'predicted_at',
+           _v2_report_fields,
+           lambda row: _report_filename('v2', row, row['predicted_at'])),
+}
+
+
+def _job_json(job):
+    return dict(job, status_url=url_for('admin_report_job', job_id=job['id']),
+                download_url=url_for('admin_report_job_download', job_id=job['id'])
+                if job['state'] == 'done' else None)
+
+
+@app.route('/admin/reports/jobs', methods=['GET', 'POST'])
+@admin_required
+def admin_report_jobs():
+    """
+    GET: recent jobs. POST (form or query fields): queue a job.
+      - kind: v1 (symptom history), v2 (profile predictions) or all
+      - start / end (YYYY-MM-DD, inclusive), username: as for the CSV exports
+    """
+    if request.method == 'GET':
+        return jsonify(jobs=[_job_json(job) for job in report_jobs.list_jobs()])
+
+    kind = request.values.get('kind', 'all')
+    kinds = list(REPORT_SOURCES) if kind == 'all' else [kind]
+    if any(k not in REPORT_SOURCES for k in kinds):
+        return jsonify(error="kind must be v1, v2 or all"), 400
+    try:
+        sources = []
+        for k in kinds:
+            select, date_column, fields, filename = REPORT_SOURCES[k]
+            sql, params = build_export_query(select, date_column)
+            sources.append(ReportSource(k, sql, params, fields, filename))
+    except ValueError:
+        return jsonify(error="Invalid date filter, expected YYYY-MM-DD."), 400
+
+    description = ", ".join(f"{name}={request.values[name]}" for name in ('kind', 'start', 'end', 'username')
+                            if request.values.get(name))
+    job_id = report_jobs.submit(sources, requested_by=session.get('username'), description=description)
+    log_audit(session.get('username'), f"Queued bulk PDF report job {job_id}", request.remote_addr)
+    if request.accept_mimetypes.best == 'application/json' or request.is_json:
+        resp = jsonify(_job_json(report_jobs.status(job_id)))
+        resp.status_code = 202
+        resp.headers['Location'] = url_for('admin_report_job', job_id=job_id)
+        return resp
+    flash(f"Report job {job_id[:8]} queued.")
+    return redirect(url_for('admin_system'))
+
+
+@app.route('/admin/reports/jobs/<job_id>')
+@admin_required
+def admin_report_job(job_id):
+    job = report_jobs.status(job_id)
+    if job is None:
+        return jsonify(error="unknown job"), 404
+    return jsonify(_job_json(job))
+
+
+@app.route('/admin/reports/jobs/<job_id>/download')
+@admin_required
+def admin_report_job_download(job_id):
+    job = report_jobs.status(job_id)
+    if job is None:
+        return jsonify(error="unknown job"), 404
+    path = report_jobs.archive_path(job_id)
+    if path is None:
+        return jsonify(dict(_job_json(job), error=f"job is {job['state']}")), 409
+    log_audit(session.get('username'), f"Downloaded bulk PDF report job {job_id}", request.remote_addr)
+    return send_file(os.path.abspath(path), as_attachment=True, mimetype='application/zip',
+                     download_name=f"reports_{job_id[:8]}.zip")
+
+
 if __name__ == '__main__':
     app.run(debug=True)
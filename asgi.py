@@ -0,0 +1,197 @@
+"""
+ASGI entry point.
+
+    pip install uvicorn asgiref aiomysql
+    uvicorn asgi:application --host 0.0.0.0 --port 8000
+
+The JSON endpoints below are served natively on the event loop:
+
+    POST /api/predict/batch   scoring runs on the bounded inference pool
+    GET  /api/history         ?model=v1|v2&after=&before=&limit= (keyset pages)
+    GET  /api/profile         prediction count and newest prediction time
+
+They read MySQL through aiomysql (async_db.py), so a slow client or a slow
+query holds a coroutine, not a thread. Only these three are async. Every other
+path, including the HTML pages that query MySQL (history, profile, admin
+pages), PDF reports and CSV exports, is the regular Flask app bridged with
+asgiref's WsgiToAsgi: each such request occupies one of asgiref's threads
+and the threaded db_pool.py pool, as under a WSGI server. Both share the same
+Flask session cookie.
+"""
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+import app as web
+from async_db import AsyncDB
+from inference_pool import PoolBusy
+from pagination import keyset_query, keyset_result, page_size
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+async_db = AsyncDB()
+flask_asgi = WsgiToAsgi(web.app)
+
+HISTORY_QUERIES = {
+    'v1': ("SELECT id, symptoms, prediction, timestamp FROM history", ('timestamp', 'id')),
+    'v2': ("SELECT * FROM prediction_history", ('predicted_at', 'id')),
+}
+
+
+# ---- request / response helpers ----
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_BYTES:
+            return None
+        if not message.get('more_body'):
+            return body
+
+
+async def send_json(send, payload, status=200):
+    data = json.dumps(payload, default=str).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(data)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': data})
+
+
+def query_args(scope):
+    return {k: v[-1] for k, v in parse_qs(scope.get('query_string', b'').decode()).items()}
+
+
+def session_of(scope):
+    """Decode the Flask session cookie (signed with app.secret_key)."""
+    cookie_header = b'; '.join(v for k, v in scope.get('headers', []) if k == b'cookie').decode('latin-1')
+    cookies = SimpleCookie()
+    try:
+        cookies.load(cookie_header)
+    except Exception:
+        return {}
+    morsel = cookies.get(web.app.config['SESSION_COOKIE_NAME'])
+    serializer = web.app.session_interface.get_signing_serializer(web.app)
+    if morsel is None or serializer is None:
+        return {}
+    try:
+        max_age = int(web.app.permanent_session_lifetime.total_seconds())
+        return serializer.loads(morsel.value, max_age=max_age)
+    except Exception:
+        return {}
+
+
+# ---- native async routes ----
+
+async def api_predict_batch(scope, receive, send):
+    body = await read_body(receive)
+    if body is None:
+        return await send_json(send, {'error': 'Request body too large'}, 413)
+    try:
+        payload = json.loads(body or b'{}')
+    except ValueError:
+        return await send_json(send, {'error': 'Request body is not valid JSON'}, 400)
+    try:
+        result, status = await web.inference_pool.run(web.batch_predict, payload)
+    except PoolBusy as e:
+        return await send_json(send, {'error': str(e)}, 503)
+    await send_json(send, result, status)
+
+
+async def api_history(scope, receive, send):
+    username = session_of(scope).get('username')
+    if not username:
+        return await send_json(send, {'error': 'Login required'}, 401)
+    if not async_db.available:
+        return await send_json(send, {'error': 'Async database driver (aiomysql) not installed'}, 503)
+    args = query_args(scope)
+    model = args.get('model', 'v1')
+    if model not in HISTORY_QUERIES:
+        return await send_json(send, {'error': 'model must be "v1" or "v2"'}, 400)
+
+    select, key_columns = HISTORY_QUERIES[model]
+    sql, params, state = keyset_query(
+        select, key_columns, where=["username = %s"], params=[username],
+        after=args.get('after'), before=args.get('before'), limit=page_size(args.get('limit')))
+    page = keyset_result(await async_db.fetchall(sql, params), state)
+    await send_json(send, {
+        'model': model,
+        'history': page.rows,
+        'next': page.next_cursor,
+        'prev': page.prev_cursor,
+        'limit': page.limit,
+    })
+
+
+async def api_profile(scope, receive, send):
+    username = session_of(scope).get('username')
+    if not username:
+        return await send_json(send, {'error': 'Login required'}, 401)
+    if not async_db.available:
+        return await send_json(send, {'error': 'Async database driver (aiomysql) not installed'}, 503)
+    # the schema check may hit MySQL through the blocking pool, keep it off the loop
+    if await asyncio.to_thread(web.unified_predictions):
+        row = await async_db.fetchone(
+            "SELECT COUNT(*) AS total_predictions, MAX(predicted_at) AS last_prediction "
+            "FROM predictions WHERE username = %s", (username,)) or {}
+    else:
+        # before migration 4 (see app.unified_predictions)
+        row = await async_db.fetchone(
+            "SELECT (SELECT COUNT(*) FROM history WHERE username = %s) "
+            "+ (SELECT COUNT(*) FROM prediction_history WHERE username = %s) AS total_predictions, "
+            "NULLIF(GREATEST("
+            "COALESCE((SELECT MAX(timestamp) FROM history WHERE username = %s), '1000-01-01'), "
+            "COALESCE((SELECT MAX(predicted_at) FROM prediction_history WHERE username = %s), '1000-01-01')"
+            "), '1000-01-01') AS last_prediction", (username,) * 4) or {}
+    await send_json(send, {
+        'username': username,
+        'total_predictions': int(row.get('total_predictions') or 0),
+        'last_prediction': row.get('last_prediction'),
+    })
+
+
+ROUTES = {
+    ('POST', '/api/predict/batch'): api_predict_batch,
+    ('GET', '/api/history'): api_history,
+    ('GET', '/api/profile'): api_profile,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if async_db.available:
+                try:
+                    await async_db.start()
+                except Exception as e:
+                    print(f"[ASYNC DB] Connection error: {e}")
+            else:
+                print("[ASYNC DB] aiomysql not installed; /api/history and /api/profile are unavailable.")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_db.close()
+            web.history_writer.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http':
+        handler = ROUTES.get((scope['method'], scope['path']))
+        if handler is not None:
+            try:
+                return await handler(scope, receive, send)
+            except Exception as e:
+                print(f"[ASGI] {scope['path']} failed: {e}")
+                return await send_json(send, {'error': 'Internal server error'}, 500)
+    await flask_asgi(scope, receive, send)
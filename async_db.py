@@ -0,0 +1,65 @@
+"""
+Non-blocking MySQL access for the ASGI entry point (asgi.py).
+
+Uses aiomysql when it is installed (pip install aiomysql); the WSGI app keeps
+using the threaded pool in db_pool.py. Connection settings and pool size come
+from the same DB_* environment variables.
+"""
+try:
+    import aiomysql
+except ImportError:  # optional dependency, only needed for asgi.py
+    aiomysql = None
+
+from db_pool import DB_CONFIG, POOL_CONFIG
+
+
+class AsyncDB:
+    """Lazily created aiomysql pool with small fetch helpers returning dict rows."""
+
+    def __init__(self, db_config=None, maxsize=None):
+        self.db_config = dict(db_config or DB_CONFIG)
+        self.maxsize = maxsize or POOL_CONFIG['pool_size'] + POOL_CONFIG['max_overflow']
+        self._pool = None
+
+    @property
+    def available(self):
+        return aiomysql is not None
+
+    async def start(self):
+        if self._pool is not None:
+            return
+        if aiomysql is None:
+            raise RuntimeError("aiomysql is not installed; pip install aiomysql to use async DB access")
+        cfg = self.db_config
+        self._pool = await aiomysql.create_pool(
+            host=cfg.get('host', 'localhost'),
+            port=int(cfg.get('port', 3306)),
+            user=cfg.get('user'),
+            password=cfg.get('password', ''),
+            db=cfg.get('database'),
+            minsize=1,
+            maxsize=self.maxsize,
+            pool_recycle=int(POOL_CONFIG['recycle']),
+            autocommit=True,
+        )
+        print(f"[ASYNC DB] Pool ready (max {self.maxsize} connections).")
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def fetchall(self, sql, params=()):
+        await self.start()
+        async with self._pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(sql, params)
+                return list(await cursor.fetchall())
+
+    async def fetchone(self, sql, params=()):
+        await self.start()
+        async with self._pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(sql, params)
+                return await cursor.fetchone()
@@ -0,0 +1,129 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Collects single-row inference requests from concurrent callers and scores
+    them together.
+
+    A background thread takes the first queued row, keeps gathering rows until
+    `max_batch` rows are waiting or `max_wait` seconds have passed since that
+    first row, then calls `score_fn` once on the stacked matrix. `score_fn`
+    must return one result per input row (e.g. a predict_proba matrix); each
+    caller gets its own row back.
+    """
+
+    def __init__(self, score_fn, max_batch=64, max_wait=0.002, name='batcher'):
+        self.score_fn = score_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'max_batch_size': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0,
+            'errors': 0,
+        }
+
+    def _ensure_worker(self):
+        # started lazily so forked workers each get their own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((np.asarray(row), future, time.monotonic()))
+        return future
+
+    def close(self):
+        """Stop the worker once the rows already queued are scored (a later submit restarts it)."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+
+    def predict(self, row, timeout=None):
+        """Block until the batch containing `row` is scored and return its result."""
+        return self.submit(row).result(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # close() requested: score what was gathered, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                if self._queue.empty():
+                    return
+                continue  # rows submitted after close() still get scored
+            started = time.monotonic()
+            waits = [started - submitted for _, _, submitted in batch]
+            try:
+                results = self.score_fn(np.vstack([row for row, _, _ in batch]))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                failed = True
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+                failed = False
+
+            with self._stats_lock:
+                self._stats['requests'] += len(batch)
+                self._stats['batches'] += 1
+                self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(batch))
+                self._stats['total_wait'] += sum(waits)
+                self._stats['max_wait'] = max(self._stats['max_wait'], max(waits))
+                if failed:
+                    self._stats['errors'] += 1
+
+    def metrics(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        batches = s['batches'] or 1
+        requests = s['requests'] or 1
+        return {
+            'name': self.name,
+            'window_ms': round(self.max_wait * 1000, 3),
+            'max_batch': self.max_batch,
+            'queued': self._queue.qsize(),
+            'requests': s['requests'],
+            'batches': s['batches'],
+            'errors': s['errors'],
+            'avg_batch_size': round(s['requests'] / batches, 2),
+            'max_batch_size': s['max_batch_size'],
+            'avg_wait_ms': round(s['total_wait'] / requests * 1000, 3),
+            'max_wait_ms': round(s['max_wait'] * 1000, 3),
+        }
@@ -0,0 +1,2 @@
+# Makes pytest put the repository root on sys.path, so tests/ imports the
+# top-level modules (forest_engine, model_artifact, ...) directly.
@@ -0,0 +1,54 @@
+import csv
+import io
+import zlib
+
+CHUNK_ROWS = 1000
+
+
+def iter_csv(connection, sql, params, header, chunk_rows=CHUNK_ROWS, gzip_output=False):
+    """
+    Yield a CSV export of `sql` in chunks of `chunk_rows` rows.
+
+    Rows are pulled from an unbuffered (server-side) cursor with fetchmany, so
+    memory stays constant whatever the table size. The pooled connection is held
+    only while the generator runs and is returned when it finishes or the client
+    disconnects. With gzip_output the chunks form one gzip stream.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip_output else None
+
+    def emit(text):
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+
+    with connection() as conn:
+        if conn:
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(sql, tuple(params))
+                while True:
+                    rows = cursor.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    chunk = emit(buf.getvalue())
+                    buf.seek(0)
+                    buf.truncate(0)
+                    if chunk:
+                        yield chunk
+            except Exception as e:
+                print(f"[EXPORT] Streaming export failed: {e}")
+            finally:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    tail = emit(buf.getvalue())
+    if compressor:
+        tail += compressor.flush()
+    if tail:
+        yield tail
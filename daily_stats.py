@@ -0,0 +1,196 @@
+"""
+Pre-aggregated daily statistics for the admin dashboard.
+
+daily_prediction_counts  one row per (day, source); source is the model
+                         version of the prediction ('v1' or 'v2')
+daily_disease_counts     one row per (day, disease, disease_rank) counting how
+                         often a disease was the rank-1/2/3 v2 prediction
+
+Both are derived from the unified `predictions` table (prediction_store.py).
+
+The history writer calls apply_rollups() inside the same transaction as each
+batched INSERT, so the rollups never drift from the raw tables (a failed batch
+rolls back both and is retried from the spill file).
+
+Backfill (or rebuild) from the raw tables with:
+
+    python daily_stats.py --backfill
+
+Run it once after deploying, ideally while traffic is quiet: it replaces the
+rollups with a fresh aggregate of the predictions table.
+"""
+import argparse
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+ROLLUP_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS daily_prediction_counts (
+        day DATE NOT NULL,
+        source VARCHAR(8) NOT NULL,
+        predictions INT UNSIGNED NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, source)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_disease_counts (
+        day DATE NOT NULL,
+        disease VARCHAR(255) NOT NULL,
+        disease_rank TINYINT UNSIGNED NOT NULL,
+        predictions INT UNSIGNED NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, disease, disease_rank),
+        KEY idx_disease (disease)
+    )
+    """,
+)
+
+RANK_COLUMNS = ('top_disease_1', 'top_disease_2', 'top_disease_3')
+
+_tables_ready = False
+
+
+def ensure_rollup_tables(cursor):
+    """Create the rollup tables once per process (DDL commits implicitly in MySQL)."""
+    global _tables_ready
+    if _tables_ready:
+        return
+    for ddl in ROLLUP_DDL:
+        cursor.execute(ddl)
+    _tables_ready = True
+
+
+def _day_of(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if value:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    return date.today()
+
+
+def rollup_deltas(items):
+    """
+    Per-day counters for a batch of (table, row) items as queued by the history
+    writer. Returns (Counter[(day, source)], Counter[(day, disease, rank)]).
+    """
+    per_day = Counter()
+    per_disease = Counter()
+    for table, row in items:
+        if table != 'predictions':
+            continue
+        source = row.get('model_version')
+        day = _day_of(row.get('predicted_at'))
+        per_day[(day, source)] += 1
+        if source == 'v2':
+            for rank, column in enumerate(RANK_COLUMNS, start=1):
+                disease = row.get(column)
+                if disease:
+                    per_disease[(day, disease, rank)] += 1
+    return per_day, per_disease
+
+
+def apply_rollups(cursor, items):
+    """Add a batch's counts to the rollup tables (history writer on_batch hook)."""
+    per_day, per_disease = rollup_deltas(items)
+    if not per_day:
+        return
+    ensure_rollup_tables(cursor)
+    cursor.executemany(
+        "INSERT INTO daily_prediction_counts (day, source, predictions) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE predictions = predictions + VALUES(predictions)",
+        [(day, source, n) for (day, source), n in per_day.items()]
+    )
+    if per_disease:
+        cursor.executemany(
+            "INSERT INTO daily_disease_counts (day, disease, disease_rank, predictions) VALUES (%s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE predictions = predictions + VALUES(predictions)",
+            [(day, disease, rank, n) for (day, disease, rank), n in per_disease.items()]
+        )
+
+
+def rebuild_rollups(cursor):
+    """Replace both rollup tables with a fresh aggregate of predictions (no DDL, runs in the caller's transaction)."""
+    cursor.execute("DELETE FROM daily_prediction_counts")
+    cursor.execute("DELETE FROM daily_disease_counts")
+    cursor.execute("""
+        INSERT INTO daily_prediction_counts (day, source, predictions)
+        SELECT DATE(predicted_at), model_version, COUNT(*) FROM predictions
+        GROUP BY DATE(predicted_at), model_version
+    """)
+    for rank, column in enumerate(RANK_COLUMNS, start=1):
+        cursor.execute(f"""
+            INSERT INTO daily_disease_counts (day, disease, disease_rank, predictions)
+            SELECT DATE(predicted_at), {column}, %s, COUNT(*) FROM predictions
+            WHERE model_version = 'v2' AND {column} IS NOT NULL AND {column} <> ''
+            GROUP BY DATE(predicted_at), {column}
+        """, (rank,))
+
+
+def backfill(conn):
+    """Rebuild both rollup tables from the predictions table."""
+    cursor = conn.cursor()
+    try:
+        ensure_rollup_tables(cursor)
+        rebuild_rollups(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# ---- dashboard reads ----
+
+def total_predictions(cursor):
+    cursor.execute("SELECT COALESCE(SUM(predictions), 0) AS total FROM daily_prediction_counts")
+    row = cursor.fetchone()
+    return int(row['total']) if row else 0
+
+
+def daily_series(cursor, start_day, days):
+    """[{'date': 'YYYY-MM-DD', 'count': n}, ...] for `days` days from start_day, zero-filled."""
+    cursor.execute("""
+        SELECT day, SUM(predictions) AS total
+        FROM daily_prediction_counts
+        WHERE day >= %s AND day < %s
+        GROUP BY day
+    """, (start_day, start_day + timedelta(days=days)))
+    counts = {_day_of(r['day']): int(r['total']) for r in cursor.fetchall()}
+    series = []
+    for i in range(days):
+        d = start_day + timedelta(days=i)
+        series.append({'date': d.strftime('%Y-%m-%d'), 'count': counts.get(d, 0)})
+    return series
+
+
+def top_diseases(cursor, limit=10):
+    """Diseases most often in the v2 top 3, [{'disease': ..., 'count': n}, ...]."""
+    cursor.execute("""
+        SELECT disease, SUM(predictions) AS total
+        FROM daily_disease_counts
+        GROUP BY disease
+        ORDER BY total DESC
+        LIMIT %s
+    """, (limit,))
+    return [{'disease': r['disease'], 'count': int(r['total'])} for r in cursor.fetchall() if r['disease']]
+
+
+if __name__ == '__main__':
+    import mysql.connector
+    from db_pool import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description="Maintain the admin dashboard rollup tables.")
+    parser.add_argument('--backfill', action='store_true',
+                        help="rebuild the rollups from the predictions table")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.print_help()
+    else:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        try:
+            backfill(conn)
+        finally:
+            conn.close()
+        print("[STATS] Rollup tables rebuilt.")
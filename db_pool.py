@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'user': os.environ.get('DB_USER', 'lord'),
+    'password': os.environ.get('DB_PASSWORD', '2005'),
+    'database': os.environ.get('DB_NAME', 'disease_prediction'),
+}
+
+POOL_CONFIG = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10)),
+    'recycle': float(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    'pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0',
+}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """
+    Thin proxy around a raw DB-API connection. Everything is delegated to the
+    underlying connection except close(), which hands it back to the pool.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._pool._release(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Bounded connection pool.
+
+    - pool_size: connections kept open while idle
+    - max_overflow: extra connections allowed under load, closed when returned
+    - recycle: idle connections older than this (seconds) are replaced on borrow
+    - pre_ping: health-check a connection before handing it out
+    - timeout: seconds to wait for a free connection before raising PoolTimeout
+
+    `connect` is any zero-argument callable returning a DB-API connection, so the
+    pool works the same against MySQL/MariaDB or an in-process stand-in.
+    """
+
+    def __init__(self, connect, pool_size=5, max_overflow=10, recycle=1800, timeout=10, pre_ping=True):
+        self._connect = connect
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+
+        self._idle = deque()  # (raw_conn, returned_at)
+        self._open = 0
+        self._cond = threading.Condition()
+        self._counters = {
+            'created': 0,
+            'recycled': 0,
+            'failed_pings': 0,
+            'borrowed': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def _is_alive(self, raw):
+        try:
+            is_connected = getattr(raw, 'is_connected', None)
+            if is_connected is not None:
+                return bool(is_connected())
+            cursor = raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _new_connection(self):
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._counters['created'] += 1
+        return raw
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, returned_at = self._idle.pop()
+                    break
+                if self._open < self.pool_size + self.max_overflow:
+                    self._open += 1
+                    raw = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(f"No database connection available within {self.timeout}s")
+                self._counters['waits'] += 1
+                self._cond.wait(remaining)
+
+        if raw is None:
+            return self._checkout(self._new_connection())
+
+        stale = self.recycle and time.monotonic() - returned_at > self.recycle
+        if stale or (self.pre_ping and not self._is_alive(raw)):
+            with self._cond:
+                self._counters['recycled' if stale else 'failed_pings'] += 1
+            self._discard(raw)
+            raw = self._new_connection()
+        return self._checkout(raw)
+
+    def _checkout(self, raw):
+        with self._cond:
+            self._counters['borrowed'] += 1
+        return PooledConnection(self, raw)
+
+    def _release(self, raw):
+        # drop any open transaction so the next borrower starts clean
+        try:
+            raw.rollback()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            self._discard(raw)
+            return
+
+        with self._cond:
+            if len(self._idle) < self.pool_size:
+                self._idle.append((raw, time.monotonic()))
+                raw = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+        if raw is not None:
+            self._discard(raw)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def dispose(self):
+        """Close every idle connection (checked-out ones close when returned)."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._counters)
+            stats.update({
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'overflow': max(0, self._open - self.pool_size),
+            })
+        return stats
+
+
+def create_mysql_pool(db_config=None, **overrides):
+    config = dict(DB_CONFIG if db_config is None else db_config)
+    options = dict(POOL_CONFIG)
+    options.update(overrides)
+
+    def connect():
+        import mysql.connector  # deferred to the first connection, not app start-up
+        return mysql.connector.connect(**config)
+
+    return ConnectionPool(connect, **options)
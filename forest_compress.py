@@ -0,0 +1,318 @@
+"""
+Post-training compression of the serving forests.
+
+    python forest_compress.py v1                          # compress CURRENT, save a new version
+    python forest_compress.py v2 --max-depth 12 --quantize uint8 --lookup
+    python forest_compress.py v1 --dry-run                # report only
+    python forest_compress.py v1 --version 20250101000000-abcd1234
+
+Works on the FlatForest arrays of a model artifact (model_artifact.py), no
+sklearn model needed. For every forest:
+
+1. cap depth: nodes at --max-depth become leaves. export_forest() keeps the
+   class distribution of internal nodes too, so a new leaf predicts what the
+   training samples reaching it had.
+2. prune: a split whose two children are leaves with distributions within
+   --prune-tolerance (largest per-class difference) of each other becomes a
+   leaf with its own distribution, bottom-up, so whole redundant subtrees
+   collapse. The default tolerance of 0 only removes splits between identical
+   leaves.
+3. drop the nodes no longer reachable and renumber the rest.
+4. quantize the leaf distributions (float16, or uint8 rounded so each row sums
+   to exactly 255) and merge duplicate leaves: `value` keeps each distinct row
+   once and `value_index` points every node at its row. Internal nodes need no
+   distribution at serving time, so theirs are dropped.
+5. narrow the node arrays: feature / children to int16 when they fit,
+   thresholds to float32 when every threshold is exactly representable.
+
+The compressed forests are scored on the same 20% held-out split train.py
+reports accuracy on, and compared with the source forests on inputs like the
+ones served: for v1, random subsets of the held-out rows' symptoms and random
+symptom pairs (every full dataset row scores 1.0 on any forest, so accuracy
+alone says nothing about partial inputs); for v2, the whole form input grid.
+A new artifact version is saved (and becomes CURRENT, so running servers
+hot-reload it) only when, for every forest, the held-out accuracy drops by at
+most --max-accuracy-drop, the top-1 answer agrees with the source on at least
+--min-agreement of those inputs and no probability moves by more than
+--max-probability-diff. Its metadata records the report next to the source
+version.
+
+Capping depth on v1 is rarely accepted: its trees are deep because they
+split on one absent symptom after another, and partial symptom sets are
+scored by exactly those deep paths.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from forest_engine import FlatForest
+from model_artifact import load_artifact, save_artifact
+
+QUANTIZE = ('float16', 'uint8', 'none')
+# default gates: compressed vs source forest on the probe inputs
+MIN_AGREEMENT = 0.99
+MAX_PROBABILITY_DIFF = 0.05
+
+
+def _depths(forest):
+    depth = np.zeros(len(forest.feature), dtype=np.int32)
+    # sklearn numbers children after their parent, so one forward pass suffices
+    for node in range(len(depth)):
+        if forest.feature[node] >= 0:
+            depth[forest.left[node]] = depth[node] + 1
+            depth[forest.right[node]] = depth[node] + 1
+    return depth
+
+
+def cap_depth(arrays, max_depth):
+    """Make every node at depth `max_depth` a leaf (unreachable nodes are dropped by compact())."""
+    if max_depth is None:
+        return arrays
+    arrays = dict(arrays, feature=arrays['feature'].copy())
+    depth = _depths(FlatForest(arrays))
+    arrays['feature'][depth >= max_depth] = -1
+    return arrays
+
+
+def prune(arrays, tolerance=0.0):
+    """Collapse splits between leaves whose distributions differ by at most `tolerance`."""
+    feature = arrays['feature'].copy()
+    left, right, value = arrays['left'], arrays['right'], arrays['value']
+    # children come after their parent: walking backwards sees them collapse first
+    for node in range(len(feature) - 1, -1, -1):
+        if feature[node] < 0:
+            continue
+        lo, hi = left[node], right[node]
+        if feature[lo] < 0 and feature[hi] < 0 and \
+                np.max(np.abs(value[lo] - value[hi])) <= tolerance:
+            feature[node] = -1
+    return dict(arrays, feature=feature)
+
+
+def compact(arrays):
+    """Drop unreachable nodes and renumber, keeping each tree's nodes contiguous and in order."""
+    feature, left, right = arrays['feature'], arrays['left'], arrays['right']
+    keep = np.zeros(len(feature), dtype=bool)
+    keep[arrays['roots']] = True
+    for node in range(len(feature)):
+        if keep[node] and feature[node] >= 0:
+            keep[left[node]] = keep[right[node]] = True
+    new_id = np.cumsum(keep) - 1
+    is_split = feature[keep] >= 0
+    out = {name: arrays[name][keep] for name in ('feature', 'threshold', 'missing_left', 'value')}
+    out['left'] = np.where(is_split, new_id[left[keep]], -1).astype(np.int32)
+    out['right'] = np.where(is_split, new_id[right[keep]], -1).astype(np.int32)
+    out['roots'] = new_id[arrays['roots']].astype(np.int32)
+    for name in ('classes', 'feature_names', 'class_names'):
+        if name in arrays:
+            out[name] = arrays[name]
+    return out
+
+
+def quantize_rows(value, mode):
+    """Leaf distributions as float16, uint8 (each row summing to 255) or unchanged float64."""
+    if mode == 'float16':
+        return value.astype(np.float16)
+    if mode == 'uint8':
+        # largest remainder rounding: keeps every row's total at exactly 255
+        scaled = value * 255
+        q = np.floor(scaled).astype(np.int64)
+        short = 255 - q.sum(axis=1)
+        order = np.argsort(-(scaled - q), axis=1)
+        for i in np.flatnonzero(short > 0):
+            q[i, order[i, :short[i]]] += 1
+        return q.astype(np.uint8)
+    return value
+
+
+def _narrow_int(arr):
+    return arr.astype(np.int16) if arr.max(initial=0) < 2 ** 15 else arr.astype(np.int32)
+
+
+def merge_leaves(arrays, mode):
+    """Quantize the leaf rows, store each distinct row once and index it per node."""
+    is_leaf = arrays['feature'] < 0
+    leaf_rows = quantize_rows(arrays['value'][is_leaf], mode)
+    table, inverse = np.unique(leaf_rows, axis=0, return_inverse=True)
+    index = np.zeros(len(is_leaf), dtype=np.int64)
+    index[is_leaf] = inverse.ravel()
+    out = dict(arrays, value=np.ascontiguousarray(table))
+    out['value_index'] = index.astype(np.uint16 if len(table) <= 2 ** 16 else np.int32)
+    return out
+
+
+def narrow(arrays):
+    out = dict(arrays)
+    out['feature'] = _narrow_int(arrays['feature'])
+    out['left'] = _narrow_int(arrays['left'])
+    out['right'] = _narrow_int(arrays['right'])
+    threshold32 = arrays['threshold'].astype(np.float32)
+    if np.array_equal(threshold32.astype(np.float64), arrays['threshold']):
+        out['threshold'] = threshold32
+    return out
+
+
+def compress(forest, max_depth=None, prune_tolerance=0.0, quantize='uint8'):
+    """Compressed copy of a FlatForest exported by export_forest() (not already compressed)."""
+    if forest.value_index is not None:
+        raise ValueError("forest is already compressed; compress its source version instead")
+    arrays = forest.arrays()
+    arrays = cap_depth(arrays, max_depth)
+    arrays = prune(arrays, prune_tolerance)
+    arrays = compact(arrays)
+    arrays = merge_leaves(arrays, quantize)
+    return FlatForest(narrow(arrays))
+
+
+def serving_bytes(forest):
+    return int(sum(np.asarray(arr).nbytes for name, arr in forest.arrays().items()
+                   if name not in ('feature_names', 'class_names')))
+
+
+# ---- evaluation ----
+
+def holdout_sets(name):
+    """{forest name: (X_test, y_test)} on the split train.py reports accuracy on."""
+    from sklearn.model_selection import train_test_split
+    from train import load_v1_dataset, load_v2_dataset
+
+    if name == 'v1':
+        _, X, y, _, _ = load_v1_dataset()
+        targets = {'disease': y}
+    elif name == 'v2':
+        X, y_disease, y_outcome, _ = load_v2_dataset()
+        targets = {'disease': y_disease, 'outcome': y_outcome}
+    else:
+        raise ValueError(f"no held-out data known for artifact {name!r}")
+    X = np.asarray(X, dtype=np.float32)
+    sets = {}
+    for forest_name, y in targets.items():
+        _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        sets[forest_name] = (X_test, np.asarray(y_test))
+    return sets
+
+
+def probe_inputs(name, X, pairs=2000, seed=42):
+    """
+    Inputs shaped like real requests. v1: one random non-empty subset of each
+    row of `X` (the held-out symptom rows) plus `pairs` random symptom pairs;
+    v2: every point of the form input grid.
+    """
+    if name == 'v2':
+        from v2_lookup import all_inputs
+        return all_inputs().astype(np.float32)
+    rng = np.random.RandomState(seed)
+    probes = np.zeros((len(X) + pairs, X.shape[1]), dtype=np.float32)
+    for i, row in enumerate(X):
+        present = np.flatnonzero(row)
+        if len(present):
+            probes[i, rng.choice(present, rng.randint(1, len(present) + 1), replace=False)] = 1
+    for i in range(len(X), len(probes)):
+        probes[i, rng.choice(X.shape[1], 2, replace=False)] = 1
+    return probes
+
+
+def evaluate(original, compressed, X, y, probes):
+    from train import measure_forest
+
+    p_orig, p_comp = original.predict_proba(X), compressed.predict_proba(X)
+    acc_orig = float(np.mean(original.classes_[p_orig.argmax(axis=1)] == y))
+    acc_comp = float(np.mean(compressed.classes_[p_comp.argmax(axis=1)] == y))
+    q_orig, q_comp = original.predict_proba(probes), compressed.predict_proba(probes)
+    before, after = measure_forest(original.arrays(), X), measure_forest(compressed.arrays(), X)
+    return {
+        'accuracy_before': round(acc_orig, 4),
+        'accuracy_after': round(acc_comp, 4),
+        'accuracy_delta': round(acc_comp - acc_orig, 4),
+        'probe_inputs': len(probes),
+        'top1_agreement': round(float(np.mean(q_orig.argmax(axis=1) == q_comp.argmax(axis=1))), 4),
+        'max_probability_diff': round(float(np.max(np.abs(q_orig - q_comp))), 4),
+        'mean_top_probability_before': round(float(q_orig.max(axis=1).mean()), 4),
+        'mean_top_probability_after': round(float(q_comp.max(axis=1).mean()), 4),
+        'nodes_before': before['nodes'],
+        'nodes_after': int(len(compressed.feature)),
+        'bytes_before': serving_bytes(original),
+        'bytes_after': serving_bytes(compressed),
+        'latency_1_us_before': before['latency_1_us'],
+        'latency_1_us_after': after['latency_1_us'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compress a model artifact's forests for serving.")
+    parser.add_argument('name', choices=('v1', 'v2'))
+    parser.add_argument('--version', help="source version (default: CURRENT)")
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--prune-tolerance', type=float, default=0.0)
+    parser.add_argument('--quantize', choices=QUANTIZE, default='uint8')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                        help="largest held-out accuracy loss accepted per forest")
+    parser.add_argument('--min-agreement', type=float, default=MIN_AGREEMENT,
+                        help="smallest share of probe inputs whose top-1 class must not change")
+    parser.add_argument('--max-probability-diff', type=float, default=MAX_PROBABILITY_DIFF,
+                        help="largest change of any class probability accepted on the probe inputs")
+    parser.add_argument('--dry-run', action='store_true', help="report only, save nothing")
+    parser.add_argument('--lookup', action='store_true',
+                        help="v2: rebuild the lookup table from the compressed forests")
+    args = parser.parse_args(argv)
+
+    source = load_artifact(args.name, version=args.version, verify=True)
+    if 'compression' in source.metadata:
+        parser.error(f"{args.name}/{source.version} is already compressed "
+                     f"(from {source.metadata['compression']['source_version']}); pass --version")
+    holdout = holdout_sets(args.name)
+
+    compressed, report = {}, {}
+    for forest_name, forest in source.forests.items():
+        compressed[forest_name] = compress(forest, args.max_depth, args.prune_tolerance, args.quantize)
+        X, y = holdout[forest_name]
+        report[forest_name] = evaluate(forest, compressed[forest_name], X, y, probe_inputs(args.name, X))
+        r = report[forest_name]
+        print(f"{args.name}/{forest_name}: {r['nodes_before']} -> {r['nodes_after']} nodes, "
+              f"{r['bytes_before'] / 1024:.1f} -> {r['bytes_after'] / 1024:.1f} KB, "
+              f"1-row {r['latency_1_us_before']:.0f} -> {r['latency_1_us_after']:.0f} us, "
+              f"accuracy {r['accuracy_before'] * 100:.2f}% -> {r['accuracy_after'] * 100:.2f}% "
+              f"({r['accuracy_delta'] * 100:+.2f})")
+        print(f"    {r['probe_inputs']} probe inputs: top-1 agreement {r['top1_agreement'] * 100:.1f}%, "
+              f"max probability diff {r['max_probability_diff']:.4f}, mean top probability "
+              f"{r['mean_top_probability_before']:.3f} -> {r['mean_top_probability_after']:.3f}")
+
+    failures = []
+    for forest_name, r in report.items():
+        if -r['accuracy_delta'] > args.max_accuracy_drop:
+            failures.append(f"{forest_name}: accuracy drop above {args.max_accuracy_drop * 100:.2f} points")
+        if r['top1_agreement'] < args.min_agreement:
+            failures.append(f"{forest_name}: top-1 agreement below {args.min_agreement * 100:.1f}%")
+        if r['max_probability_diff'] > args.max_probability_diff:
+            failures.append(f"{forest_name}: probability diff above {args.max_probability_diff}")
+    if failures:
+        print(f"❌ Not saved ({'; '.join(failures)}).")
+        return 1
+    if args.dry_run:
+        return 0
+
+    metadata = dict(source.metadata, compression={
+        'source_version': source.version,
+        'max_depth': args.max_depth,
+        'prune_tolerance': args.prune_tolerance,
+        'quantize': args.quantize,
+        'max_accuracy_drop': args.max_accuracy_drop,
+        'min_agreement': args.min_agreement,
+        'max_probability_diff': args.max_probability_diff,
+        'forests': report,
+    })
+    version = save_artifact(args.name, {n: f.arrays() for n, f in compressed.items()}, metadata)
+    print(f"✅ Compressed artifact {args.name}/{version} saved (from {source.version})")
+
+    if args.lookup and args.name == 'v2':
+        from v2_lookup import build_lookup_table, save_lookup_table
+        disease = compressed['disease']
+        table = build_lookup_table(disease, compressed['outcome'], disease.class_names, disease.feature_names)
+        save_lookup_table(table)
+        print(f"✅ V2 lookup table rebuilt from the compressed forests ({len(table['outcome'])} inputs).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
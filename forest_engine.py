@@ -0,0 +1,143 @@
+"""
+Flattened random-forest inference in plain NumPy.
+
+export_forest() copies every tree of a fitted sklearn RandomForestClassifier
+into contiguous arrays (feature, threshold, children, leaf class probabilities)
+with node ids offset so all trees share one set of arrays. FlatForest walks all
+trees for all rows at once and reproduces predict_proba without sklearn or pandas.
+
+Compressed forests (forest_compress.py) store leaf distributions once per
+distinct (quantized) row in `value` and point every node at its row with
+`value_index`; their probabilities are renormalized per row.
+"""
+import numpy as np
+
+FOREST_ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots', 'classes')
+COMPRESSED_ARRAYS = ('value_index',)
+
+
+def export_forest(model, feature_names=None, class_names=None):
+    features, thresholds, lefts, rights, missing_left, values, roots = [], [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        value = np.ascontiguousarray(tree.value[:, 0, :], dtype=np.float64)
+        totals = value.sum(axis=1, keepdims=True)
+        # sklearn >= 1.4 stores class fractions, older versions raw counts
+        if not np.allclose(totals, 1.0):
+            value = value / totals
+
+        roots.append(offset)
+        features.append(np.where(is_leaf, -1, tree.feature))
+        thresholds.append(tree.threshold)
+        lefts.append(np.where(is_leaf, -1, tree.children_left + offset))
+        rights.append(np.where(is_leaf, -1, tree.children_right + offset))
+        # where NaN inputs go at each split (trees fit on data with missing values)
+        missing_left.append(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=bool)))
+        values.append(value)
+        offset += tree.node_count
+
+    arrays = {
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'left': np.concatenate(lefts).astype(np.int32),
+        'right': np.concatenate(rights).astype(np.int32),
+        'missing_left': np.concatenate(missing_left).astype(bool),
+        'value': np.concatenate(values),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'classes': np.asarray(model.classes_),
+    }
+    if feature_names is not None:
+        arrays['feature_names'] = np.asarray(list(feature_names), dtype=str)
+    if class_names is not None:
+        arrays['class_names'] = np.asarray(list(class_names), dtype=str)
+    return arrays
+
+
+def save_forest(path, arrays):
+    np.savez(path, **arrays)
+
+
+def load_forest(path):
+    with np.load(path, allow_pickle=False) as data:
+        return FlatForest({name: data[name] for name in data.files})
+
+
+def load_forest_if_present(path):
+    try:
+        forest = load_forest(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[MODEL] Failed to load {path}: {e}")
+        return None
+    print(f"[MODEL] Loaded {path} (flat forest, {forest.n_trees} trees).")
+    return forest
+
+
+class FlatForest:
+    """predict_proba / predict over arrays produced by export_forest()."""
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.missing_left = arrays['missing_left']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.classes_ = arrays['classes']
+        self.value_index = arrays.get('value_index')
+        self.feature_names = arrays.get('feature_names')
+        self.class_names = arrays.get('class_names')
+        self.n_trees = len(self.roots)
+
+    def arrays(self):
+        """The forest's arrays by name, as accepted by the constructor."""
+        arrays = {name: getattr(self, name) for name in FOREST_ARRAYS if name != 'classes'}
+        arrays['classes'] = self.classes_
+        for name in COMPRESSED_ARRAYS + ('feature_names', 'class_names'):
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+        return arrays
+
+    def apply(self, X):
+        """Leaf node id reached in every tree, shape (n_rows, n_trees)."""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).copy()
+        while True:
+            feat = self.feature[nodes]
+            active = feat >= 0
+            if not active.any():
+                return nodes
+            x = X[rows, np.maximum(feat, 0)]
+            go_left = np.where(np.isnan(x), self.missing_left[nodes], x <= self.threshold[nodes])
+            nxt = np.where(go_left, self.left[nodes], self.right[nodes])
+            nodes = np.where(active, nxt, nodes)
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        rows = leaves if self.value_index is None else self.value_index[leaves]
+        proba = np.zeros((leaves.shape[0], self.value.shape[1]), dtype=np.float64)
+        # accumulate tree by tree, in the same order as sklearn
+        for t in range(self.n_trees):
+            proba += self.value[rows[:, t]]
+        if self.value_index is None:
+            proba /= self.n_trees
+        else:
+            # quantized rows do not sum to exactly 1 (float16) or sum to 255 (uint8)
+            proba /= proba.sum(axis=1, keepdims=True)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def max_parity_error(model, forest, X):
+    """Largest absolute difference between sklearn's and the flat forest's probabilities."""
+    expected = model.predict_proba(X)
+    actual = forest.predict_proba(np.asarray(X))
+    return float(np.max(np.abs(expected - actual)))
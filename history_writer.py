@@ -0,0 +1,413 @@
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: the spill file is only guarded within one process
+    fcntl = None
+
+from prediction_store import COLUMNS as PREDICTION_COLUMNS
+
+# Columns accepted per table; rows are dicts keyed by these names
+TABLE_COLUMNS = {
+    'history': ('username', 'symptoms', 'prediction', 'timestamp'),
+    'prediction_history': (
+        'username', 'fever', 'cough', 'fatigue', 'breathing', 'age', 'gender', 'bp', 'cholesterol',
+        'top_disease_1', 'top_disease_2', 'top_disease_3', 'outcome', 'predicted_at'
+    ),
+    'audit_log': ('username', 'action', 'ip_address', 'status', 'created_at'),
+    'predictions': PREDICTION_COLUMNS,
+    'prediction_results': ('id', 'username', 'kind', 'payload', 'created_at', 'expires_at'),
+}
+
+_STOP = object()
+
+# DB-API errors caused by the rows themselves (bad value, duplicate key, bad
+# statement): retrying them can never succeed, unlike a lost connection
+DATA_ERRORS = ('DataError', 'IntegrityError', 'ProgrammingError')
+
+
+def is_data_error(exc):
+    return any(cls.__name__ in DATA_ERRORS for cls in type(exc).__mro__)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _copy_lines(src, path):
+    """Append the rest of `src` to `path`, completing a last line cut short by a crash."""
+    with open(path, 'a', encoding='utf-8') as dst:
+        for line in src:
+            dst.write(line if line.endswith('\n') else line + '\n')
+
+
+def _spill_default(value):
+    # bytes (e.g. predictions.input_encoded) survive the JSON round trip as hex
+    if isinstance(value, (bytes, bytearray)):
+        return {'$bytes': bytes(value).hex()}
+    return str(value)
+
+
+def _spill_object(obj):
+    if len(obj) == 1 and '$bytes' in obj:
+        return bytes.fromhex(obj['$bytes'])
+    return obj
+
+
+class HistoryWriter:
+    """
+    Write-behind queue for predictions / history / prediction_history / audit_log rows.
+
+    Request handlers enqueue() a row and return immediately. A background thread
+    drains the queue and writes each table's rows with one multi-row INSERT per
+    batch, flushing when `batch_size` rows are pending or `flush_interval`
+    seconds have passed.
+
+    - The queue is bounded (`max_queue`). When it is full, enqueue() blocks for
+      up to `put_timeout` seconds (backpressure), then appends the row to the
+      local spill file instead of dropping it.
+    - When the database is unavailable, the batch is appended to the spill file
+      (JSON lines). It is replayed after the next successful write. Appends and
+      the hand-over to a replay are serialized with an fcntl lock on
+      `<spill_path>.lock`, and each process replays from its own
+      `<spill_path>.<pid>.replay`, so gunicorn workers sharing the spill file
+      never overwrite each other's rows. The replay file is read in
+      `batch_size` chunks and removed only after its last chunk is written;
+      replay files left by processes that died (or by an interrupted replay of
+      this one) are appended back to the spill file when the writer thread
+      starts and before each replay. A crash mid-replay can therefore write
+      the chunks that were already committed a second time, but loses nothing.
+    - When a batch fails because of its data (DATA_ERRORS), its rows are
+      written one by one and each row that still fails goes to the dead-letter
+      file (`dead_letter_path`, JSON lines with the error) instead of being
+      spilled and retried forever.
+    - Rows for `deferred_tables` (tables a later migration creates, e.g.
+      predictions) are dropped while the table does not exist. Each batch
+      checks again until it does, so a migration is picked up by the next
+      batch instead of after a cached schema check expires.
+    - close() (registered with atexit by the app) drains and flushes everything.
+
+    `connection` is a context manager factory yielding a DB-API connection, or
+    None when the database is unreachable (app.db_connection).
+
+    `on_batch(cursor, items)`, if given, runs inside each write transaction
+    before the rows are inserted (e.g. daily_stats.apply_rollups), so derived
+    tables commit or roll back together with the batch. `on_commit(items)` runs
+    after a batch is committed (e.g. to invalidate cached counters).
+    """
+
+    def __init__(self, connection, batch_size=200, flush_interval=1.0, max_queue=10000,
+                 put_timeout=0.5, spill_path=os.path.join('spill', 'history_spill.jsonl'),
+                 dead_letter_path=None, deferred_tables=(), on_batch=None, on_commit=None):
+        self.connection = connection
+        self.deferred_tables = set(deferred_tables)
+        self.on_batch = on_batch
+        self.on_commit = on_commit
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.spill_path = spill_path
+        self.dead_letter_path = dead_letter_path or os.path.join(
+            os.path.dirname(spill_path), 'history_dead_letter.jsonl')
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._closed = False
+        self._existing_tables = set()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'dead_lettered': 0,
+            'deferred_dropped': 0,
+            'backpressure_waits': 0,
+            'errors': 0,
+        }
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, table, row):
+        if table not in TABLE_COLUMNS:
+            raise ValueError(f"Unknown history table: {table}")
+        item = (table, row)
+        if self._closed:
+            self._spill([item])
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._count('backpressure_waits')
+            try:
+                self._queue.put(item, timeout=self.put_timeout)
+            except queue.Full:
+                self._spill([item])
+                return
+        self._count('enqueued')
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    # ---- background thread ----
+
+    def _collect(self):
+        """Wait for the first row, then gather more until batch_size or flush_interval."""
+        items = []
+        first = self._queue.get()
+        if first is _STOP:
+            return items, True
+        items.append(first)
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _run(self):
+        self._adopt_replays()
+        while True:
+            items, stop = self._collect()
+            if items and self._write(items):
+                self._replay_spill()
+            if stop:
+                return
+
+    def _insert(self, cursor, items):
+        if self.on_batch is not None:
+            self.on_batch(cursor, items)
+        by_table = {}
+        for table, row in items:
+            by_table.setdefault(table, []).append(row)
+        for table, rows in by_table.items():
+            columns = TABLE_COLUMNS[table]
+            placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+            sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+                   + ", ".join([placeholders] * len(rows)))
+            params = [row.get(col) for row in rows for col in columns]
+            cursor.execute(sql, params)
+
+    def _write(self, items):
+        """
+        Insert items grouped per table. Returns False (and spills what was not
+        written) when the database is unavailable; rows rejected for their data
+        go to the dead-letter file and count as handled.
+        """
+        written, handled = [], 0
+        try:
+            with self.connection() as conn:
+                if conn is None:
+                    raise ConnectionError("database unavailable")
+                cursor = conn.cursor()
+                try:
+                    items = self._drop_deferred(cursor, items)
+                    if not items:
+                        return True
+                    try:
+                        self._insert(cursor, items)
+                        conn.commit()
+                        written, handled = items, len(items)
+                    except Exception as e:
+                        if not is_data_error(e):
+                            raise
+                        conn.rollback()
+                        print(f"[HISTORY] Batch of {len(items)} rows rejected ({e}); writing row by row.")
+                        # one transaction per row: only the rows at fault are dead-lettered
+                        for item in items:
+                            try:
+                                self._insert(cursor, [item])
+                                conn.commit()
+                                written.append(item)
+                            except Exception as row_error:
+                                if not is_data_error(row_error):
+                                    raise
+                                conn.rollback()
+                                self._dead_letter(item, row_error)
+                            handled += 1
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"[HISTORY] Batch write failed, spilling {len(items) - handled} rows: {e}")
+            self._count('errors')
+            self._spill(items[handled:])
+            self._committed(written)
+            return False
+        self._committed(written)
+        return True
+
+    def _drop_deferred(self, cursor, items):
+        """Drop the rows of deferred tables that do not exist yet (found tables are remembered)."""
+        pending = {table for table, _ in items if table in self.deferred_tables} - self._existing_tables
+        for table in pending:
+            cursor.execute("SELECT COUNT(*) FROM information_schema.tables "
+                           "WHERE table_schema = DATABASE() AND table_name = %s", (table,))
+            if cursor.fetchone()[0]:
+                self._existing_tables.add(table)
+        missing = pending - self._existing_tables
+        if not missing:
+            return items
+        kept = [item for item in items if item[0] not in missing]
+        self._count('deferred_dropped', len(items) - len(kept))
+        return kept
+
+    def _committed(self, items):
+        if not items:
+            return
+        self._count('written', len(items))
+        self._count('batches')
+        if self.on_commit is not None:
+            try:
+                self.on_commit(items)
+            except Exception as e:
+                print(f"[HISTORY] on_commit hook failed: {e}")
+
+    def _dead_letter(self, item, error):
+        table, row = item
+        print(f"[HISTORY] Dead-lettering a {table} row: {error}")
+        self._append(self.dead_letter_path,
+                     [json.dumps({'table': table, 'row': row, 'error': str(error)}, default=_spill_default)])
+        self._count('dead_lettered')
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive lock on the spill files, across threads and (with fcntl) processes."""
+        with self._spill_lock:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(self.spill_path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file is closed
+                yield
+
+    def _append(self, path, lines):
+        with self._locked():
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(''.join(line + "\n" for line in lines))
+
+    def _spill(self, items):
+        if not items:
+            return
+        self._append(self.spill_path,
+                     [json.dumps({'table': table, 'row': row}, default=_spill_default) for table, row in items])
+        self._count('spilled', len(items))
+
+    def _replay_path(self, pid=None):
+        return f'{self.spill_path}.{pid or os.getpid()}.replay'
+
+    def _adopt_replays(self):
+        """Append replay files of dead processes (and our own leftover) back to the spill file."""
+        prefix = os.path.basename(self.spill_path) + '.'
+        directory = os.path.dirname(self.spill_path) or '.'
+        with self._locked():
+            for name in os.listdir(directory):
+                if not (name.startswith(prefix) and name.endswith('.replay')):
+                    continue
+                pid = name[len(prefix):-len('.replay')]
+                if not pid.isdigit() or (int(pid) != os.getpid() and _pid_alive(int(pid))):
+                    continue
+                path = os.path.join(directory, name)
+                with open(path, encoding='utf-8') as src:
+                    _copy_lines(src, self.spill_path)
+                os.remove(path)
+                print(f"[HISTORY] Adopted spilled rows from {name}.")
+
+    def _read_chunks(self, f):
+        chunk = []
+        for line in f:
+            try:
+                rec = json.loads(line, object_hook=_spill_object)
+            except ValueError:
+                print(f"[HISTORY] Skipping a corrupt spill line: {line[:80]!r}")
+                continue
+            if rec.get('table') in TABLE_COLUMNS:
+                chunk.append((rec['table'], rec['row']))
+            if len(chunk) >= self.batch_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _replay_spill(self):
+        self._adopt_replays()
+        replay_path = self._replay_path()
+        with self._locked():
+            if not os.path.exists(self.spill_path):
+                return
+            os.replace(self.spill_path, replay_path)
+
+        replayed = 0
+        with open(replay_path, encoding='utf-8') as f:
+            for chunk in self._read_chunks(f):
+                if not self._write(chunk):
+                    # _write re-spilled this chunk; hand the unread rest back to the spill file
+                    with self._locked():
+                        _copy_lines(f, self.spill_path)
+                    break
+                replayed += len(chunk)
+                self._count('replayed', len(chunk))
+        # only now is every row either written, dead-lettered or back in the spill file
+        os.remove(replay_path)
+        if replayed:
+            print(f"[HISTORY] Replayed {replayed} spilled rows.")
+
+    # ---- lifecycle ----
+
+    def close(self, timeout=10):
+        """Stop accepting rows, flush everything queued and stop the worker."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        # anything left (worker never started or timed out) goes to the spill file
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            self._spill(leftovers)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        stats['max_queue'] = self._queue.maxsize
+        stats['spill_pending'] = os.path.exists(self.spill_path)
+        return stats
@@ -0,0 +1,105 @@
+"""
+Import-time digest of app.py, to catch regressions in time-to-first-request.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter (with
+STARTUP_MODE=lazy, so only the import itself is measured) and
+summarises the raw log: total time, the slowest modules by cumulative and by
+self time, and whether any module that is meant to load lazily was imported.
+
+    python importtime_report.py                      # digest
+    python importtime_report.py --top 30 --json      # machine-readable
+    python importtime_report.py --budget-ms 600      # exit 1 when over budget
+
+The command exits 1 when the budget is exceeded or a lazy module was
+imported eagerly, so it can run as a CI step.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# imported on first use by app.py (lazy_imports.LazyModule / function-level imports)
+LAZY_MODULES = ('pandas', 'reportlab', 'mysql.connector', 'sklearn', 'shared_forest')
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(module='app', env_overrides=None):
+    env = dict(os.environ)
+    env.update({'STARTUP_MODE': 'lazy', 'MODEL_WATCH_INTERVAL': '0'})
+    env.update(env_overrides or {})
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def digest(rows, module='app', top=15):
+    total = next((cum for name, _, cum, depth in rows if name == module and depth == 0), None)
+    imported = {name for name, _, _, _ in rows}
+    eager = sorted(m for m in LAZY_MODULES if m in imported)
+    return {
+        'module': module,
+        'total_ms': round((total or 0) / 1000, 1),
+        'modules_imported': len(imported),
+        'eager_lazy_modules': eager,
+        'slowest_cumulative': [
+            {'module': name, 'ms': round(cum / 1000, 1)}
+            for name, _, cum, depth in sorted(rows, key=lambda r: -r[2])
+            if name != module and depth <= 1][:top],
+        'slowest_self': [
+            {'module': name, 'ms': round(self_us / 1000, 1)}
+            for name, self_us, _, _ in sorted(rows, key=lambda r: -r[1])][:top],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time digest of app.py")
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('IMPORT_BUDGET_MS', 0)))
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    report = digest(measure(args.module), args.module, args.top)
+    failures = []
+    if args.budget_ms and report['total_ms'] > args.budget_ms:
+        failures.append(f"import took {report['total_ms']} ms, budget {args.budget_ms:g} ms")
+    if report['eager_lazy_modules']:
+        failures.append("imported eagerly: " + ', '.join(report['eager_lazy_modules']))
+    report['failures'] = failures
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {args.module}: {report['total_ms']} ms, {report['modules_imported']} modules")
+        print("\nSlowest top-level imports (cumulative):")
+        for row in report['slowest_cumulative']:
+            print(f"  {row['ms']:>8.1f} ms  {row['module']}")
+        print("\nSlowest modules (self):")
+        for row in report['slowest_self']:
+            print(f"  {row['ms']:>8.1f} ms  {row['module']}")
+        for failure in failures:
+            print(f"\nFAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
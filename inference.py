@@ -0,0 +1,57 @@
+import numpy as np
+
+# v2 model feature columns, in training order, and the form/JSON field feeding each
+V2_FEATURES = [
+    "Fever", "Cough", "Fatigue", "Difficulty Breathing",
+    "Age", "Gender", "Blood Pressure", "Cholesterol Level"
+]
+V2_FIELDS = ['fever', 'cough', 'fatigue', 'breathing', 'age', 'gender', 'bp', 'cholesterol']
+
+MAX_BATCH_ROWS = 10000
+
+
+def encode_symptom_vectors(vectors, symptom_list):
+    X = np.asarray(vectors, dtype=np.int64)
+    if X.ndim != 2 or X.shape[1] != len(symptom_list):
+        raise ValueError(f"Symptom vectors must have {len(symptom_list)} columns")
+    return X
+
+
+def encode_profiles(profiles):
+    """Turn a list of v2 patient profile dicts (form field names) into a feature matrix."""
+    X = np.zeros((len(profiles), len(V2_FIELDS)), dtype=np.int64)
+    for r, profile in enumerate(profiles):
+        try:
+            X[r] = [int(profile.get(field, 0)) for field in V2_FIELDS]
+        except (TypeError, ValueError, AttributeError):
+            raise ValueError(f"Invalid patient profile in row {r}")
+    return X
+
+
+def predict_proba_batch(model, X, columns):
+    """Score a whole matrix in a single predict_proba call."""
+    import pandas as pd  # sklearn fallback only; the flat forests take plain arrays
+    return model.predict_proba(pd.DataFrame(X, columns=columns))
+
+
+def top_k_labels(probs, model, encoder, k=3):
+    """
+    Per row, the k most likely diseases as [{'disease', 'probability'}] with
+    probability in percent, matching what the result pages show.
+    """
+    k = max(1, min(int(k), probs.shape[1]))
+    top_idx = np.argsort(-probs, axis=1, kind='stable')[:, :k]
+    labels = np.asarray(model.classes_)[top_idx]
+    if encoder is not None:
+        names = encoder.inverse_transform(labels.ravel()).reshape(labels.shape)
+    else:
+        names = labels.astype(str)
+    top_probs = np.take_along_axis(probs, top_idx, axis=1)
+
+    return [
+        [
+            {'disease': str(name), 'probability': round(float(p) * 100, 2)}
+            for name, p in zip(row_names, row_probs)
+        ]
+        for row_names, row_probs in zip(names, top_probs)
+    ]
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolBusy(RuntimeError):
+    """Raised when every worker is busy and the pending queue is full."""
+
+
+class InferencePool:
+    """
+    Bounded thread pool for CPU-bound scoring (predict_proba on a whole batch).
+
+    At most `max_workers` calls run at once and at most `max_pending` more may
+    wait; beyond that submit() raises PoolBusy instead of queueing without
+    limit, so a burst of large batches cannot pile up unbounded work. NumPy and
+    sklearn's tree code release the GIL for most of the scoring, so threads
+    overlap well here.
+
+    call() is the blocking form used from Flask views; run() is the awaitable
+    form used by the ASGI entry point (asgi.py) to keep the event loop free.
+
+    `executor_factory(max_workers)` swaps in another executor, e.g. the process
+    pool of shared_forest.ForestProcessPool; `fn` must then be picklable.
+    """
+
+    def __init__(self, max_workers=None, max_pending=32, name='inference', executor_factory=None):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending
+        if executor_factory is not None:
+            self._executor = executor_factory(self.max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_workers + max_pending)
+        self._lock = threading.Lock()
+        # 'running' counts accepted calls not finished yet (executing or waiting for a worker)
+        self._stats = {'submitted': 0, 'rejected': 0, 'running': 0}
+
+    def submit(self, fn, *args, wait=None):
+        """Schedule fn(*args); waits up to `wait` seconds for a slot (None = no wait)."""
+        acquired = self._slots.acquire(timeout=wait) if wait else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise PoolBusy("Inference pool is saturated, try again shortly.")
+        with self._lock:
+            self._stats['submitted'] += 1
+            self._stats['running'] += 1
+
+        def done(_):
+            with self._lock:
+                self._stats['running'] -= 1
+            self._slots.release()
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            done(None)
+            raise
+        future.add_done_callback(done)
+        return future
+
+    def call(self, fn, *args, wait=5.0):
+        return self.submit(fn, *args, wait=wait).result()
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({'max_workers': self.max_workers, 'max_pending': self.max_pending})
+        return stats
@@ -0,0 +1,37 @@
+"""
+Deferred imports for heavy optional-at-start-up dependencies.
+
+    pd = LazyModule('pandas')
+
+binds a placeholder that imports the real module on first attribute access
+(pd.DataFrame), so importing app.py does not pay for pandas, reportlab or
+mysql.connector until a request needs them. preload() imports them up front,
+e.g. from the background warm-up, so the first request does not pay either.
+"""
+import importlib
+
+
+class LazyModule:
+    """Module proxy importing `name` on first attribute access (thread-safe via the import lock)."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def preload(*modules):
+    """Import every LazyModule given now."""
+    for module in modules:
+        module._load()
@@ -0,0 +1,97 @@
+import threading
+import time
+
+
+def count_query(sql):
+    """Metric function running a single-value COUNT/SUM query."""
+    def compute(cursor, *params):
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        if not row:
+            return 0
+        value = next(iter(row.values())) if isinstance(row, dict) else row[0]
+        return int(value or 0)
+    return compute
+
+
+class CachedMetrics:
+    """
+    Process-local TTL cache for dashboard counters.
+
+    Each metric is registered with the tables it reads. get() serves the cached
+    value for up to `ttl` seconds; invalidate_tables() drops every metric that
+    depends on a table the caller just wrote to, so admins see their own
+    changes immediately while page views stop re-scanning the tables.
+
+    `connection` is a context manager factory yielding a DB-API connection, or
+    None when the database is unreachable (app.db_connection). Values computed
+    while the database is down are not cached.
+    """
+
+    def __init__(self, connection, ttl=30):
+        self.connection = connection
+        self.ttl = ttl
+        self._metrics = {}   # name -> (compute, tables, ttl)
+        self._values = {}    # (name, params) -> (expires_at, value)
+        self._generation = 0  # bumped on invalidation so in-flight computes are not stored
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def register(self, name, compute, tables, ttl=None):
+        self._metrics[name] = (compute, frozenset(tables), ttl if ttl is not None else self.ttl)
+
+    def get(self, name, *params, default=0):
+        compute, _, ttl = self._metrics[name]
+        key = (name, params)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                self._counters['hits'] += 1
+                return entry[1]
+            self._counters['misses'] += 1
+            generation = self._generation
+
+        with self.connection() as conn:
+            if conn is None:
+                return default
+            cursor = conn.cursor(dictionary=True)
+            try:
+                value = compute(cursor, *params)
+            except Exception as e:
+                print(f"[METRICS] Failed to compute {name}: {e}")
+                return default
+            finally:
+                cursor.close()
+
+        with self._lock:
+            if generation == self._generation:
+                self._values[key] = (time.monotonic() + ttl, value)
+        return value
+
+    def get_many(self, *names):
+        return {name: self.get(name) for name in names}
+
+    def invalidate_tables(self, *tables):
+        """Drop cached metrics reading any of `tables`."""
+        tables = set(tables)
+        stale_names = {name for name, (_, deps, _) in self._metrics.items() if deps & tables}
+        with self._lock:
+            stale = [key for key in self._values if key[0] in stale_names]
+            for key in stale:
+                del self._values[key]
+            self._generation += 1
+            self._counters['invalidations'] += len(stale)
+
+    def invalidate(self):
+        with self._lock:
+            self._counters['invalidations'] += len(self._values)
+            self._values.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._values)
+        stats['metrics'] = len(self._metrics)
+        stats['ttl'] = self.ttl
+        return stats
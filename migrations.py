@@ -0,0 +1,308 @@
+"""
+Versioned schema migrations for the app's MySQL tables.
+
+Each migration is (version, name, steps); a step is a SQL string or a
+callable taking a cursor. Applied versions are recorded in schema_migrations,
+so running the module again only applies what is new:
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied / pending versions
+    python migrations.py --check    # EXPLAIN the route queries, fail on large full scans
+
+Tables are created with IF NOT EXISTS and indexes are only added when no
+existing index already starts with the same columns, so the migrations are
+safe to run against a database that was set up by hand.
+"""
+import argparse
+import sys
+
+import daily_stats
+import prediction_store
+import result_store
+
+BASE_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(100) NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        role VARCHAR(20) NOT NULL DEFAULT 'user',
+        email VARCHAR(255),
+        phone VARCHAR(50),
+        location VARCHAR(255),
+        profile_photo VARCHAR(255),
+        active TINYINT(1) NOT NULL DEFAULT 1,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_login DATETIME NULL,
+        UNIQUE KEY uq_users_username (username)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS history (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(100),
+        symptoms TEXT,
+        prediction VARCHAR(255),
+        timestamp DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS prediction_history (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(100),
+        fever TINYINT,
+        cough TINYINT,
+        fatigue TINYINT,
+        breathing TINYINT,
+        age SMALLINT,
+        gender TINYINT,
+        bp TINYINT,
+        cholesterol TINYINT,
+        top_disease_1 VARCHAR(255),
+        top_disease_2 VARCHAR(255),
+        top_disease_3 VARCHAR(255),
+        outcome VARCHAR(20),
+        predicted_at DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(100),
+        action VARCHAR(500),
+        ip_address VARCHAR(64),
+        status VARCHAR(20),
+        created_at DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS contact_messages (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(100),
+        name VARCHAR(255),
+        email VARCHAR(255),
+        message TEXT,
+        created_at DATETIME NOT NULL
+    )
+    """,
+)
+
+# (table, index name, columns, unique) - one per lookup / keyset order used in app.py
+QUERY_INDEXES = (
+    ('users', 'uq_users_username', ('username',), True),              # login, profile
+    ('users', 'idx_users_active', ('active',), False),                # active user count
+    ('history', 'idx_history_user_ts', ('username', 'timestamp', 'id'), False),       # /history
+    ('history', 'idx_history_ts', ('timestamp', 'id'), False),                        # /admin_history
+    ('prediction_history', 'idx_ph_user_ts', ('username', 'predicted_at', 'id'), False),  # /history_v2
+    ('prediction_history', 'idx_ph_ts', ('predicted_at', 'id'), False),                   # /admin_history_v2
+    ('audit_log', 'idx_audit_created', ('created_at',), False),       # /admin/system
+    ('contact_messages', 'idx_contact_created', ('created_at',), False),
+    ('users', 'idx_users_created', ('created_at',), False),           # users CSV export date filter
+)
+
+
+def existing_index_columns(cursor, table):
+    """{index name: (column, ...)} for `table` in the current database."""
+    cursor.execute("""
+        SELECT index_name, column_name
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY index_name, seq_in_index
+    """, (table,))
+    indexes = {}
+    for name, column in cursor.fetchall():
+        indexes.setdefault(name, []).append(column.lower())
+    return {name: tuple(cols) for name, cols in indexes.items()}
+
+
+def add_index(cursor, table, name, columns, unique=False):
+    """Create an index unless one with the same leading columns already exists."""
+    wanted = tuple(c.lower() for c in columns)
+    for existing in existing_index_columns(cursor, table).values():
+        if existing[:len(wanted)] == wanted:
+            return False
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    cols = ", ".join(f"`{c}`" for c in columns)
+    cursor.execute(f"CREATE {kind} {name} ON {table} ({cols})")
+    print(f"[MIGRATE] Created index {name} on {table} ({cols})")
+    return True
+
+
+def _add_query_indexes(cursor):
+    for table, name, columns, unique in QUERY_INDEXES:
+        add_index(cursor, table, name, columns, unique)
+
+
+def _create_predictions(cursor):
+    prediction_store.create_table(cursor, first_month=prediction_store.first_legacy_month(cursor))
+
+
+def _backfill_predictions(cursor):
+    prediction_store.backfill(cursor, vocab=prediction_store.load_v1_vocabulary())
+
+
+MIGRATIONS = [
+    (1, 'base tables', list(BASE_TABLES)),
+    (2, 'route query indexes', [_add_query_indexes]),
+    (3, 'daily dashboard rollups', list(daily_stats.ROLLUP_DDL)),
+    (4, 'unified predictions table', [_create_predictions, _backfill_predictions, daily_stats.rebuild_rollups]),
+    (5, 'prediction results store', [result_store.RESULTS_DDL]),
+    # adds the QUERY_INDEXES entries that came after migration 2 (existing ones are skipped)
+    (6, 'export filter indexes', [_add_query_indexes]),
+    # legacy rows written after migration 4 by workers that had not switched to predictions yet
+    (7, 'predictions catch-up', [_backfill_predictions, daily_stats.rebuild_rollups]),
+]
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor, create=True):
+    """Applied migration versions; create=False reads without creating schema_migrations."""
+    if create:
+        _ensure_version_table(cursor)
+    else:
+        cursor.execute("SELECT COUNT(*) FROM information_schema.tables "
+                       "WHERE table_schema = DATABASE() AND table_name = 'schema_migrations'")
+        if not cursor.fetchone()[0]:
+            return set()
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn, target=None):
+    """Apply pending migrations in order (up to `target`). Returns the versions applied."""
+    cursor = conn.cursor()
+    applied = []
+    try:
+        done = applied_versions(cursor)
+        for version, name, steps in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            print(f"[MIGRATE] Applying {version}: {name}")
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            # MySQL DDL commits implicitly; record the version once every step succeeded
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            applied.append(version)
+    finally:
+        cursor.close()
+    return applied
+
+
+# ---- query plan check ----
+
+# Representative route queries (parameters are placeholders; only the plan
+# matters). Unfiltered CSV exports read whole tables by design and are left out.
+ROUTE_QUERIES = (
+    ('login', "SELECT * FROM users WHERE username = %s", ('x',)),
+    ('view_history', "SELECT id, symptoms, prediction, timestamp FROM history WHERE username = %s "
+                     "ORDER BY timestamp DESC, id DESC LIMIT 51", ('x',)),
+    ('view_history next page', "SELECT id, symptoms, prediction, timestamp FROM history WHERE username = %s "
+                               "AND ((timestamp < %s) OR (timestamp = %s AND id < %s)) "
+                               "ORDER BY timestamp DESC, id DESC LIMIT 51",
+     ('x', '2030-01-01', '2030-01-01', 1)),
+    ('admin_history', "SELECT * FROM history ORDER BY timestamp DESC, id DESC LIMIT 51", ()),
+    ('history_v2', "SELECT * FROM prediction_history WHERE username = %s "
+                   "ORDER BY predicted_at DESC, id DESC LIMIT 51", ('x',)),
+    ('admin_history_v2', "SELECT * FROM prediction_history ORDER BY predicted_at DESC, id DESC LIMIT 51", ()),
+    ('profile activity', "SELECT COUNT(*), MAX(predicted_at) FROM predictions WHERE username = %s", ('x',)),
+    ('predictions range', "SELECT id, model_version, top_disease_1 FROM predictions "
+                          "WHERE predicted_at >= %s AND predicted_at < %s ORDER BY predicted_at, id LIMIT 100",
+     ('2030-01-01', '2030-02-01')),
+    ('admin_system audit', "SELECT id, username, action, ip_address, status, created_at FROM audit_log "
+                           "ORDER BY created_at DESC LIMIT 200", ()),
+    ('admin_system contacts', "SELECT id, username, name, email, message, created_at FROM contact_messages "
+                              "ORDER BY created_at DESC LIMIT 200", ()),
+    ('download_report', "SELECT kind, username, payload, expires_at FROM prediction_results "
+                        "WHERE id = %s AND expires_at > NOW()", ('x',)),
+    ('dashboard series', "SELECT day, SUM(predictions) FROM daily_prediction_counts "
+                         "WHERE day >= %s AND day < %s GROUP BY day", ('2030-01-01', '2030-01-15')),
+    ('admin_users', "SELECT id, username, role, created_at, email, phone, location, active, last_login "
+                    "FROM users ORDER BY id ASC LIMIT 21", ()),
+    ('admin_users next page', "SELECT id, username, role, created_at, email, phone, location, active, last_login "
+                              "FROM users WHERE active = %s AND (id > %s) ORDER BY id ASC LIMIT 21", (1, 1)),
+    ('admin_users count', "SELECT COUNT(*) AS total FROM users WHERE active = %s", (1,)),
+    ('export users by date', "SELECT id, username, role, email, phone, location, active, created_at, last_login "
+                             "FROM users WHERE created_at >= %s AND created_at < %s ORDER BY id ASC",
+     ('2030-01-01', '2030-02-01')),
+    ('export predictions by date', "SELECT id, username, fever, cough, fatigue, breathing, age, gender, bp, "
+                                   "cholesterol, top_disease_1, top_disease_2, top_disease_3, outcome, predicted_at "
+                                   "FROM prediction_history WHERE predicted_at >= %s AND predicted_at < %s "
+                                   "ORDER BY id ASC", ('2030-01-01', '2030-02-01')),
+    ('export predictions by user', "SELECT id, username, fever, cough, fatigue, breathing, age, gender, bp, "
+                                   "cholesterol, top_disease_1, top_disease_2, top_disease_3, outcome, predicted_at "
+                                   "FROM prediction_history WHERE username = %s ORDER BY id ASC", ('x',)),
+    ('export contacts by date', "SELECT id, username, name, email, message, created_at FROM contact_messages "
+                                "WHERE created_at >= %s AND created_at < %s ORDER BY id ASC",
+     ('2030-01-01', '2030-02-01')),
+)
+
+# MySQL rightly prefers a full scan for small (or empty) tables; only flag
+# scans whose estimated row count is at least this large
+CHECK_MIN_ROWS = 1000
+
+
+def check_query_plans(conn, queries=ROUTE_QUERIES, min_rows=CHECK_MIN_ROWS):
+    """
+    EXPLAIN every route query and return [(label, table, plan row)] for each
+    step that reads a whole table (access type ALL) of an estimated `min_rows`
+    rows or more. Empty list means all good.
+    """
+    failures = []
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for label, sql, params in queries:
+            cursor.execute("EXPLAIN " + sql, params)
+            for row in cursor.fetchall():
+                if str(row.get('type', '')).upper() == 'ALL' and int(row.get('rows') or 0) >= min_rows:
+                    failures.append((label, row.get('table'), row))
+    finally:
+        cursor.close()
+    return failures
+
+
+if __name__ == '__main__':
+    import mysql.connector
+    from db_pool import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description="Apply and verify the app's MySQL schema.")
+    parser.add_argument('--status', action='store_true', help="list applied and pending migrations")
+    parser.add_argument('--check', action='store_true', help="fail if a route query does a large full table scan")
+    parser.add_argument('--min-rows', type=int, default=CHECK_MIN_ROWS,
+                        help="--check: ignore full scans estimated below this many rows")
+    parser.add_argument('--target', type=int, help="migrate up to this version only")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        if args.status:
+            cursor = conn.cursor()
+            done = applied_versions(cursor)
+            cursor.close()
+            for version, name, _ in MIGRATIONS:
+                print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {name}")
+        elif args.check:
+            failures = check_query_plans(conn, min_rows=args.min_rows)
+            for label, table, row in failures:
+                print(f"[CHECK] {label}: full scan of {table}, ~{row.get('rows')} rows "
+                      f"(possible_keys={row.get('possible_keys')})")
+            if failures:
+                sys.exit(1)
+            print(f"[CHECK] {len(ROUTE_QUERIES)} route queries use indexes.")
+        else:
+            applied = migrate(conn, target=args.target)
+            print(f"[MIGRATE] Applied {len(applied)} migration(s)." if applied else "[MIGRATE] Schema is up to date.")
+    finally:
+        conn.close()
@@ -0,0 +1,279 @@
+"""
+Versioned, memory-mapped model artifacts.
+
+    model/<name>/<version>/manifest.json        format, classes, vocabulary, feature schema, checksums
+    model/<name>/<version>/<forest>.<array>.npy  raw FlatForest arrays (forest_engine.py)
+    model/<name>/CURRENT                         the version app.py loads
+
+save_artifact() writes a new version next to the old ones and switches CURRENT
+to it only once every file is in place. load_artifact() np.load()s the arrays
+with mmap_mode='r': start-up just maps the files, pages are read on first use,
+and every process serving the same version shares them through the page cache.
+Nothing is unpickled, so loading a model file cannot execute code.
+
+    python model_artifact.py --list
+    python model_artifact.py --verify v1
+    python model_artifact.py --promote v1 20250101000000-abcd1234   # roll CURRENT back or forward
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+from forest_engine import FlatForest
+
+ARTIFACT_FORMAT = 1
+MODEL_ROOT = 'model'
+KEEP_VERSIONS = int(os.environ.get('MODEL_KEEP_VERSIONS', 3))
+
+# string arrays of export_forest() are kept in the manifest, not as .npy files
+_MANIFEST_ARRAYS = ('feature_names', 'class_names')
+
+
+class ArtifactError(ValueError):
+    """Raised when an artifact directory is incomplete or fails its checksum."""
+
+
+class LabelDecoder:
+    """Stands in for the pickled LabelEncoder: maps encoded class labels back to names."""
+
+    def __init__(self, classes, class_names):
+        self.classes_ = np.asarray(class_names)
+        self._names = dict(zip(np.asarray(classes).tolist(), class_names))
+
+    def inverse_transform(self, labels):
+        return np.asarray([self._names[label] for label in np.asarray(labels).tolist()])
+
+
+class ModelArtifact:
+    """A loaded artifact: `forests` maps forest name -> FlatForest over mmapped arrays."""
+
+    def __init__(self, path, manifest, forests):
+        self.path = path
+        self.manifest = manifest
+        self.forests = forests
+
+    @property
+    def name(self):
+        return self.manifest['name']
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    @property
+    def metadata(self):
+        return self.manifest.get('metadata', {})
+
+    def decoder(self, forest):
+        """LabelDecoder for the class names recorded with `forest`."""
+        entry = self.manifest['forests'][forest]
+        return LabelDecoder(self.forests[forest].classes_, entry['class_names'])
+
+
+def artifact_dir(name, root=MODEL_ROOT):
+    return os.path.join(root, name)
+
+
+def current_version(name, root=MODEL_ROOT):
+    """Version named in <root>/<name>/CURRENT, or None before the first export."""
+    try:
+        with open(os.path.join(artifact_dir(name, root), 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(name, root=MODEL_ROOT):
+    base = artifact_dir(name, root)
+    if not os.path.isdir(base):
+        return []
+    return sorted(v for v in os.listdir(base)
+                  if os.path.isfile(os.path.join(base, v, 'manifest.json')))
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _combined_checksum(files, forests, metadata):
+    """One digest over the array files and the manifest fields that affect predictions."""
+    digest = hashlib.sha256()
+    for file_name in sorted(files):
+        digest.update(f"{file_name}:{files[file_name]['sha256']}\n".encode())
+    digest.update(json.dumps([forests, metadata], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _write_json(path, payload):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+
+def save_artifact(name, forests, metadata=None, root=MODEL_ROOT, keep=KEEP_VERSIONS):
+    """
+    Write `forests` ({forest name: export_forest() arrays}) as a new version of
+    artifact `name` and make it current. `metadata` (vocabulary, feature schema,
+    scores...) must be JSON-serializable. Returns the new version string.
+    """
+    base = artifact_dir(name, root)
+    os.makedirs(base, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+    staging = os.path.join(base, f'.{stamp}.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    files, forest_entries = {}, {}
+    for forest_name, arrays in forests.items():
+        entry = {'arrays': {}}
+        for key, arr in arrays.items():
+            if key in _MANIFEST_ARRAYS:
+                entry[key] = [str(v) for v in arr]
+                continue
+            arr = np.ascontiguousarray(arr)
+            file_name = f'{forest_name}.{key}.npy'
+            path = os.path.join(staging, file_name)
+            np.save(path, arr, allow_pickle=False)
+            files[file_name] = {'sha256': _file_digest(path), 'bytes': os.path.getsize(path)}
+            entry['arrays'][key] = file_name
+        forest_entries[forest_name] = entry
+
+    metadata = metadata or {}
+    checksum = _combined_checksum(files, forest_entries, metadata)
+    version = f'{stamp}-{checksum[:8]}'
+    manifest = {
+        'format': ARTIFACT_FORMAT,
+        'name': name,
+        'version': version,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'forests': forest_entries,
+        'metadata': metadata,
+        'files': files,
+        'checksum': checksum,
+    }
+    _write_json(os.path.join(staging, 'manifest.json'), manifest)
+
+    final = os.path.join(base, version)
+    if os.path.isdir(final):
+        # same content saved twice within a second; never rewrite files that may be mapped
+        shutil.rmtree(staging)
+    else:
+        os.rename(staging, final)
+    set_current(name, version, root)
+
+    if keep:
+        for old in list_versions(name, root)[:-keep]:
+            if old != version:
+                shutil.rmtree(os.path.join(base, old), ignore_errors=True)
+    return version
+
+
+def set_current(name, version, root=MODEL_ROOT):
+    """Point CURRENT at an existing version; running servers hot-reload it."""
+    base = artifact_dir(name, root)
+    if not os.path.isfile(os.path.join(base, version, 'manifest.json')):
+        raise ArtifactError(f"{base} has no version {version}")
+    # readers only ever see CURRENT point at a complete directory
+    tmp = os.path.join(base, 'CURRENT.tmp')
+    with open(tmp, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp, os.path.join(base, 'CURRENT'))
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ArtifactError(f"{path} has no manifest.json")
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        raise ArtifactError(f"{path}: unsupported artifact format {manifest.get('format')!r}")
+    return manifest
+
+
+def verify_artifact(path, manifest=None):
+    """Re-hash every array file against the manifest; raises ArtifactError on a mismatch."""
+    manifest = manifest or read_manifest(path)
+    for file_name, expected in manifest['files'].items():
+        try:
+            actual = _file_digest(os.path.join(path, file_name))
+        except FileNotFoundError:
+            raise ArtifactError(f"{path}: missing {file_name}")
+        if actual != expected['sha256']:
+            raise ArtifactError(f"{path}: checksum mismatch for {file_name}")
+    if _combined_checksum(manifest['files'], manifest['forests'], manifest.get('metadata', {})) != manifest['checksum']:
+        raise ArtifactError(f"{path}: manifest checksum mismatch")
+
+
+def load_artifact(name, version=None, root=MODEL_ROOT, verify=False):
+    """
+    Map a version (default: CURRENT) of artifact `name`. File sizes are always
+    checked; verify=True also re-hashes the files, which reads them in full.
+    """
+    version = version or current_version(name, root)
+    if version is None:
+        raise FileNotFoundError(f"No artifact exported for {name} under {root}")
+    path = os.path.join(artifact_dir(name, root), version)
+    manifest = read_manifest(path)
+    if verify:
+        verify_artifact(path, manifest)
+
+    forests = {}
+    for forest_name, entry in manifest['forests'].items():
+        arrays = {}
+        for key, file_name in entry['arrays'].items():
+            file_path = os.path.join(path, file_name)
+            if os.path.getsize(file_path) != manifest['files'][file_name]['bytes']:
+                raise ArtifactError(f"{path}: {file_name} is truncated")
+            arrays[key] = np.load(file_path, mmap_mode='r', allow_pickle=False)
+        for key in _MANIFEST_ARRAYS:
+            if key in entry:
+                arrays[key] = np.asarray(entry[key])
+        forests[forest_name] = FlatForest(arrays)
+    return ModelArtifact(path, manifest, forests)
+
+
+def load_artifact_if_present(name, root=MODEL_ROOT, verify=False):
+    try:
+        artifact = load_artifact(name, root=root, verify=verify)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[MODEL] Failed to load artifact {name}: {e}")
+        return None
+    print(f"[MODEL] Mapped artifact {name} version {artifact.version} "
+          f"({', '.join(artifact.forests)}).")
+    return artifact
+
+
+if __name__ == '__main__':
+    if '--verify' in sys.argv:
+        names = sys.argv[sys.argv.index('--verify') + 1:] or ['v1', 'v2']
+        for name in names:
+            version = current_version(name)
+            if version is None:
+                print(f"{name}: not exported")
+                continue
+            verify_artifact(os.path.join(artifact_dir(name), version))
+            print(f"{name}: {version} OK")
+    elif '--promote' in sys.argv:
+        name, version = sys.argv[sys.argv.index('--promote') + 1:][:2]
+        verify_artifact(os.path.join(artifact_dir(name), version))
+        set_current(name, version)
+        print(f"{name}: {version} is now current")
+    else:
+        for name in sorted(os.listdir(MODEL_ROOT)):
+            versions = list_versions(name)
+            if versions:
+                current = current_version(name)
+                print(name + ': ' + ', '.join(v + (' (current)' if v == current else '') for v in versions))
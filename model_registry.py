@@ -0,0 +1,216 @@
+"""
+Hot-swappable model versions.
+
+A ModelBundle is one loaded version of a model plus everything needed to score
+and label with it (encoder, vocabulary, micro-batcher, process pool). Views
+call registry.get(name) once per request and use that bundle throughout, so a
+reload never mixes two versions inside one prediction and requests already in
+flight finish on the version they started with.
+
+reload() loads the version currently on disk, runs the model's smoke check on
+it and only then swaps the reference; a model that fails to load or validate
+is logged and the old one keeps serving. watch() polls the on-disk version
+every few seconds (the CURRENT file of model_artifact.py, or the pickles'
+mtime/size) and reloads in the background when it changes. Replaced bundles
+are closed after a grace period.
+"""
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from batching import MicroBatcher
+
+
+class ModelBundle:
+    """
+    One loaded model version. `parts` (model, encoder, ...) are exposed as
+    attributes; `score(X)` scores a matrix and `batcher` micro-batches single
+    rows through `batch_fn` (default `score`), which must return one result per
+    row. `on_close` callables release per-version resources.
+    """
+
+    def __init__(self, name, version, score, parts=None, batch_fn=None, batch_options=None, on_close=()):
+        self.name = name
+        self.version = version
+        self.score = score
+        self.__dict__.update(parts or {})
+        self.loaded_at = datetime.now()
+        self.batcher = MicroBatcher(batch_fn or score, name=name, **(batch_options or {}))
+        self._on_close = list(on_close)
+
+    def close(self):
+        self.batcher.close()
+        for fn in self._on_close:
+            try:
+                fn()
+            except Exception as e:
+                print(f"[MODEL] Closing {self.name} {self.version} failed: {e}")
+
+
+def check_probabilities(probs, n_rows, n_classes):
+    """Raise ValueError unless `probs` is an (n_rows, n_classes) matrix of distributions."""
+    probs = np.asarray(probs)
+    if probs.shape != (n_rows, n_classes):
+        raise ValueError(f"expected probabilities of shape {(n_rows, n_classes)}, got {probs.shape}")
+    if not np.all(np.isfinite(probs)) or probs.min() < 0:
+        raise ValueError("probabilities are not finite and non-negative")
+    if not np.allclose(probs.sum(axis=1), 1.0, atol=1e-6):
+        raise ValueError("probabilities do not sum to 1")
+
+
+class ModelRegistry:
+    """Active ModelBundle per model name, reloaded from disk on demand or on change."""
+
+    def __init__(self, on_swap=None, retire_after=30.0):
+        self.on_swap = on_swap
+        self.retire_after = retire_after
+        self._models = {}
+        self._bundles = {}
+        self._status = {}
+        self._lock = threading.Lock()
+        self._reload_locks = {}
+        self._loaded = {}
+        self._watcher = None
+
+    def register(self, name, load, disk_version, smoke=None, load_now=True):
+        """
+        load() -> ModelBundle for the version on disk; disk_version() -> cheap
+        version string of what is on disk; smoke(bundle) raises if the bundle
+        must not serve. The first version is loaded right away unless
+        `load_now` is False (a warm-up thread then calls reload()).
+        """
+        self._models[name] = {'load': load, 'disk_version': disk_version, 'smoke': smoke}
+        self._reload_locks[name] = threading.Lock()
+        self._loaded[name] = threading.Event()
+        self._status[name] = {'reloads': 0, 'failures': 0, 'last_error': None,
+                              'last_check': None, 'failed_version': None}
+        if load_now:
+            self.reload(name, force=True)
+
+    def get(self, name, wait=None):
+        """
+        The bundle serving `name` right now, or None if no version is loaded;
+        with `wait`, blocks up to that many seconds for the first version.
+        """
+        bundle = self._bundles.get(name)
+        if bundle is None and wait and name in self._loaded:
+            self._loaded[name].wait(wait)
+            bundle = self._bundles.get(name)
+        return bundle
+
+    def __getitem__(self, name):
+        return self._bundles[name]
+
+    def names(self):
+        return list(self._models)
+
+    def reload(self, name, force=False):
+        """
+        Load, validate and swap in the on-disk version of `name`. Returns True
+        when a new bundle went live. Without `force` nothing happens if the
+        disk version is the active one or the one that last failed.
+        """
+        spec = self._models[name]
+        status = self._status[name]
+        with self._reload_locks[name]:
+            current = self._bundles.get(name)
+            try:
+                on_disk = spec['disk_version']()
+            except Exception:
+                on_disk = None
+            status['last_check'] = datetime.now()
+            if not force and on_disk is not None and (
+                    (current is not None and current.version == on_disk)
+                    or status['failed_version'] == on_disk):
+                return False
+
+            started = time.monotonic()
+            bundle = None
+            try:
+                bundle = spec['load']()
+                if spec['smoke'] is not None:
+                    spec['smoke'](bundle)
+            except Exception as e:
+                if bundle is not None:
+                    bundle.close()
+                status['failures'] += 1
+                status['last_error'] = f"{on_disk or 'unknown version'}: {e}"
+                status['failed_version'] = on_disk
+                print(f"[MODEL] Reload of {name} rejected, keeping "
+                      f"{current.version if current else 'nothing'}: {e}")
+                return False
+
+            with self._lock:
+                self._bundles[name] = bundle
+            self._loaded[name].set()
+            status['reloads'] += 1 if current is not None else 0
+            status['last_error'] = None
+            status['failed_version'] = None
+            print(f"[MODEL] {name} serving version {bundle.version} "
+                  f"(loaded and checked in {time.monotonic() - started:.2f}s).")
+            if self.on_swap is not None:
+                self.on_swap(name, bundle)
+            if current is not None and current is not bundle:
+                self._retire(current)
+            return True
+
+    def reload_async(self, names=None, force=False):
+        """reload() the given models (default: all) on a background thread."""
+        names = list(names or self._models)
+
+        def run():
+            for name in names:
+                try:
+                    self.reload(name, force=force)
+                except Exception as e:
+                    print(f"[MODEL] Reload of {name} failed: {e}")
+
+        thread = threading.Thread(target=run, name='model-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def _retire(self, bundle):
+        # requests that took the old bundle before the swap get time to finish
+        timer = threading.Timer(self.retire_after, bundle.close)
+        timer.daemon = True
+        timer.start()
+
+    def watch(self, interval):
+        """Poll every model's disk version every `interval` seconds and reload on change."""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                for name in self.names():
+                    try:
+                        self.reload(name)
+                    except Exception as e:
+                        print(f"[MODEL] Watch of {name} failed: {e}")
+
+        self._watcher = threading.Thread(target=run, name='model-watch', daemon=True)
+        self._watcher.start()
+
+    def status(self):
+        """Per model: active version, when it was loaded and the reload counters."""
+        rows = []
+        for name in self.names():
+            bundle = self._bundles.get(name)
+            status = self._status[name]
+            rows.append({
+                'name': name,
+                'version': bundle.version if bundle else None,
+                'loaded_at': bundle.loaded_at if bundle else None,
+                'last_check': status['last_check'],
+                'reloads': status['reloads'],
+                'failures': status['failures'],
+                'last_error': status['last_error'],
+            })
+        return rows
+
+    def close(self):
+        for bundle in list(self._bundles.values()):
+            bundle.close()
@@ -0,0 +1,130 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+KeysetPage = namedtuple('KeysetPage', ['rows', 'next_cursor', 'prev_cursor', 'limit'])
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Clamp a ?limit= value into 1..maximum."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def encode_cursor(values):
+    """Opaque URL-safe token for the sort-key values of a row."""
+    payload = [v.isoformat(sep=' ') if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Sort-key values from a token, or None when it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def _seek_clause(columns, op):
+    """(a, b) < (x, y) expanded to a < x OR (a = x AND b < y) so MySQL can range-scan the index."""
+    terms = []
+    for i, column in enumerate(columns):
+        equal = [f"{c} = %s" for c in columns[:i]]
+        terms.append("(" + " AND ".join(equal + [f"{column} {op} %s"]) + ")")
+    return "(" + " OR ".join(terms) + ")"
+
+
+def _seek_params(values):
+    params = []
+    for i in range(len(values)):
+        params.extend(values[:i + 1])
+    return params
+
+
+def keyset_query(select, key_columns, descending=True, where=(), params=(),
+                 after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Build the SQL for one page of `select` ordered by `key_columns` (e.g.
+    ('timestamp', 'id')), seeking past the row encoded in `after` (next page)
+    or before the row encoded in `before` (previous page) instead of using
+    OFFSET. Returns (sql, params, state); pass the fetched rows and `state`
+    to keyset_result(). One extra row is read to tell whether another page
+    exists in the direction of travel.
+    """
+    key_columns = list(key_columns)
+    after_values = decode_cursor(after, len(key_columns))
+    before_values = decode_cursor(before, len(key_columns)) if after_values is None else None
+
+    backwards = before_values is not None
+    seek_values = before_values if backwards else after_values
+    # walking backwards flips both the comparison and the scan order
+    scan_desc = descending != backwards
+
+    clauses, all_params = list(where), list(params)
+    if seek_values is not None:
+        clauses.append(_seek_clause(key_columns, '<' if scan_desc else '>'))
+        all_params.extend(_seek_params(seek_values))
+
+    sql = select
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    direction = 'DESC' if scan_desc else 'ASC'
+    sql += " ORDER BY " + ", ".join(f"{c} {direction}" for c in key_columns) + " LIMIT %s"
+    all_params.append(limit + 1)
+
+    state = {'key_columns': key_columns, 'backwards': backwards,
+             'seeking': seek_values is not None, 'limit': limit}
+    return sql, tuple(all_params), state
+
+
+def keyset_result(rows, state):
+    """Trim the fetched rows (dicts) to one page and compute its cursors."""
+    limit = state['limit']
+    key_columns = state['key_columns']
+    rows = list(rows)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if state['backwards']:
+        rows.reverse()
+
+    def cursor_of(row):
+        return encode_cursor([row[c] for c in key_columns])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if state['backwards']:
+            next_cursor = cursor_of(rows[-1])
+            prev_cursor = cursor_of(rows[0]) if has_more else None
+        else:
+            next_cursor = cursor_of(rows[-1]) if has_more else None
+            prev_cursor = cursor_of(rows[0]) if state['seeking'] else None
+    return KeysetPage(rows, next_cursor, prev_cursor, limit)
+
+
+def fetch_keyset_page(cursor, select, key_columns, descending=True, where=(), params=(),
+                      after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    keyset_query() + keyset_result() on a DB-API cursor. `cursor` must be a
+    dictionary cursor and every key column must appear in the selected row
+    under the same name.
+    """
+    sql, all_params, state = keyset_query(select, key_columns, descending, where, params,
+                                          after, before, limit)
+    cursor.execute(sql, all_params)
+    return keyset_result(cursor.fetchall(), state)
+
+
+def empty_page(limit=DEFAULT_PAGE_SIZE):
+    return KeysetPage([], None, None, limit)
@@ -0,0 +1,317 @@
+"""
+PDF reports for /download_report (v1) and /download_report_v2.
+
+ReportEngine builds what does not depend on the request once per process, on
+first use: the logo decoded into an ImageReader (instead of re-reading and
+re-embedding static/images/logo.png from disk for every PDF), the colours and
+the paragraph style. Each report kind's static layer (header bar, logo, title,
+footer) is drawn from those prepared objects into a Form XObject that the page
+places once; only the prediction content is drawn per request. reportlab
+cannot share one XObject between documents, so the layer is re-emitted per
+document, but from ready objects.
+
+Finished PDFs are cached in an LRU keyed by a SHA-256 of the report kind and
+every field printed on the page, bounded by entry count and total bytes, so a
+repeated download of the same prediction is a dictionary lookup.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph
+
+LOGO_PATH = os.path.join('static', 'images', 'logo.png')
+FOOTER_V1 = "© 2025 AI Disease Prediction System"
+FOOTER_V2 = "© 2025 AI Disease Prediction System | Report generated by AI"
+
+
+class PdfCache:
+    """LRU of rendered PDFs bounded by entry count and total bytes."""
+
+    def __init__(self, maxsize=256, max_bytes=64 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            pdf = self._entries.get(key)
+            if pdf is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return pdf
+
+    def put(self, key, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = pdf
+            self._bytes += len(pdf)
+            while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._counters['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({'size': len(self._entries), 'bytes': self._bytes})
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'maxsize': self.maxsize,
+            'max_bytes': self.max_bytes,
+            'hit_rate': round(stats['hits'] / lookups * 100, 2) if lookups else 0.0,
+        })
+        return stats
+
+
+def content_key(kind, fields):
+    """SHA-256 of everything that ends up on the page."""
+    payload = json.dumps([kind, fields], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def report_date(predicted_at=None):
+    """The date line of a report: the prediction's time when known, else now."""
+    return predicted_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ReportEngine:
+    """Renders both report kinds from per-process static resources, with a PDF cache."""
+
+    def __init__(self, logo_path=LOGO_PATH, cache=None):
+        self.width, self.height = A4
+        self.logo = ImageReader(logo_path) if os.path.exists(logo_path) else None
+        if self.logo is not None:
+            # decode now; later drawImage calls (from any thread) reuse the pixels
+            self.logo.getSize()
+            self.logo.getRGBData()
+            self.logo.getTransparent()
+        self.remedy_style = ParagraphStyle(
+            "remedyStyle",
+            parent=getSampleStyleSheet()["Normal"],
+            fontName="Helvetica",
+            fontSize=11,
+            textColor=colors.HexColor("#2c3e50"),
+            leading=14,
+        )
+        self.cache = cache if cache is not None else PdfCache()
+
+    # ---- public API ----
+
+    def render(self, kind, fields):
+        """PDF bytes for `kind` ('v1' or 'v2'), served from the cache when possible."""
+        key = content_key(kind, fields)
+        pdf = self.cache.get(key)
+        if pdf is None:
+            pdf = self.render_uncached(kind, fields)
+            self.cache.put(key, pdf)
+        return pdf
+
+    def render_uncached(self, kind, fields):
+        draw = {'v1': self._draw_v1, 'v2': self._draw_v2}[kind]
+        buffer = io.BytesIO()
+        p = canvas.Canvas(buffer, pagesize=A4)
+        draw(p, **fields)
+        p.showPage()
+        p.save()
+        return buffer.getvalue()
+
+    # ---- static layers ----
+
+    def _static_layer(self, p, name, bar_color, bar_height, logo_box, title_size, title_at, footer):
+        """Header bar, logo, title and footer as one form placed on the page."""
+        width, height = self.width, self.height
+        p.beginForm(name)
+        p.setFillColor(colors.HexColor(bar_color))
+        p.rect(0, height - bar_height, width, bar_height, fill=1, stroke=0)
+        if self.logo is not None:
+            x, y_off, size = logo_box
+            p.drawImage(self.logo, x, height - y_off, width=size, height=size, mask='auto')
+        p.setFillColor(colors.white)
+        p.setFont("Helvetica-Bold", title_size)
+        p.drawString(title_at[0], height - title_at[1], "AI Disease Prediction System")
+        p.setFont("Helvetica-Oblique", 9)
+        p.setFillColor(colors.HexColor("#7f8c8d"))
+        p.drawCentredString(width / 2, 30, footer)
+        p.endForm()
+        p.doForm(name)
+
+    # ---- v1: single disease report ----
+
+    def _draw_v1(self, p, username, date, disease, confidence, description,
+                 symptoms=(), remedies=(), red_flags=()):
+        width, height = self.width, self.height
+        self._static_layer(p, 'static_v1', "#1a5276", 90, (40, 80, 60), 22, (120, 50), FOOTER_V1)
+
+        # === PATIENT INFO BOX ===
+        y = height - 120
+        p.setFillColor(colors.HexColor("#f8f9f9"))
+        p.roundRect(40, y - 50, width - 80, 60, 10, fill=1, stroke=0)
+
+        p.setFillColor(colors.HexColor("#2c3e50"))
+        p.setFont("Helvetica", 12)
+        p.drawString(60, y - 20, f"👤 Patient: {username}")
+        p.drawString(320, y - 20, f"📅 Date: {date}")
+
+        # === DISEASE PREDICTION ===
+        y -= 90
+        p.setFillColor(colors.HexColor("#f4f6f7"))
+        p.roundRect(40, y - 70, width - 80, 80, 10, fill=1, stroke=0)
+
+        p.setFillColor(colors.HexColor("#1a5276"))
+        p.setFont("Helvetica-Bold", 14)
+        p.drawString(60, y - 20, "Predicted Disease:")
+        p.setFillColor(colors.black)
+        p.setFont("Helvetica", 12)
+        p.drawString(220, y - 20, disease)
+
+        p.setFillColor(colors.HexColor("#1a5276"))
+        p.setFont("Helvetica-Bold", 14)
+        p.drawString(60, y - 45, "Confidence:")
+        p.setFillColor(colors.black)
+        p.setFont("Helvetica", 12)
+        p.drawString(220, y - 45, f"{confidence}%")
+
+        def section(title, color, y):
+            p.setFillColor(color)
+            p.rect(40, y - 28, width - 80, 28, fill=1, stroke=0)
+            p.setFillColor(colors.white)
+            p.setFont("Helvetica-Bold", 13)
+            p.drawString(50, y - 17, title)
+            return y - 45
+
+        # === SUMMARY ===
+        y = section("📖 Summary", colors.HexColor("#2980b9"), y - 100)
+        p.setFillColor(colors.black)
+        p.setFont("Helvetica", 11)
+        text = p.beginText(50, y)
+        text.setLeading(15)
+        for line in description.split(". "):
+            text.textLine(f"● {line.strip()}")
+        p.drawText(text)
+        y = text.getY() - 20
+
+        # === SYMPTOMS / REMEDIES / RED FLAGS ===
+        lists = [
+            ("📝 Related Symptoms", "#8e44ad", symptoms),
+            ("✅ Suggested Remedies", "#27ae60", remedies),
+            ("⚠️ When to Seek Medical Care", "#c0392b", red_flags),
+        ]
+        for title, color, items in lists:
+            if not items:
+                continue
+            y = section(title, colors.HexColor(color), y)
+            p.setFont("Helvetica", 11)
+            p.setFillColor(colors.HexColor("#2c3e50"))
+            for item in items:
+                p.drawString(60, y, f"● {item.strip()}")
+                y -= 15
+            y -= 10
+
+    # ---- v2: top-3 diseases + outcome report ----
+
+    def _draw_v2(self, p, username, date, diseases, outcome, remedies=()):
+        width, height = self.width, self.height
+        self._static_layer(p, 'static_v2', "#154360", 100, (40, 90, 70), 24, (130, 55), FOOTER_V2)
+
+        # === PATIENT INFO ===
+        y = height - 140
+        p.setFillColor(colors.HexColor("#f4f6f7"))
+        p.roundRect(40, y - 70, width - 80, 60, 12, fill=1, stroke=0)
+
+        p.setFillColor(colors.HexColor("#2c3e50"))
+        p.setFont("Helvetica", 11)
+        p.drawString(60, y - 30, f"👤 Patient: {username}")
+        p.drawString(60, y - 50, f"📅 Date: {date}")
+        p.drawString(320, y - 30, "🧬 Model: Prediction V2")
+
+        # === PREDICTIONS ===
+        y -= 110
+        p.setFillColor(colors.HexColor("#2874A6"))
+        p.roundRect(40, y - 30, width - 80, 30, 8, fill=1, stroke=0)
+        p.setFillColor(colors.white)
+        p.setFont("Helvetica-Bold", 13)
+        p.drawString(50, y - 18, "Predicted Diseases & Confidence")
+
+        y -= 50
+        p.setFont("Helvetica", 11)
+        for disease, prob in diseases:
+            p.setFillColor(colors.HexColor("#2c3e50"))
+            p.drawString(60, y, f"● {disease} ({prob}%)")
+            try:
+                prob_val = float(prob)
+            except (TypeError, ValueError):
+                prob_val = 0
+            p.setFillColor(colors.HexColor("#5DADE2"))
+            p.roundRect(300, y - 6, (prob_val / 100) * 200, 8, 3, fill=1, stroke=0)
+            y -= 25
+
+        # confidence scale
+        p.setFont("Helvetica-Oblique", 9)
+        p.setFillColor(colors.HexColor("#7f8c8d"))
+        p.drawString(300, y, "0%")
+        p.drawRightString(500, y, "100%")
+
+        # === OUTCOME ===
+        y -= 60
+        negative = outcome == "Negative"
+        p.setFillColor(colors.HexColor("#27ae60") if negative else colors.HexColor("#c0392b"))
+        p.roundRect(70, y - 90, width - 140, 90, 18, fill=1, stroke=0)
+        p.setFillColor(colors.white)
+        p.setFont("Helvetica-Bold", 22)
+        p.drawCentredString(width / 2, y - 50, f"{'✅' if negative else '❌'} Final Outcome: {outcome}")
+
+        # === REMEDIES ===
+        if remedies:
+            y -= 140
+            p.setFillColor(colors.HexColor("#138D75"))
+            p.roundRect(40, y - 30, width - 80, 30, 8, fill=1, stroke=0)
+            p.setFillColor(colors.white)
+            p.setFont("Helvetica-Bold", 13)
+            p.drawString(50, y - 18, "Suggested Remedies")
+
+            y -= 40
+            for r in remedies:
+                para = Paragraph(f"✓ {r}", self.remedy_style)
+                w, h = para.wrap(width - 120, 100)
+                para.drawOn(p, 60, y - h)
+                y -= h + 12
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The process-wide ReportEngine, created on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ReportEngine(cache=PdfCache(
+                    maxsize=int(os.environ.get('PDF_CACHE_SIZE', 256)),
+                    max_bytes=int(os.environ.get('PDF_CACHE_MB', 64)) * 1024 * 1024))
+    return _engine
+
+
+def render_report(kind, fields):
+    """Cached PDF bytes of one report (module-level, so worker processes can call it)."""
+    return get_engine().render(kind, fields)
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of model outputs keyed on (model name, model version,
+    canonical encoded input).
+
+    set_version() records the version of each loaded model; when a model is
+    (re)loaded with a different version its entries are dropped, so stale
+    predictions are never served.
+    """
+
+    def __init__(self, maxsize=4096, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def set_version(self, model, version):
+        with self._lock:
+            if self._versions.get(model) == version:
+                return
+            self._versions[model] = version
+        self.invalidate(model)
+
+    def invalidate(self, model=None):
+        with self._lock:
+            if model is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [key for key in self._entries if key[0] == model]
+                for key in stale:
+                    del self._entries[key]
+                dropped = len(stale)
+            self._counters['invalidations'] += dropped
+
+    def _key(self, model, input_key, version=None):
+        return (model, version or self._versions.get(model), input_key)
+
+    def get(self, model, input_key, version=None):
+        """Return (hit, value). `version` defaults to the one set for `model`."""
+        key = self._key(model, input_key, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return True, value
+                del self._entries[key]
+                self._counters['expirations'] += 1
+            self._counters['misses'] += 1
+            return False, None
+
+    def put(self, model, input_key, value, version=None):
+        key = self._key(model, input_key, version)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def get_or_compute(self, model, input_key, compute, version=None):
+        """
+        Cached value or compute(). Pass the `version` of the model object doing
+        the computing, so a request that started before a reload never stores
+        its result under the new version.
+        """
+        hit, value = self.get(model, input_key, version)
+        if not hit:
+            value = compute()
+            self.put(model, input_key, value, version)
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+            stats['versions'] = dict(self._versions)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hit_rate': round(stats['hits'] / lookups * 100, 2) if lookups else 0.0,
+        })
+        return stats
+
+
+def file_version(*paths):
+    """Version tag of a model from its files' modification time and size."""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{st.st_mtime_ns:x}-{st.st_size:x}")
+        except OSError:
+            parts.append('missing')
+    return '/'.join(parts)
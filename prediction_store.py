@@ -0,0 +1,304 @@
+"""
+Unified prediction store.
+
+One `predictions` table holds every v1 and v2 prediction:
+
+    model_version   'v1' (symptom model) or 'v2' (profile model)
+    input_encoded   compact model input
+                    v1: packed symptom bitset in SymptomVocabulary order (17 bytes)
+                    v2: the 8 V2_FEATURES values as signed bytes
+    top_disease_1..3, outcome (v2 only), predicted_at
+
+The table is RANGE-partitioned by month on predicted_at, so per-user and
+time-range queries use one (username, predicted_at, id) index, and old months
+are dropped with DROP PARTITION instead of a DELETE scan.
+
+    python prediction_store.py --add-partitions [--months-ahead 3]
+    python prediction_store.py --drop-before 2024-01
+    python prediction_store.py --backfill
+
+The table is created and backfilled from history / prediction_history by
+migration 4 (migrations.py). The legacy tables are still written for the
+history pages and CSV exports. The app queues every prediction for both; the
+history writer drops the predictions rows while this table does not exist
+yet (HistoryWriter deferred_tables), so rows are dual-written from the moment
+migration 4 creates it. Legacy rows that still miss their predictions row
+(e.g. rows an older app version wrote to the legacy tables only) are copied by
+running the backfill again (`--backfill`, also migration 7).
+"""
+import argparse
+import pickle
+from collections import Counter
+from datetime import date, datetime
+
+import numpy as np
+
+from symptom_vocab import SymptomVocabulary
+
+V1_MODEL_PATH = 'model/disease_model.pkl'
+BACKFILL_CHUNK = 5000
+
+# Rows queued through HistoryWriter under the 'predictions' table
+COLUMNS = ('username', 'model_version', 'input_encoded', 'top_disease_1', 'top_disease_2',
+           'top_disease_3', 'outcome', 'predicted_at')
+
+V2_LEGACY_COLUMNS = ('fever', 'cough', 'fatigue', 'breathing', 'age', 'gender', 'bp', 'cholesterol')
+
+
+# ---- input encoding ----
+
+def encode_v1(input_vector):
+    """Packed bitset of a dense 0/1 symptom row."""
+    return np.packbits(np.asarray(input_vector, dtype=np.uint8)).tobytes()
+
+
+def decode_v1(blob, vocab):
+    """Symptom names of a v1 bitset."""
+    bits = np.unpackbits(np.frombuffer(blob, dtype=np.uint8), count=len(vocab))
+    return [vocab.symptoms[i] for i in np.flatnonzero(bits)]
+
+
+def encode_v2(input_vector):
+    return np.asarray(input_vector, dtype=np.int64).astype(np.int8).tobytes()
+
+
+def decode_v2(blob):
+    return np.frombuffer(blob, dtype=np.int8).astype(np.int64)
+
+
+def load_v1_vocabulary(path=V1_MODEL_PATH):
+    """Symptom vocabulary of the saved v1 model, or None when unavailable."""
+    try:
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+    except Exception as e:
+        print(f"[STORE] Could not load {path}: {e}")
+        return None
+    if isinstance(saved, tuple) and len(saved) >= 3:
+        return SymptomVocabulary(saved[2])
+    return None
+
+
+# ---- partitions ----
+
+def _month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def _next_month(d):
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def _partition_name(month):
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def _partition_sql(months):
+    parts = [f"PARTITION {_partition_name(m)} VALUES LESS THAN (TO_DAYS('{_next_month(m).isoformat()}'))"
+             for m in months]
+    parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ",\n        ".join(parts)
+
+
+def month_range(first, last):
+    months, m = [], _month_start(first)
+    while m <= _month_start(last):
+        months.append(m)
+        m = _next_month(m)
+    return months
+
+
+def create_table(cursor, first_month=None, months_ahead=3):
+    """Create the partitioned predictions table with monthly partitions from first_month."""
+    today = date.today()
+    first_month = first_month or today
+    last = today
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS predictions (
+            id BIGINT NOT NULL AUTO_INCREMENT,
+            username VARCHAR(100),
+            model_version VARCHAR(8) NOT NULL,
+            input_encoded VARBINARY(64),
+            top_disease_1 VARCHAR(255),
+            top_disease_2 VARCHAR(255),
+            top_disease_3 VARCHAR(255),
+            outcome VARCHAR(20),
+            predicted_at DATETIME NOT NULL,
+            PRIMARY KEY (id, predicted_at),
+            KEY idx_predictions_user_ts (username, predicted_at, id),
+            KEY idx_predictions_ts (predicted_at, id)
+        )
+        PARTITION BY RANGE (TO_DAYS(predicted_at)) (
+        {_partition_sql(month_range(first_month, last))}
+        )
+    """)
+
+
+def partition_months(cursor):
+    cursor.execute("""
+        SELECT partition_name FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = 'predictions' AND partition_name IS NOT NULL
+    """)
+    months = []
+    for (name,) in cursor.fetchall():
+        if name != 'pmax':
+            months.append(date(int(name[1:5]), int(name[5:7]), 1))
+    return sorted(months)
+
+
+def add_partitions(cursor, months_ahead=3):
+    """Split pmax so every month up to `months_ahead` from now has its own partition."""
+    existing = partition_months(cursor)
+    last = date.today()
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    start = _next_month(existing[-1]) if existing else _month_start(date.today())
+    missing = month_range(start, last) if start <= last else []
+    if not missing:
+        return []
+    cursor.execute(f"ALTER TABLE predictions REORGANIZE PARTITION pmax INTO (\n        {_partition_sql(missing)}\n)")
+    return [_partition_name(m) for m in missing]
+
+
+def drop_partitions_before(cursor, month):
+    """Drop every monthly partition holding only rows older than `month`."""
+    old = [_partition_name(m) for m in partition_months(cursor) if m < _month_start(month)]
+    if old:
+        cursor.execute(f"ALTER TABLE predictions DROP PARTITION {', '.join(old)}")
+    return old
+
+
+# ---- backfill from the legacy tables ----
+
+def _legacy_chunks(cursor, sql, chunk):
+    last_id = 0
+    while True:
+        cursor.execute(sql + " WHERE id > %s ORDER BY id LIMIT %s", (last_id, chunk))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _insert_rows(cursor, rows):
+    placeholders = "(" + ", ".join(["%s"] * len(COLUMNS)) + ")"
+    cursor.executemany(f"INSERT INTO predictions ({', '.join(COLUMNS)}) VALUES {placeholders}", rows)
+
+
+def _already_copied(cursor, model_version, rows, ts_index):
+    """
+    (username, top_disease_1, predicted_at) -> count of the predictions rows in
+    the time span of a legacy chunk, i.e. the rows the app wrote itself.
+    """
+    stamps = [row[ts_index] for row in rows if row[ts_index] is not None]
+    if not stamps:
+        return Counter()
+    cursor.execute("""
+        SELECT username, top_disease_1, predicted_at FROM predictions
+        WHERE model_version = %s AND predicted_at BETWEEN %s AND %s
+    """, (model_version, min(stamps), max(stamps)))
+    return Counter(tuple(row) for row in cursor.fetchall())
+
+
+def backfill(cursor, vocab=None, chunk=BACKFILL_CHUNK):
+    """
+    Copy the history (v1) and prediction_history (v2) rows that have no
+    predictions row yet.
+
+    The app writes predictions rows as soon as the table exists, so a legacy
+    row counts as copied when a predictions row with the same username, model,
+    top disease and timestamp is there. That makes the backfill safe to run
+    again as a catch-up (migration 7, `--backfill`). v1 symptoms are
+    re-encoded with `vocab` (left NULL when the v1 model is unavailable).
+    Runs on the caller's transaction; returns (v1 rows, v2 rows) copied.
+    """
+    copied_v1 = 0
+    for rows in _legacy_chunks(cursor, "SELECT id, username, symptoms, prediction, timestamp FROM history", chunk):
+        existing = _already_copied(cursor, 'v1', rows, 4)
+        batch = []
+        for _, username, symptoms, prediction, ts in rows:
+            if ts is None:
+                continue
+            if existing[(username, prediction, ts)] > 0:
+                existing[(username, prediction, ts)] -= 1
+                continue
+            encoded = None
+            if vocab is not None:
+                encoded = vocab.bitset([s for s in (symptoms or '').split(',') if s.strip()])
+            batch.append((username, 'v1', encoded, prediction, None, None, None, ts))
+        if batch:
+            _insert_rows(cursor, batch)
+            copied_v1 += len(batch)
+
+    copied_v2 = 0
+    legacy_v2 = ("SELECT id, username, " + ", ".join(V2_LEGACY_COLUMNS)
+                 + ", top_disease_1, top_disease_2, top_disease_3, outcome, predicted_at FROM prediction_history")
+    for rows in _legacy_chunks(cursor, legacy_v2, chunk):
+        existing = _already_copied(cursor, 'v2', rows, 14)
+        batch = []
+        for row in rows:
+            username, features = row[1], row[2:10]
+            top1, top2, top3, outcome, ts = row[10:15]
+            if ts is None:
+                continue
+            if existing[(username, top1, ts)] > 0:
+                existing[(username, top1, ts)] -= 1
+                continue
+            encoded = encode_v2([v or 0 for v in features])
+            batch.append((username, 'v2', encoded, top1, top2, top3, outcome, ts))
+        if batch:
+            _insert_rows(cursor, batch)
+            copied_v2 += len(batch)
+
+    print(f"[STORE] Backfilled {copied_v1} v1 and {copied_v2} v2 predictions.")
+    return copied_v1, copied_v2
+
+
+def first_legacy_month(cursor):
+    """Month of the oldest legacy prediction (partitions start there)."""
+    cursor.execute("""
+        SELECT LEAST(
+            COALESCE((SELECT MIN(timestamp) FROM history), NOW()),
+            COALESCE((SELECT MIN(predicted_at) FROM prediction_history), NOW())
+        )
+    """)
+    (first,) = cursor.fetchone()
+    if isinstance(first, str):
+        first = datetime.strptime(first[:10], '%Y-%m-%d')
+    return _month_start(first.date() if isinstance(first, datetime) else first)
+
+
+if __name__ == '__main__':
+    import mysql.connector
+    from db_pool import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description="Maintain the partitioned predictions table.")
+    parser.add_argument('--add-partitions', action='store_true', help="create upcoming monthly partitions")
+    parser.add_argument('--months-ahead', type=int, default=3)
+    parser.add_argument('--drop-before', metavar='YYYY-MM', help="drop partitions older than this month")
+    parser.add_argument('--backfill', action='store_true',
+                        help="copy legacy rows missing from predictions and rebuild the rollups")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    try:
+        if args.add_partitions:
+            added = add_partitions(cursor, args.months_ahead)
+            print(f"[STORE] Added partitions: {', '.join(added) or 'none'}")
+        if args.drop_before:
+            dropped = drop_partitions_before(cursor, datetime.strptime(args.drop_before, '%Y-%m').date())
+            print(f"[STORE] Dropped partitions: {', '.join(dropped) or 'none'}")
+        if args.backfill:
+            import daily_stats
+            backfill(cursor, vocab=load_v1_vocabulary())
+            daily_stats.rebuild_rollups(cursor)
+            conn.commit()
+        if not (args.add_partitions or args.drop_before or args.backfill):
+            parser.print_help()
+    finally:
+        cursor.close()
+        conn.close()
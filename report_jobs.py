@@ -0,0 +1,251 @@
+"""
+Bulk PDF report jobs, run off the request path.
+
+An admin submits a job (which history tables, date range, user); the request
+only writes the job's status file and returns. A job thread then
+
+1. reads the matching `history` / `prediction_history` rows (at most
+   `max_rows`, so a job cannot fill the disk) and releases the DB connection,
+2. renders one PDF per row in a pool of worker processes, so rendering uses
+   every core and never holds a web worker or this process's GIL; each worker
+   writes its PDF straight into the job directory,
+3. zips the PDFs into `<root>/<job id>/reports.zip` and removes the loose files.
+
+The local filesystem is the artifact store:
+
+    <root>/<job id>/job.json      state, progress, error (rewritten atomically)
+    <root>/<job id>/reports.zip   the finished archive
+
+status() reads job.json, so any worker process of this host can answer a
+status or download request for a job another process runs. Jobs older than
+`keep_seconds` are deleted when new jobs are submitted.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import get_context
+
+JOB_ROOT = 'report_jobs'
+ARCHIVE_NAME = 'reports.zip'
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# kind: 'v1' / 'v2' (pdf_reports); sql/params: the rows to report on (dict cursor);
+# fields(row) -> pdf_reports fields; filename(row) -> path inside the zip
+ReportSource = namedtuple('ReportSource', 'kind sql params fields filename')
+
+
+class JobError(RuntimeError):
+    """A job that cannot run (no database, too many rows)."""
+
+
+def _render_file(kind, fields, path):
+    """Runs in a worker process: render one report and write it to `path`."""
+    from pdf_reports import get_engine  # reportlab is only imported by the workers
+    pdf = get_engine().render_uncached(kind, fields)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(pdf)
+    os.replace(tmp, path)
+    return len(pdf)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ReportJobs:
+    """
+    `connection` is a context manager factory yielding a DB-API connection, or
+    None when the database is unreachable (app.db_connection). At most
+    `concurrent_jobs` jobs run at once; the others wait in order.
+    """
+
+    def __init__(self, connection, root=JOB_ROOT, workers=None, concurrent_jobs=1,
+                 max_rows=2000, keep_seconds=24 * 3600, executor_factory=None):
+        self.connection = connection
+        self.root = root
+        self.workers = workers or os.cpu_count() or 1
+        self.max_rows = max_rows
+        self.keep_seconds = keep_seconds
+        self._executor_factory = executor_factory or (
+            lambda workers: ProcessPoolExecutor(workers, mp_context=get_context('spawn')))
+        self._runner = ThreadPoolExecutor(concurrent_jobs, thread_name_prefix='report-job')
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._closed = False
+
+    # ---- paths / status files ----
+
+    def _job_dir(self, job_id):
+        if not _JOB_ID.match(job_id or ''):
+            raise KeyError(job_id)
+        return os.path.join(self.root, job_id)
+
+    def _write_status(self, job_id, status):
+        path = os.path.join(self._job_dir(job_id), 'job.json')
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(status, f, indent=2, default=str)
+        os.replace(tmp, path)
+
+    def status(self, job_id):
+        """The job's status dict, or None for an unknown (or expired) job."""
+        try:
+            with open(os.path.join(self._job_dir(job_id), 'job.json')) as f:
+                status = json.load(f)
+        except (KeyError, FileNotFoundError, ValueError):
+            return None
+        if status['state'] in ('queued', 'running') and not _pid_alive(status['pid']):
+            status.update(state='failed', error='the process running this job exited')
+        return status
+
+    def archive_path(self, job_id):
+        """Path of the finished zip, or None while the job is not done."""
+        status = self.status(job_id)
+        if status is None or status['state'] != 'done':
+            return None
+        return os.path.join(self._job_dir(job_id), ARCHIVE_NAME)
+
+    def list_jobs(self, limit=20):
+        """Most recent jobs first."""
+        if not os.path.isdir(self.root):
+            return []
+        jobs = [self.status(job_id) for job_id in os.listdir(self.root) if _JOB_ID.match(job_id)]
+        jobs = [job for job in jobs if job is not None]
+        jobs.sort(key=lambda job: job['created_at'], reverse=True)
+        return jobs[:limit]
+
+    # ---- submitting ----
+
+    def submit(self, sources, requested_by=None, description=''):
+        """Queue a job over `sources` (ReportSource list); returns the job id."""
+        if self._closed:
+            raise RuntimeError("ReportJobs is closed")
+        self.prune()
+        job_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self._job_dir(job_id), 'pdfs'))
+        status = {
+            'id': job_id,
+            'state': 'queued',
+            'description': description,
+            'requested_by': requested_by,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'total': None,
+            'rendered': 0,
+            'bytes': None,
+            'error': None,
+            'pid': os.getpid(),
+        }
+        self._write_status(job_id, status)
+        self._runner.submit(self._run, job_id, status, list(sources))
+        return job_id
+
+    def prune(self):
+        """Delete jobs that finished more than keep_seconds ago."""
+        if not os.path.isdir(self.root):
+            return
+        cutoff = time.time() - self.keep_seconds
+        for job_id in os.listdir(self.root):
+            status = self.status(job_id) if _JOB_ID.match(job_id) else None
+            if status and status['state'] in ('done', 'failed') and \
+                    (status['finished_at'] or status['created_at']) < cutoff:
+                shutil.rmtree(os.path.join(self.root, job_id), ignore_errors=True)
+
+    # ---- running ----
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = self._executor_factory(self.workers)
+            return self._pool
+
+    def _fetch(self, sources):
+        """[(kind, fields, filename)] for every source row; the connection is released before rendering."""
+        tasks = []
+        with self.connection() as conn:
+            if not conn:
+                raise JobError("database unavailable")
+            cursor = conn.cursor(dictionary=True)
+            try:
+                for source in sources:
+                    # one row past the limit tells an over-limit job apart from a full one
+                    cursor.execute(f"{source.sql} LIMIT {self.max_rows + 1 - len(tasks)}",
+                                   tuple(source.params))
+                    for row in cursor.fetchall():
+                        tasks.append((source.kind, source.fields(row), source.filename(row)))
+                    if len(tasks) > self.max_rows:
+                        raise JobError(f"more than {self.max_rows} reports match; narrow the filters")
+            finally:
+                cursor.close()
+        return tasks
+
+    def _run(self, job_id, status, sources):
+        job_dir = self._job_dir(job_id)
+        pdf_dir = os.path.join(job_dir, 'pdfs')
+        status.update(state='running', started_at=time.time())
+        self._write_status(job_id, status)
+        try:
+            tasks = self._fetch(sources)
+            status['total'] = len(tasks)
+            self._write_status(job_id, status)
+
+            # bounded number of renders in flight: the queue of fields stays here
+            pool, pending, names = self._get_pool(), set(), {}
+            last_write = time.monotonic()
+            for index, (kind, fields, filename) in enumerate(tasks):
+                path = os.path.join(pdf_dir, f'{index:06d}.pdf')
+                names[path] = filename
+                pending.add(pool.submit(_render_file, kind, fields, path))
+                if len(pending) >= self.workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                    status['rendered'] += len(done)
+                    if time.monotonic() - last_write > 1.0:
+                        self._write_status(job_id, status)
+                        last_write = time.monotonic()
+            for future in pending:
+                future.result()
+            status['rendered'] = len(tasks)
+            self._write_status(job_id, status)
+
+            # PDF streams are already compressed; store them as they are
+            archive = os.path.join(job_dir, ARCHIVE_NAME)
+            with zipfile.ZipFile(archive + '.tmp', 'w', zipfile.ZIP_STORED) as zf:
+                for path, filename in names.items():
+                    zf.write(path, filename)
+            os.replace(archive + '.tmp', archive)
+            status.update(state='done', bytes=os.path.getsize(archive))
+            print(f"[REPORTS] Job {job_id}: {len(tasks)} reports, {status['bytes']} bytes.")
+        except Exception as e:
+            status.update(state='failed', error=str(e))
+            print(f"[REPORTS] Job {job_id} failed: {e}")
+        finally:
+            shutil.rmtree(pdf_dir, ignore_errors=True)
+            status['finished_at'] = time.time()
+            self._write_status(job_id, status)
+
+    def close(self):
+        """Stop taking jobs, cancel queued ones and stop the worker processes."""
+        self._closed = True
+        self._runner.shutdown(wait=False, cancel_futures=True)
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
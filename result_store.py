@@ -0,0 +1,161 @@
+"""
+Short-lived server-side store of prediction results, keyed by a compact ID.
+
+The result pages link to /download_report/<id> instead of carrying the whole
+report (description, symptoms, remedies...) in the query string. put() keeps
+the structured result in an in-memory LRU for `ttl` seconds and returns a
+random URL-safe ID (12 characters, 72 bits, so IDs cannot be guessed).
+
+With RESULT_STORE_DB=1 every result is also written, through the history
+writer, to the `prediction_results` table (migration 5), so a report can be
+downloaded from any worker process and after a restart until it expires:
+
+    python result_store.py --purge      # delete expired rows
+"""
+import argparse
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+RESULTS_DDL = """
+    CREATE TABLE IF NOT EXISTS prediction_results (
+        id VARCHAR(16) NOT NULL PRIMARY KEY,
+        username VARCHAR(100),
+        kind VARCHAR(8) NOT NULL,
+        payload TEXT NOT NULL,
+        created_at DATETIME NOT NULL,
+        expires_at DATETIME NOT NULL,
+        KEY idx_results_expires (expires_at)
+    )
+"""
+
+
+def new_result_id():
+    return secrets.token_urlsafe(9)
+
+
+class ResultStore:
+    """
+    LRU + TTL map of result ID -> {'kind', 'username', 'fields'}.
+
+    `connection` (a context manager factory like app.db_connection) and
+    `enqueue` (HistoryWriter.enqueue) turn on the database copy; without them
+    the store is per-process memory only.
+    """
+
+    def __init__(self, maxsize=10000, ttl=24 * 3600, connection=None, enqueue=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.connection = connection
+        self.enqueue = enqueue
+        self._entries = OrderedDict()  # id -> (expires_at, result)
+        self._lock = threading.Lock()
+        self._counters = {'stored': 0, 'hits': 0, 'db_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _remember(self, result_id, expires_at, result):
+        with self._lock:
+            self._entries[result_id] = (expires_at, result)
+            self._entries.move_to_end(result_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def put(self, kind, fields, username=None):
+        """Store one result (`fields` as pdf_reports renders them); returns its ID."""
+        result_id = new_result_id()
+        result = {'kind': kind, 'username': username, 'fields': fields}
+        self._remember(result_id, time.time() + self.ttl, result)
+        with self._lock:
+            self._counters['stored'] += 1
+        if self.enqueue is not None:
+            now = datetime.now()
+            self.enqueue('prediction_results', {
+                'id': result_id,
+                'username': username,
+                'kind': kind,
+                'payload': json.dumps(fields, default=str),
+                'created_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+                'expires_at': (now + timedelta(seconds=self.ttl)).strftime('%Y-%m-%d %H:%M:%S'),
+            })
+        return result_id
+
+    def get(self, result_id):
+        """The stored result, or None when unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at >= time.time():
+                    self._entries.move_to_end(result_id)
+                    self._counters['hits'] += 1
+                    return result
+                del self._entries[result_id]
+        result = self._load(result_id)
+        with self._lock:
+            self._counters['db_hits' if result is not None else 'misses'] += 1
+        return result
+
+    def _load(self, result_id):
+        if self.connection is None:
+            return None
+        with self.connection() as conn:
+            if not conn:
+                return None
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT kind, username, payload, expires_at FROM prediction_results "
+                    "WHERE id = %s AND expires_at > NOW()", (result_id,))
+                row = cursor.fetchone()
+            except Exception as e:
+                print(f"[RESULTS] Lookup failed: {e}")
+                return None
+            finally:
+                cursor.close()
+        if row is None:
+            return None
+        kind, username, payload, expires_at = row
+        result = {'kind': kind, 'username': username, 'fields': json.loads(payload)}
+        self._remember(result_id, min(expires_at.timestamp(), time.time() + self.ttl), result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        stats.update({'maxsize': self.maxsize, 'ttl': self.ttl, 'db': self.connection is not None})
+        return stats
+
+
+def purge_expired(cursor, chunk=5000):
+    """Delete expired rows in chunks; returns the number deleted."""
+    deleted = 0
+    while True:
+        cursor.execute("DELETE FROM prediction_results WHERE expires_at <= NOW() LIMIT %s", (chunk,))
+        deleted += cursor.rowcount
+        if cursor.rowcount < chunk:
+            return deleted
+
+
+if __name__ == '__main__':
+    import mysql.connector
+    from db_pool import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description="Maintain the prediction_results table.")
+    parser.add_argument('--purge', action='store_true', help="delete expired results")
+    args = parser.parse_args()
+    if not args.purge:
+        parser.print_help()
+    else:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        try:
+            deleted = purge_expired(cursor)
+            conn.commit()
+            print(f"[RESULTS] Deleted {deleted} expired results.")
+        finally:
+            cursor.close()
+            conn.close()
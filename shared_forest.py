@@ -0,0 +1,273 @@
+"""
+Flat forests in one read-only shared-memory segment, scored in worker processes.
+
+publish() copies the arrays of several FlatForests (forest_engine.py) into a
+single multiprocessing.shared_memory block:
+
+    [8-byte header length][JSON layout][64-byte aligned arrays ...]
+
+attach() maps the same block in another process and rebuilds the forests as
+zero-copy, read-only NumPy views, so N processes hold one copy of the nodes.
+The header length is written last, so a process attaching while the block is
+still being filled waits instead of reading half-written arrays.
+
+open_shared() publishes under a name derived from the model files' version or
+attaches when another process (e.g. a sibling gunicorn worker) already did.
+
+ForestProcessPool scores in a spawn-started process pool whose workers attach
+to the segment on start-up, so CPU-bound scoring runs outside the web
+process's GIL; it is bounded like InferencePool and rejects work when full.
+All workers are started and attached before the pool is returned: the owner
+unlinks the segment name when it retires the version or exits, and a worker
+spawned later could no longer attach (an attached mapping outlives the name).
+If the pool still breaks (a worker died), it is rebuilt once; when that fails
+too, e.g. because the segment is gone, the pool scores in-process on the
+caller's own views for the rest of its life.
+Spawned workers re-import the main module, so run process mode under
+gunicorn/uvicorn rather than `python app.py`.
+"""
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, resource_tracker, shared_memory
+
+import numpy as np
+
+from forest_engine import FlatForest
+from inference_pool import InferencePool
+
+_ALIGN = 64
+_HEADER = struct.Struct('<Q')
+
+
+def segment_name(version):
+    """Segment name for a given model version string (short: macOS limits it to 31 chars)."""
+    return 'adp_forests_' + hashlib.sha1(version.encode()).hexdigest()[:16]
+
+
+def _layout(forests):
+    layout, offset = {}, 0
+    for model, forest in forests.items():
+        entries = {}
+        for key, arr in forest.arrays().items():
+            arr = np.ascontiguousarray(arr)
+            offset = -(-offset // _ALIGN) * _ALIGN
+            entries[key] = {'offset': offset, 'dtype': arr.dtype.str, 'shape': list(arr.shape)}
+            offset += arr.nbytes
+        layout[model] = entries
+    return layout, offset
+
+
+class SharedForests:
+    """Handle on a mapped segment; `forests` maps model name -> FlatForest view."""
+
+    def __init__(self, shm, forests, owner):
+        self.shm = shm
+        self.forests = forests
+        self.owner = owner
+        self.closed = False
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        """Unmap; the creating process also removes the segment name. Idempotent."""
+        if self.closed:
+            return
+        self.closed = True
+        self.forests = {}
+        try:
+            self.shm.close()
+        except BufferError:
+            # views are still referenced (module globals); the mapping goes away
+            # with the process, so skip the retry SharedMemory.__del__ would make
+            self.shm.close = lambda: None
+        if self.owner:
+            # re-register so unlink()'s own unregister pairs up (see _untrack)
+            resource_tracker.register(self.shm._name, 'shared_memory')
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+
+
+def _untrack(shm):
+    # Python < 3.13 tracks attached segments too and unlinks them when the
+    # tracking process exits, which would pull the segment from under sibling
+    # workers. The owner unlinks explicitly in SharedForests.close() instead.
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+def _views(buf, layout, data_start):
+    forests = {}
+    for model, entries in layout.items():
+        arrays = {}
+        for key, entry in entries.items():
+            dtype = np.dtype(entry['dtype'])
+            count = int(np.prod(entry['shape'])) if entry['shape'] else 1
+            arr = np.frombuffer(buf, dtype=dtype, count=count,
+                                offset=data_start + entry['offset']).reshape(entry['shape'])
+            arr.flags.writeable = False
+            arrays[key] = arr
+        forests[model] = FlatForest(arrays)
+    return forests
+
+
+def publish(forests, name=None):
+    """Create a segment holding `forests` ({model name: FlatForest})."""
+    layout, data_size = _layout(forests)
+    header = json.dumps(layout).encode()
+    data_start = -(-(_HEADER.size + len(header)) // _ALIGN) * _ALIGN
+    shm = shared_memory.SharedMemory(name=name, create=True, size=data_start + data_size)
+    _untrack(shm)
+    buf = shm.buf
+    buf[_HEADER.size:_HEADER.size + len(header)] = header
+    for model, forest in forests.items():
+        for key, arr in forest.arrays().items():
+            arr = np.ascontiguousarray(arr)
+            start = data_start + layout[model][key]['offset']
+            buf[start:start + arr.nbytes] = arr.tobytes()
+    _HEADER.pack_into(buf, 0, len(header))  # marks the segment ready
+    return SharedForests(shm, _views(buf, layout, data_start), owner=True)
+
+
+def attach(name, wait=10.0):
+    """Map an existing segment read-only and rebuild its forests as views."""
+    shm = shared_memory.SharedMemory(name=name)
+    _untrack(shm)
+    deadline = time.monotonic() + wait
+    while True:
+        (header_len,) = _HEADER.unpack_from(shm.buf, 0)
+        if header_len:
+            break
+        if time.monotonic() > deadline:
+            shm.close()
+            raise TimeoutError(f"Shared forest segment {name} was never completed")
+        time.sleep(0.01)
+    layout = json.loads(bytes(shm.buf[_HEADER.size:_HEADER.size + header_len]))
+    data_start = -(-(_HEADER.size + header_len) // _ALIGN) * _ALIGN
+    return SharedForests(shm, _views(shm.buf, layout, data_start), owner=False)
+
+
+def open_shared(forests, version):
+    """Publish `forests` for this model version, or attach if another process already has."""
+    name = segment_name(version)
+    try:
+        shared = publish(forests, name)
+        print(f"[MODEL] Published flat forests to shared memory {name} ({shared.shm.size} bytes).")
+    except FileExistsError:
+        shared = attach(name)
+        print(f"[MODEL] Attached to shared flat forests {name}.")
+    return shared
+
+
+# ---- worker processes ----
+
+_worker_handle = None
+_worker_forests = {}
+
+
+def _init_worker(name):
+    global _worker_forests, _worker_handle
+    _worker_handle = attach(name)
+    _worker_forests = _worker_handle.forests
+
+
+def _predict_proba(model, X, forests=None):
+    return (forests or _worker_forests)[model].predict_proba(X)
+
+
+def _predict(model, X, forests=None):
+    return (forests or _worker_forests)[model].predict(X)
+
+
+def _proba_and_predict(proba_model, predict_model, X, forests=None):
+    """Two forests over the same rows in one round trip (v2 disease + outcome)."""
+    forests = forests or _worker_forests
+    return forests[proba_model].predict_proba(X), forests[predict_model].predict(X)
+
+
+class ForestProcessPool(InferencePool):
+    """
+    Bounded process pool scoring the forests of a shared segment. `forests`
+    (this process's views of the segment) are scored in-process once the
+    pool is broken beyond repair; without them the error is raised.
+    """
+
+    def __init__(self, segment, forests=None, max_workers=None, max_pending=32, start_timeout=60.0):
+        self.segment = segment
+        self.forests = forests
+        self.start_timeout = start_timeout
+        self.in_process = False
+        self._rebuild_lock = threading.Lock()
+
+        def factory(workers):
+            return ProcessPoolExecutor(workers, mp_context=get_context('spawn'),
+                                       initializer=_init_worker, initargs=(segment,))
+
+        self._factory = factory
+        super().__init__(max_workers=max_workers, max_pending=max_pending,
+                         name='forest', executor_factory=factory)
+        try:
+            self._start_workers(self._executor)
+        except BaseException:
+            self.shutdown()
+            raise
+
+    def _start_workers(self, executor):
+        # with spawn, ProcessPoolExecutor starts a worker per submit while none
+        # is idle: max_workers back-to-back calls start (and attach) all of them
+        futures = [executor.submit(os.getpid) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result(timeout=self.start_timeout)
+
+    def _recover(self, broken):
+        """Replace the broken executor, or switch to in-process scoring."""
+        with self._rebuild_lock:
+            if self.in_process or self._executor is not broken:
+                return  # another thread already recovered
+            broken.shutdown(wait=False, cancel_futures=True)
+            executor = None
+            try:
+                executor = self._factory(self.max_workers)
+                self._start_workers(executor)
+            except Exception as e:
+                if executor is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                if self.forests is None:
+                    raise
+                print(f"[MODEL] Forest pool {self.segment} cannot be rebuilt, scoring in-process: {e}")
+                self.in_process = True
+                return
+            self._executor = executor
+            print(f"[MODEL] Forest pool {self.segment} was broken and has been rebuilt.")
+
+    def _score(self, fn, *args):
+        if not self.in_process:
+            executor = self._executor
+            try:
+                return self.call(fn, *args)
+            except BrokenProcessPool as e:
+                print(f"[MODEL] Forest pool {self.segment} is broken: {e}")
+                self._recover(executor)
+            if not self.in_process:
+                return self.call(fn, *args)
+        return fn(*args, forests=self.forests)
+
+    def predict_proba(self, model, X):
+        return self._score(_predict_proba, model, np.asarray(X))
+
+    def predict(self, model, X):
+        return self._score(_predict, model, np.asarray(X))
+
+    def proba_and_predict(self, proba_model, predict_model, X):
+        return self._score(_proba_and_predict, proba_model, predict_model, np.asarray(X))
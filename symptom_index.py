@@ -0,0 +1,109 @@
+import os
+import pickle
+import threading
+import time
+
+DATASET_PATH = os.path.join('dataset', 'dataset.csv')
+INDEX_PATH = os.path.join('model', 'disease_symptoms.pkl')
+
+
+def _dataset_signature(dataset_path):
+    st = os.stat(dataset_path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def build_disease_symptom_index(df):
+    """
+    Build {disease: sorted tuple of symptoms} from the wide Symptom_1..Symptom_17 layout.
+    Symptoms are stripped and blank / 'none' placeholders are dropped.
+    """
+    symptom_cols = [col for col in df.columns if col.startswith('Symptom_')]
+    long_df = df.melt(id_vars=['Disease'], value_vars=symptom_cols, value_name='symptom')
+    long_df = long_df.dropna(subset=['symptom'])
+    long_df['symptom'] = long_df['symptom'].astype(str).str.strip()
+    long_df = long_df[(long_df['symptom'] != '') & (long_df['symptom'].str.lower() != 'none')]
+
+    return {
+        disease: tuple(sorted(set(symptoms)))
+        for disease, symptoms in long_df.groupby('Disease')['symptom']
+    }
+
+
+def save_disease_symptom_index(index, dataset_path=DATASET_PATH, index_path=INDEX_PATH):
+    """Persist the index together with the signature of the dataset it was built from."""
+    with open(index_path, 'wb') as f:
+        pickle.dump({'signature': _dataset_signature(dataset_path), 'index': index}, f)
+
+
+class DiseaseSymptomIndex:
+    """
+    In-memory disease -> related symptoms lookup for /predict.
+
+    Loaded from the persisted index written by train_model.py when it matches the
+    current dataset, otherwise rebuilt from the CSV. The dataset file is re-checked
+    at most every `check_interval` seconds and the index rebuilt if it changed.
+    With load=False the first reload() is left to the caller (start-up warm-up).
+    """
+
+    def __init__(self, dataset_path=DATASET_PATH, index_path=INDEX_PATH, check_interval=5.0, load=True):
+        self.dataset_path = dataset_path
+        self.index_path = index_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._index = {}
+        self._signature = None
+        self._last_check = 0.0
+        if load:
+            self.reload()
+
+    def _load_persisted(self, signature):
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if not isinstance(data, dict) or data.get('signature') != signature:
+            return None
+        return data.get('index')
+
+    def reload(self):
+        try:
+            signature = _dataset_signature(self.dataset_path)
+        except OSError as e:
+            print(f"[INDEX] Dataset not available: {e}")
+            return
+
+        index = self._load_persisted(signature)
+        if index is None:
+            import pandas as pd  # only when the persisted index is stale
+            index = build_disease_symptom_index(pd.read_csv(self.dataset_path))
+            try:
+                save_disease_symptom_index(index, self.dataset_path, self.index_path)
+            except OSError as e:
+                print(f"[INDEX] Could not persist disease symptom index: {e}")
+            print(f"[INDEX] Rebuilt disease symptom index ({len(index)} diseases).")
+
+        with self._lock:
+            self._index = index
+            self._signature = signature
+            self._last_check = time.monotonic()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            signature = _dataset_signature(self.dataset_path)
+        except OSError:
+            return
+        if signature != self._signature:
+            self.reload()
+
+    def get(self, disease):
+        self._maybe_reload()
+        return self._index.get(disease, ())
+
+    def diseases(self):
+        self._maybe_reload()
+        return sorted(self._index)
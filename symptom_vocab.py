@@ -0,0 +1,96 @@
+import numpy as np
+
+NONE_SYMPTOM = 'none'
+
+
+class SymptomVocabulary:
+    """
+    Ordered symptom vocabulary of the v1 model with a name -> column index map.
+
+    Names are kept exactly as in the dataset (including its leading spaces, e.g.
+    ' skin_rash') because they are the model's column names; lookups also accept
+    the stripped form.
+
+    Request time: encode()/indices()/bitset() cost O(k) in the number of selected
+    symptoms. Training time: encode_matrix() one-hot encodes the whole
+    Symptom_1..Symptom_17 block by indexing, linear in the number of cells.
+    """
+
+    def __init__(self, symptoms):
+        self.symptoms = list(symptoms)
+        self.index = {name: i for i, name in enumerate(self.symptoms)}
+        self._stripped = {name.strip(): i for i, name in enumerate(self.symptoms)}
+
+    @classmethod
+    def from_values(cls, values):
+        """Build the sorted vocabulary from a 2-D array of symptom cells."""
+        uniq = set(np.unique(np.asarray(values, dtype=object).astype(str)))
+        uniq.discard(NONE_SYMPTOM)
+        uniq.discard('nan')
+        return cls(sorted(uniq))
+
+    def __len__(self):
+        return len(self.symptoms)
+
+    def lookup(self, name):
+        idx = self.index.get(name)
+        if idx is None:
+            idx = self._stripped.get(str(name).strip())
+        return idx
+
+    def indices(self, names, strict=False):
+        """Sorted column ids of the given symptom names (the sparse form of a row)."""
+        cols = set()
+        for name in names:
+            idx = self.lookup(name)
+            if idx is None:
+                if strict:
+                    raise ValueError(f"Unknown symptom: {name!r}")
+                continue
+            cols.add(idx)
+        return np.fromiter(sorted(cols), dtype=np.int64, count=len(cols))
+
+    def encode(self, names, strict=False):
+        """Dense 0/1 row aligned with the vocabulary."""
+        row = np.zeros(len(self.symptoms), dtype=np.uint8)
+        row[self.indices(names, strict)] = 1
+        return row
+
+    def bitset(self, names, strict=False):
+        """Packed bitset of a row (len(vocab) / 8 bytes), hashable for use as a key."""
+        return np.packbits(self.encode(names, strict)).tobytes()
+
+    def from_bitsets(self, bitsets):
+        packed = np.frombuffer(b''.join(bitsets), dtype=np.uint8).reshape(len(bitsets), -1)
+        return np.unpackbits(packed, axis=1, count=len(self.symptoms))
+
+    def encode_batch(self, rows, strict=False):
+        """Dense matrix for a list of symptom-name lists, filled by one scatter."""
+        row_ids, col_ids = [], []
+        for r, names in enumerate(rows):
+            try:
+                cols = self.indices(names, strict)
+            except ValueError as e:
+                raise ValueError(f"Row {r}: {e}")
+            row_ids.append(np.full(len(cols), r, dtype=np.int64))
+            col_ids.append(cols)
+        X = np.zeros((len(rows), len(self.symptoms)), dtype=np.uint8)
+        if row_ids:
+            X[np.concatenate(row_ids), np.concatenate(col_ids)] = 1
+        return X
+
+    def encode_matrix(self, values):
+        """
+        One-hot encode a 2-D array of symptom cells (one row per record).
+        Unknown, 'none' and missing cells are ignored.
+        """
+        values = np.asarray(values, dtype=object).astype(str)
+        uniq, inverse = np.unique(values, return_inverse=True)
+        col_of_uniq = np.array([self.index.get(v, -1) for v in uniq], dtype=np.int64)
+        cols = col_of_uniq[inverse.reshape(values.shape)]
+
+        rows = np.broadcast_to(np.arange(values.shape[0])[:, None], values.shape)
+        present = cols >= 0
+        X = np.zeros((values.shape[0], len(self.symptoms)), dtype=np.uint8)
+        X[rows[present], cols[present]] = 1
+        return X
@@ -0,0 +1,77 @@
+"""
+FlatForest (forest_engine.py) against sklearn on small forests fitted here,
+so the parity checks run without the trained models or exported artifacts.
+test_forest_parity.py additionally checks the shipped models when present.
+
+    python -m pytest -q tests
+"""
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from forest_engine import FlatForest, export_forest, load_forest_if_present, save_forest
+from model_artifact import load_artifact, save_artifact
+
+N_FEATURES = 12
+
+
+def _symptom_rows(rng, n):
+    """0/1 rows like the v1 symptom vectors."""
+    return (rng.random((n, N_FEATURES)) < 0.3).astype(np.float32)
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    rng = np.random.default_rng(0)
+    X = _symptom_rows(rng, 400)
+    # three classes driven by a few features, plus noise
+    y = np.where(X[:, 0] + X[:, 1] > 1, 'flu', np.where(X[:, 2] > 0, 'cold', 'allergy'))
+    flip = rng.random(len(y)) < 0.1
+    y[flip] = rng.choice(['flu', 'cold', 'allergy'], flip.sum())
+    model = RandomForestClassifier(n_estimators=15, max_depth=6, random_state=0).fit(X, y)
+    probe = np.unique(np.vstack([X, _symptom_rows(rng, 200), np.zeros((1, N_FEATURES), np.float32)]), axis=0)
+    return model, probe
+
+
+def test_predict_proba_matches_sklearn(fitted):
+    model, X = fitted
+    forest = FlatForest(export_forest(model))
+    np.testing.assert_allclose(forest.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+    assert (forest.predict(X) == model.predict(X)).all()
+
+
+def test_parity_after_npz_round_trip(fitted, tmp_path):
+    model, X = fitted
+    names = [f'symptom_{i}' for i in range(N_FEATURES)]
+    path = str(tmp_path / 'forest.npz')
+    save_forest(path, export_forest(model, feature_names=names))
+
+    forest = load_forest_if_present(path)
+    assert forest is not None
+    assert list(forest.feature_names) == names
+    assert list(forest.classes_) == list(model.classes_)
+    np.testing.assert_allclose(forest.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+
+
+def test_parity_after_artifact_round_trip(fitted, tmp_path):
+    model, X = fitted
+    version = save_artifact('v1', {'disease': export_forest(model)}, metadata={'source': 'test'},
+                            root=str(tmp_path))
+
+    artifact = load_artifact('v1', root=str(tmp_path), verify=True)
+    assert artifact.version == version
+    forest = artifact.forests['disease']
+    np.testing.assert_allclose(forest.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+
+
+def test_missing_values_follow_sklearn(tmp_path):
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(300, 4)).astype(np.float32)
+    y = (X[:, 0] > 0).astype(int) + (X[:, 1] > 0.5).astype(int)
+    X[rng.random(X.shape) < 0.15] = np.nan
+    model = RandomForestClassifier(n_estimators=10, max_depth=5, random_state=0).fit(X, y)
+
+    path = str(tmp_path / 'forest.npz')
+    save_forest(path, export_forest(model))
+    forest = load_forest_if_present(path)
+    np.testing.assert_allclose(forest.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
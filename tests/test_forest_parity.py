@@ -0,0 +1,113 @@
+"""
+Parity of the shipped flat forests (model/<v1|v2>/CURRENT) with the pickled
+sklearn models they were exported from. These need the trained pickles and
+the exported artifacts (both gitignored) and skip without them;
+test_forest_engine.py covers the engine itself on forests fitted in the test.
+
+Uncompressed artifacts must match sklearn's predict_proba exactly. Compressed
+ones (forest_compress.py) must stay within the gates that tool saves under.
+Both are checked on full inputs (dataset rows) and on the partial inputs
+requests actually send: random symptom subsets and pairs for v1, the whole
+form input grid for v2.
+
+    python -m pytest -q tests
+"""
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import forest_compress
+from model_artifact import current_version, load_artifact
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.filterwarnings("ignore::UserWarning")
+
+
+@pytest.fixture(autouse=True)
+def _repo_root(monkeypatch):
+    # artifacts, pickles and datasets are referenced relative to the repo root
+    monkeypatch.chdir(ROOT)
+
+
+def _load_pickle(path):
+    path = os.path.join(ROOT, path)
+    if not os.path.exists(path):
+        pytest.skip(f"{path} not trained")
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _artifact(name):
+    if current_version(name, root=os.path.join(ROOT, 'model')) is None:
+        pytest.skip(f"no {name} artifact exported")
+    return load_artifact(name, root=os.path.join(ROOT, 'model'))
+
+
+def _sklearn_proba(model, X, columns):
+    import pandas as pd
+    return model.predict_proba(pd.DataFrame(X, columns=columns))
+
+
+def _assert_parity(artifact, forest, expected, X):
+    actual = forest.predict_proba(X)
+    assert actual.shape == expected.shape
+    if 'compression' not in artifact.metadata:
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-9)
+        return
+    agreement = np.mean(actual.argmax(axis=1) == expected.argmax(axis=1))
+    assert agreement >= forest_compress.MIN_AGREEMENT, f"top-1 agreement {agreement:.4f}"
+    assert np.max(np.abs(actual - expected)) <= forest_compress.MAX_PROBABILITY_DIFF
+
+
+@pytest.fixture(scope='module')
+def v1():
+    from train import load_v1_dataset
+
+    artifact = _artifact('v1')
+    model, _, symptoms = _load_pickle('model/disease_model.pkl')[:3]
+    _, X, _, _, _ = load_v1_dataset(os.path.join(ROOT, 'dataset', 'dataset.csv'))
+    assert list(X.columns) == list(symptoms)
+    full = np.unique(np.asarray(X, dtype=np.float32), axis=0)
+    return artifact, model, symptoms, full
+
+
+def test_v1_full_symptom_sets(v1):
+    artifact, model, symptoms, full = v1
+    _assert_parity(artifact, artifact.forests['disease'], _sklearn_proba(model, full, symptoms), full)
+
+
+def test_v1_partial_symptom_sets(v1):
+    artifact, model, symptoms, full = v1
+    partial = forest_compress.probe_inputs('v1', full, pairs=2000, seed=0)
+    _assert_parity(artifact, artifact.forests['disease'], _sklearn_proba(model, partial, symptoms), partial)
+
+
+def test_v1_itching_and_skin_rash(v1):
+    from symptom_vocab import SymptomVocabulary
+
+    artifact, model, symptoms, _ = v1
+    X = SymptomVocabulary(symptoms).encode(['itching', 'skin_rash'], strict=True)[None, :].astype(np.float32)
+    forest = artifact.forests['disease']
+    expected = _sklearn_proba(model, X, symptoms)
+    assert forest.predict_proba(X).argmax() == expected.argmax()
+
+
+@pytest.fixture(scope='module')
+def v2():
+    from v2_lookup import all_inputs
+
+    artifact = _artifact('v2')
+    disease_model, _ = _load_pickle('model/disease_model_v2.pkl')
+    outcome_model = _load_pickle('model/outcome_model.pkl')
+    columns = list(artifact.forests['disease'].feature_names)
+    return artifact, disease_model, outcome_model, columns, all_inputs().astype(np.float32)
+
+
+@pytest.mark.parametrize('forest_name', ['disease', 'outcome'])
+def test_v2_input_grid(v2, forest_name):
+    artifact, disease_model, outcome_model, columns, grid = v2
+    model = disease_model if forest_name == 'disease' else outcome_model
+    _assert_parity(artifact, artifact.forests[forest_name], _sklearn_proba(model, grid, columns), grid)
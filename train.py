@@ -0,0 +1,465 @@
+"""
+Training pipeline for the v1 (symptom) and v2 (patient profile) models.
+
+    python train.py                              # search, train and save v1 and v2
+    python train.py --models v2 --jobs 4         # only the v2 models, 4 worker processes
+    python train.py --trees 25,50,100 --depths none,8,16 --folds 5
+    python train.py --no-search                  # the fixed settings of train_model*.py
+    python train.py --dry-run --report cv.json   # search and report only, save nothing
+
+Three forests are trained: disease_v1, disease_v2 and outcome_v2. For each one
+a k-fold cross-validated search runs over tree count x max depth. The
+datasets are encoded once and written, with the fold assignment, to
+model/train_cache/ (keyed by the dataset's SHA-256, the seed and the fold
+count), so worker processes and later runs only load arrays. Every
+(forest, depth, fold) is one job in a process pool: the forest is grown with
+warm_start through the tree counts, scoring the fold at each count, so the
+200-tree forest costs one fit instead of four.
+
+The report gives, per candidate: mean / std CV accuracy, node count, size of
+the serving arrays (forest_engine.export_forest) and FlatForest predict_proba
+latency for one row and for a batch, measured after the search on the fold-0
+forests in this process. The chosen candidate is the smallest whose mean
+accuracy is within --tolerance of the best, ties going to the faster one. It
+is then fitted on the 80% training split (the held-out 20% gives the reported
+accuracy), checked for parity with the flat forest and saved as before: the
+pickles, the .npz flat forests and a new model/<v1|v2> artifact version,
+whose metadata records the search.
+
+Everything is seeded (--seed, default 42), so the same data and options give
+the same models. forest_compress.py then shrinks the saved forests for serving.
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import KFold, train_test_split
+
+from forest_engine import FlatForest, export_forest, save_forest, max_parity_error
+
+V1_DATASET = os.path.join('dataset', 'dataset.csv')
+V2_DATASET = os.path.join('dataset', 'Disease_symptom_and_patient_profile_dataset.csv')
+CACHE_DIR = os.path.join('model', 'train_cache')
+CACHE_FORMAT = 1
+
+# forest -> (model group, dataset, target array)
+FORESTS = {
+    'disease_v1': ('v1', V1_DATASET, 'disease'),
+    'disease_v2': ('v2', V2_DATASET, 'disease'),
+    'outcome_v2': ('v2', V2_DATASET, 'outcome'),
+}
+# what train_model.py / train_model_v2.py always used: (n_estimators, max_depth)
+FIXED_PARAMS = {'disease_v1': (200, None), 'disease_v2': (100, None), 'outcome_v2': (100, None)}
+
+DEFAULT_TREES = (25, 50, 100, 200)
+DEFAULT_DEPTHS = (None, 8, 12, 16, 24)
+V2_FEATURES = ["Fever", "Cough", "Fatigue", "Difficulty Breathing",
+               "Age", "Gender", "Blood Pressure", "Cholesterol Level"]
+BINARY_MAP = {"Yes": 1, "No": 0}
+V2_ENCODINGS = {
+    "Fever": BINARY_MAP, "Cough": BINARY_MAP, "Fatigue": BINARY_MAP,
+    "Difficulty Breathing": BINARY_MAP,
+    "Gender": {"Male": 1, "Female": 0},
+    "Blood Pressure": {"High": 1, "Low": -1, "Normal": 0},
+    "Cholesterol Level": {"High": 1, "Normal": 0},
+}
+_NODE_ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value')
+
+
+# ---- datasets ----
+
+def load_v1_dataset(path=V1_DATASET):
+    """(df, X DataFrame, y, disease LabelEncoder, SymptomVocabulary) for the symptom model."""
+    import pandas as pd
+    from sklearn.preprocessing import LabelEncoder
+    from symptom_vocab import SymptomVocabulary
+
+    df = pd.read_csv(path)
+    symptom_cols = [col for col in df.columns if col.startswith('Symptom_')]
+    # Fill missing symptoms with 'none'
+    df[symptom_cols] = df[symptom_cols].fillna('none')
+
+    # Shared symptom vocabulary (name -> column index), then one-hot encode
+    # every row at once by indexing instead of a row-wise apply
+    vocab = SymptomVocabulary.from_values(df[symptom_cols].to_numpy())
+    X = pd.DataFrame(vocab.encode_matrix(df[symptom_cols].to_numpy()), columns=vocab.symptoms)
+
+    encoder = LabelEncoder()
+    y = encoder.fit_transform(df['Disease'])
+    return df, X, y, encoder, vocab
+
+
+def load_v2_dataset(path=V2_DATASET):
+    """(X DataFrame, y_disease, y_outcome, disease LabelEncoder) for the patient profile models."""
+    import pandas as pd
+    from sklearn.preprocessing import LabelEncoder
+
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+    df = df.map(lambda x: x.strip() if isinstance(x, str) else x)
+    for column, mapping in V2_ENCODINGS.items():
+        df[column] = df[column].map(mapping)
+    y_outcome = df["Outcome Variable"].map({"Positive": 1, "Negative": 0}).to_numpy()
+
+    encoder = LabelEncoder()
+    y_disease = encoder.fit_transform(df["Disease"])
+    return df[V2_FEATURES], y_disease, y_outcome, encoder
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fold_cache(group, X, targets, dataset, folds, seed, cache_dir=CACHE_DIR):
+    """
+    Path of the .npz holding the encoded X, every target and the fold id of
+    each row for `group`; written only when no file for this dataset content,
+    fold count and seed exists yet.
+    """
+    key = hashlib.sha256(
+        f"{CACHE_FORMAT}:{_file_sha256(dataset)}:{folds}:{seed}".encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, f'{group}-{key}.npz')
+    if os.path.exists(path):
+        print(f"[TRAIN] Using cached folds {path}")
+        return path
+    fold_ids = np.empty(len(X), dtype=np.int16)
+    for fold, (_, test) in enumerate(KFold(folds, shuffle=True, random_state=seed).split(X)):
+        fold_ids[test] = fold
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, X=np.asarray(X, dtype=np.float32), folds=fold_ids, **targets)
+    os.replace(tmp, path)
+    print(f"[TRAIN] Cached {folds} folds of {group} to {path}")
+    return path
+
+
+# ---- worker jobs (module level, so spawned processes can run them) ----
+
+def _cv_job(cache_path, target, depth, fold, trees, seed, forest_path=None):
+    """
+    Grow one forest on all folds but `fold` through the tree counts `trees`
+    (warm_start adds trees, it does not refit) and score `fold` at each count.
+    With forest_path, the largest forest is exported there for size/latency.
+    """
+    with np.load(cache_path) as data:
+        X, y, folds = data['X'], data[target], data['folds']
+    train, test = folds != fold, folds == fold
+    model = RandomForestClassifier(n_estimators=trees[0], max_depth=depth, random_state=seed,
+                                   warm_start=True, n_jobs=1)
+    scores = []
+    for count in trees:
+        model.set_params(n_estimators=count)
+        model.fit(X[train], y[train])
+        scores.append(float(model.score(X[test], y[test])))
+    if forest_path is not None:
+        save_forest(forest_path, export_forest(model))
+    return scores
+
+
+def _fit_job(cache_path, target, trees, depth, seed, feature_names):
+    """Fit the final forest on the training split; returns (model, held-out accuracy)."""
+    import pandas as pd
+
+    with np.load(cache_path) as data:
+        X, y = data['X'], data[target]
+    # same split as train_model*.py always used, so accuracies stay comparable
+    X = pd.DataFrame(X, columns=feature_names)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = RandomForestClassifier(n_estimators=trees, max_depth=depth, random_state=seed, n_jobs=1)
+    model.fit(X_train, y_train)
+    return model, float(model.score(X_test, y_test))
+
+
+# ---- size / latency ----
+
+def first_trees(arrays, k):
+    """export_forest() arrays restricted to the first k trees (node ids are already global)."""
+    roots = arrays['roots']
+    n_nodes = int(roots[k]) if k < len(roots) else len(arrays['feature'])
+    sliced = {name: arrays[name][:n_nodes] for name in _NODE_ARRAYS}
+    sliced['roots'] = roots[:k]
+    sliced['classes'] = arrays['classes']
+    return sliced
+
+
+def measure_forest(arrays, X, single_reps=200, batch_rows=256, batch_reps=20):
+    """Node count, serving bytes and FlatForest predict_proba latency of one forest."""
+    forest = FlatForest(arrays)
+    row, batch = X[:1], X[:batch_rows]
+    forest.predict_proba(batch)  # warm up
+    single = []
+    for _ in range(single_reps):
+        started = time.perf_counter()
+        forest.predict_proba(row)
+        single.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    for _ in range(batch_reps):
+        forest.predict_proba(batch)
+    batch_seconds = (time.perf_counter() - started) / batch_reps
+    return {
+        'nodes': int(len(arrays['feature'])),
+        'bytes': int(sum(np.asarray(arrays[name]).nbytes for name in _NODE_ARRAYS + ('roots',))),
+        'latency_1_us': round(float(np.median(single)) * 1e6, 1),
+        f'latency_{len(batch)}_ms': round(batch_seconds * 1e3, 3),
+    }
+
+
+# ---- search ----
+
+def search(jobs_pool, forests, caches, trees, depths, folds, seed, tolerance, work_dir):
+    """Cross-validated grid search; returns {forest: {'candidates': [...], 'chosen': {...}}}."""
+    pending = {}
+    for name in forests:
+        group, _, target = FORESTS[name]
+        for depth in depths:
+            for fold in range(folds):
+                forest_path = (os.path.join(work_dir, f'{name}-depth{depth}.npz')
+                               if fold == 0 else None)
+                future = jobs_pool.submit(_cv_job, caches[group], target, depth, fold,
+                                          list(trees), seed, forest_path)
+                pending[future] = (name, depth, fold, forest_path)
+
+    scores = {}
+    started = time.monotonic()
+    for done, future in enumerate(as_completed(pending), start=1):
+        name, depth, fold, _ = pending[future]
+        scores[(name, depth, fold)] = future.result()
+        print(f"[TRAIN] CV {done}/{len(pending)}: {name} depth={depth} fold={fold} "
+              f"({time.monotonic() - started:.1f}s)")
+
+    results = {}
+    for name in forests:
+        group, _, target = FORESTS[name]
+        with np.load(caches[group]) as data:
+            X = data['X']
+        candidates = []
+        for depth in depths:
+            with np.load(os.path.join(work_dir, f'{name}-depth{depth}.npz')) as data:
+                full = {key: data[key] for key in data.files}
+            for i, count in enumerate(trees):
+                accs = [scores[(name, depth, fold)][i] for fold in range(folds)]
+                candidate = {'trees': count, 'max_depth': depth,
+                             'cv_accuracy': round(float(np.mean(accs)), 4),
+                             'cv_std': round(float(np.std(accs)), 4)}
+                candidate.update(measure_forest(first_trees(full, count), X))
+                candidates.append(candidate)
+        best = max(c['cv_accuracy'] for c in candidates)
+        eligible = [c for c in candidates if c['cv_accuracy'] >= best - tolerance]
+        chosen = min(eligible, key=lambda c: (c['bytes'], c['latency_1_us']))
+        results[name] = {'candidates': candidates, 'chosen': chosen}
+    return results
+
+
+def print_report(results):
+    for name, result in results.items():
+        chosen = result['chosen']
+        batch_key = next(k for k in chosen if k.startswith('latency_') and k.endswith('_ms'))
+        print(f"\n{name}: accuracy vs size vs latency ({batch_key[8:-3]}-row batch)")
+        print(f"  {'trees':>5} {'depth':>5} {'cv acc':>8} {'± std':>7} {'nodes':>9} "
+              f"{'size KB':>9} {'1-row us':>9} {'batch ms':>9}")
+        for c in result['candidates']:
+            mark = '  <- chosen' if c is chosen else ''
+            print(f"  {c['trees']:>5} {str(c['max_depth']):>5} {c['cv_accuracy'] * 100:>7.2f}% "
+                  f"{c['cv_std'] * 100:>6.2f}% {c['nodes']:>9} {c['bytes'] / 1024:>9.1f} "
+                  f"{c['latency_1_us']:>9.1f} {c[batch_key]:>9.3f}{mark}")
+
+
+# ---- final models ----
+
+def save_v1(model, acc, encoder, vocab, df, X, training):
+    from model_artifact import save_artifact
+    from symptom_index import build_disease_symptom_index, save_disease_symptom_index
+
+    all_symptoms = vocab.symptoms
+    with open('model/disease_model.pkl', 'wb') as f:
+        pickle.dump((model, encoder, all_symptoms), f)
+    print("✅ Model saved successfully")
+
+    # Export flattened forest for sklearn-free serving, checked against sklearn
+    _, X_test = train_test_split(X, test_size=0.2, random_state=42)
+    forest = export_forest(model, feature_names=all_symptoms,
+                           class_names=encoder.inverse_transform(model.classes_))
+    parity = max_parity_error(model, FlatForest(forest), X_test)
+    if parity > 1e-9:
+        raise SystemExit(f"❌ Flat forest does not match sklearn (max diff {parity})")
+    save_forest('model/disease_model_forest.npz', forest)
+    print(f"✅ Flat forest exported (max parity error {parity:.2e})")
+
+    # Versioned, memory-mappable artifact (model/v1/<version>/) loaded by app.py instead of the pickle
+    version = save_artifact('v1', {'disease': forest}, metadata={
+        'symptom_vocabulary': list(all_symptoms),
+        'feature_schema': {'kind': 'symptom_onehot', 'columns': list(all_symptoms), 'values': [0, 1]},
+        'accuracy': float(acc),
+        'training': training,
+    })
+    print(f"✅ Model artifact v1/{version} saved")
+
+    # Save disease -> symptom index next to the model so /predict never reads the CSV
+    save_disease_symptom_index(build_disease_symptom_index(df), V1_DATASET)
+    print("✅ Disease symptom index saved successfully")
+
+
+def save_v2(disease_model, disease_acc, outcome_model, outcome_acc, encoder, X, training, lookup=False):
+    from model_artifact import save_artifact
+
+    with open("model/disease_model_v2.pkl", "wb") as f:
+        pickle.dump((disease_model, encoder), f)  # save encoder, not just mapping
+    with open("model/outcome_model.pkl", "wb") as f:
+        pickle.dump(outcome_model, f)
+    print("✅ Disease and outcome models saved successfully.")
+
+    # Export flattened forests for sklearn-free serving, checked against sklearn
+    _, X_test = train_test_split(X, test_size=0.2, random_state=42)
+    exports = [
+        ("disease", disease_model, encoder.inverse_transform(disease_model.classes_), "model/disease_model_v2_forest.npz"),
+        ("outcome", outcome_model, ["Negative", "Positive"], "model/outcome_model_forest.npz"),
+    ]
+    artifact_forests = {}
+    for name, model, class_names, path in exports:
+        forest = export_forest(model, feature_names=X.columns, class_names=class_names)
+        parity = max_parity_error(model, FlatForest(forest), X_test)
+        if parity > 1e-9:
+            raise SystemExit(f"❌ Flat forest {path} does not match sklearn (max diff {parity})")
+        save_forest(path, forest)
+        print(f"✅ Flat forest exported to {path} (max parity error {parity:.2e})")
+        artifact_forests[name] = forest
+
+    # Versioned, memory-mappable artifact (model/v2/<version>/) loaded by app.py instead of the pickles
+    version = save_artifact("v2", artifact_forests, metadata={
+        "feature_schema": {"kind": "patient_profile", "columns": list(X.columns), "encodings": V2_ENCODINGS},
+        "accuracy": {"disease": disease_acc, "outcome": outcome_acc},
+        "training": training,
+    })
+    print(f"✅ Model artifact v2/{version} saved")
+
+    # Optional: precompute top-3 diseases + outcome for every input the v2 form can
+    # send (ages 0-120), so predict_v2 answers with a single array index
+    if lookup:
+        from v2_lookup import build_lookup_table, save_lookup_table
+        table = build_lookup_table(disease_model, outcome_model,
+                                   encoder.inverse_transform(disease_model.classes_), X.columns)
+        save_lookup_table(table)
+        print(f"✅ V2 lookup table saved ({len(table['outcome'])} inputs).")
+
+
+def _parse_list(text, cast):
+    return tuple(None if v.strip().lower() == 'none' else cast(v) for v in text.split(','))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the v1 and v2 models with a cross-validated search.")
+    parser.add_argument('--models', default='v1,v2', help="comma-separated: v1, v2")
+    parser.add_argument('--trees', default=','.join(map(str, DEFAULT_TREES)), help="tree counts to try")
+    parser.add_argument('--depths', default=','.join(str(d).lower() for d in DEFAULT_DEPTHS),
+                        help="max depths to try ('none' = unlimited)")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--tolerance', type=float, default=0.005,
+                        help="accuracy a smaller/faster candidate may give up against the best")
+    parser.add_argument('--no-search', action='store_true', help="train the fixed settings of train_model*.py")
+    parser.add_argument('--dry-run', action='store_true', help="search and report, save no model")
+    parser.add_argument('--report', metavar='PATH', help="write the search results as JSON")
+    parser.add_argument('--lookup', action='store_true', help="also build the v2 lookup table")
+    args = parser.parse_args(argv)
+
+    groups = [g.strip() for g in args.models.split(',') if g.strip()]
+    if any(g not in ('v1', 'v2') for g in groups):
+        parser.error("--models takes v1 and/or v2")
+    forests = [name for name, (group, _, _) in FORESTS.items() if group in groups]
+    trees = tuple(sorted(_parse_list(args.trees, int)))
+    depths = _parse_list(args.depths, int)
+
+    # encode each dataset once; the cache is what the worker processes read
+    datasets, caches = {}, {}
+    if 'v1' in groups:
+        df, X, y, encoder, vocab = load_v1_dataset()
+        print(f"✅ Loaded {V1_DATASET}: {len(df)} rows, {X.shape[1]} symptoms, {len(encoder.classes_)} diseases")
+        datasets['v1'] = (df, X, encoder, vocab)
+        caches['v1'] = fold_cache('v1', X, {'disease': y}, V1_DATASET, args.folds, args.seed)
+    if 'v2' in groups:
+        X, y_disease, y_outcome, encoder = load_v2_dataset()
+        print(f"✅ Loaded {V2_DATASET}: {len(X)} rows, {len(encoder.classes_)} diseases")
+        datasets['v2'] = (X, encoder)
+        caches['v2'] = fold_cache('v2', X, {'disease': y_disease, 'outcome': y_outcome},
+                                  V2_DATASET, args.folds, args.seed)
+
+    pool = ProcessPoolExecutor(max(1, args.jobs), mp_context=get_context('spawn'))
+    try:
+        if args.no_search:
+            results = {name: {'candidates': [], 'chosen': {'trees': FIXED_PARAMS[name][0],
+                                                           'max_depth': FIXED_PARAMS[name][1]}}
+                       for name in forests}
+        else:
+            work_dir = os.path.join(CACHE_DIR, f'search-{os.getpid()}')
+            os.makedirs(work_dir, exist_ok=True)
+            try:
+                results = search(pool, forests, caches, trees, depths, args.folds, args.seed,
+                                 args.tolerance, work_dir)
+            finally:
+                for file_name in os.listdir(work_dir):
+                    os.remove(os.path.join(work_dir, file_name))
+                os.rmdir(work_dir)
+            print_report(results)
+
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump({'seed': args.seed, 'folds': args.folds, 'tolerance': args.tolerance,
+                           'results': results}, f, indent=2)
+            print(f"\n✅ Search report written to {args.report}")
+        if args.dry_run:
+            return results
+
+        # final fits run in parallel too: one job per forest
+        fits = {}
+        for name in forests:
+            group, _, target = FORESTS[name]
+            chosen = results[name]['chosen']
+            feature_names = list(datasets[group][1 if group == 'v1' else 0].columns)
+            fits[name] = pool.submit(_fit_job, caches[group], target, chosen['trees'],
+                                     chosen['max_depth'], args.seed, feature_names)
+        fitted = {name: future.result() for name, future in fits.items()}
+    finally:
+        pool.shutdown()
+
+    def training(*names):
+        """What the artifact metadata records about how its forests were chosen."""
+        return {
+            'seed': args.seed,
+            'folds': args.folds,
+            'searched': not args.no_search,
+            'dataset_sha256': _file_sha256(FORESTS[names[0]][1]),
+            'params': {name: {key: results[name]['chosen'].get(key)
+                              for key in ('trees', 'max_depth', 'cv_accuracy', 'bytes', 'latency_1_us')}
+                       for name in names},
+        }
+
+    for name in forests:
+        print(f"✅ {name}: {results[name]['chosen']['trees']} trees, max_depth="
+              f"{results[name]['chosen']['max_depth']}, held-out accuracy {fitted[name][1] * 100:.2f}%")
+    if 'v1' in groups:
+        df, X, encoder, vocab = datasets['v1']
+        model, acc = fitted['disease_v1']
+        save_v1(model, acc, encoder, vocab, df, X, training('disease_v1'))
+    if 'v2' in groups:
+        X, encoder = datasets['v2']
+        (disease_model, disease_acc), (outcome_model, outcome_acc) = fitted['disease_v2'], fitted['outcome_v2']
+        save_v2(disease_model, disease_acc, outcome_model, outcome_acc, encoder, X,
+                training('disease_v2', 'outcome_v2'), lookup=args.lookup)
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
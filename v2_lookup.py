@@ -0,0 +1,96 @@
+import numpy as np
+
+LOOKUP_PATH = 'model/v2_lookup.npz'
+TOP_K = 3
+
+# Allowed integer range of each v2 feature, in V2_FEATURES order:
+# Fever, Cough, Fatigue, Difficulty Breathing, Age, Gender, Blood Pressure, Cholesterol Level
+AXIS_MIN = np.array([0, 0, 0, 0, 0, 0, -1, 0], dtype=np.int64)
+AXIS_MAX = np.array([1, 1, 1, 1, 120, 1, 1, 1], dtype=np.int64)
+AXIS_SIZE = AXIS_MAX - AXIS_MIN + 1
+
+
+def all_inputs():
+    """Every point of the v2 input grid, one row per table slot."""
+    grid = np.indices(AXIS_SIZE).reshape(len(AXIS_SIZE), -1).T
+    return grid + AXIS_MIN
+
+
+def build_lookup_table(disease_model, outcome_model, class_names, feature_names):
+    """
+    Score the full input grid once and keep, per slot, the top-3 disease columns,
+    their probabilities and the outcome. Probabilities are stored as the
+    percentages the result page shows (2 decimals), in hundredths as uint16.
+    Models may be sklearn forests (scored on a DataFrame) or FlatForest.
+    """
+    X = all_inputs()
+    if hasattr(disease_model, 'feature_names_in_'):
+        import pandas as pd
+        X_in = pd.DataFrame(X, columns=list(feature_names))
+    else:
+        X_in = X
+    probs = disease_model.predict_proba(X_in)
+    outcomes = outcome_model.predict(X_in)
+
+    # same ordering as the live path: np.argsort(probs)[::-1][:3]
+    top = np.argsort(probs, axis=1)[:, ::-1][:, :TOP_K]
+    # Python's round() (not np.round) so values match round(p * 100, 2) exactly
+    pct = np.vectorize(lambda p: round(float(p) * 100, 2))(np.take_along_axis(probs, top, axis=1))
+    top_pct = np.rint(pct * 100)
+    return {
+        'top': top.astype(np.uint16),
+        'top_pct': top_pct.astype(np.uint16),
+        'outcome': np.asarray(outcomes).astype(np.uint8),
+        'class_names': np.asarray(list(class_names), dtype=str),
+        'axis_min': AXIS_MIN,
+        'axis_size': AXIS_SIZE,
+    }
+
+
+def save_lookup_table(table, path=LOOKUP_PATH):
+    np.savez_compressed(path, **table)
+
+
+def load_lookup_table(path=LOOKUP_PATH):
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            table = V2LookupTable({name: data[name] for name in data.files})
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[MODEL] Failed to load {path}: {e}")
+        return None
+    print(f"[MODEL] Loaded {path} ({len(table.outcome)} precomputed v2 inputs).")
+    return table
+
+
+class V2LookupTable:
+    """Constant-time v2 answers for inputs inside the precomputed grid."""
+
+    def __init__(self, arrays):
+        self.top = arrays['top']
+        self.top_pct = arrays['top_pct']
+        self.outcome = arrays['outcome']
+        self.class_names = arrays['class_names']
+        self.axis_min = arrays['axis_min']
+        self.axis_size = arrays['axis_size']
+
+    def slot(self, input_vector):
+        pos = np.asarray(input_vector, dtype=np.int64) - self.axis_min
+        if pos.shape != self.axis_size.shape or (pos < 0).any() or (pos >= self.axis_size).any():
+            return None
+        return int(np.ravel_multi_index(pos, self.axis_size))
+
+    def lookup(self, input_vector):
+        """
+        Return ([(disease name, probability %), ...], outcome) or None when the
+        input is outside the table, so the caller can score it live.
+        """
+        slot = self.slot(input_vector)
+        if slot is None:
+            return None
+        top = [
+            (str(self.class_names[idx]), int(pct) / 100)
+            for idx, pct in zip(self.top[slot], self.top_pct[slot])
+        ]
+        return top, int(self.outcome[slot])
@@ -0,0 +1,103 @@
+"""
+Start-up steps with progress reporting for the readiness endpoint.
+
+app.py registers its slow start-up work (symptom index, models, heavy imports)
+as named steps. With STARTUP_MODE=eager they run before the module finishes
+importing, as before; with STARTUP_MODE=background they run on a thread so the
+process accepts connections at once, and /ready answers 503 with the progress
+of each step until every required step has finished.
+
+A step may also pass `ready`, a check of what the step produces (e.g. "the
+model registry serves v1"). Once the warm-up has run, that check decides the
+step's readiness, so a step that failed at start-up but was later fixed by
+other code (the registry watcher loading a good version) stops holding /ready
+at 503, and one whose result went away starts to again.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class Warmup:
+    """Ordered start-up steps run once, inline or on a background thread."""
+
+    def __init__(self):
+        self._steps = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started = None
+        self._finished = None
+
+    def add(self, name, fn, required=True, ready=None):
+        """
+        fn() does the work; returning False (or raising) marks the step failed.
+        ready() -> bool, if given, is the step's readiness once the warm-up ran.
+        """
+        self._steps[name] = {'fn': fn, 'required': required, 'ready': ready, 'state': 'pending',
+                             'seconds': None, 'error': None}
+
+    def run(self):
+        self._started = time.monotonic()
+        for name, step in self._steps.items():
+            with self._lock:
+                step['state'] = 'running'
+            started = time.monotonic()
+            try:
+                ok = step['fn']() is not False
+                error = None if ok else 'step reported failure'
+            except Exception as e:
+                ok, error = False, str(e)
+            with self._lock:
+                step['state'] = 'done' if ok else 'failed'
+                step['error'] = error
+                step['seconds'] = round(time.monotonic() - started, 3)
+            if not ok:
+                print(f"[WARMUP] {name} failed: {error}")
+        self._finished = time.monotonic()
+        print(f"[WARMUP] Finished in {self._finished - self._started:.2f}s.")
+
+    def start(self):
+        """run() on a daemon thread (no-op if already started)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def _step_state(self, step):
+        """The step's state, with its ready() check applied once it has run."""
+        state = step['state']
+        if step['ready'] is not None and state in ('done', 'failed'):
+            try:
+                ok = bool(step['ready']())
+            except Exception:
+                ok = False
+            if ok and state == 'failed':
+                return 'recovered'
+            if not ok and state == 'done':
+                return 'failed'
+        return state
+
+    def _ready(self):
+        return self._finished is not None and all(
+            self._step_state(step) in ('done', 'recovered')
+            for step in self._steps.values() if step['required'])
+
+    @property
+    def ready(self):
+        with self._lock:
+            return self._ready()
+
+    def status(self):
+        with self._lock:
+            steps = [
+                {'name': name, 'state': self._step_state(step), 'required': step['required'],
+                 'seconds': step['seconds'], 'error': step['error']}
+                for name, step in self._steps.items()
+            ]
+            ready = self._ready()
+        now = self._finished or time.monotonic()
+        return {
+            'ready': ready,
+            'elapsed': round(now - self._started, 3) if self._started else 0.0,
+            'steps': steps,
+        }